@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# ================ #
+#  Batch Manifest  #
+# ================ #
+
+# Runs a manifest of jobs in one process, python run_rbj.py --manifest jobs.csv
+
+# ArcPy aliasing
+import arcpy as ap
+from arcpy import AddMessage as write
+# STOP! Hammer time
+from datetime import datetime as dt
+# System Modules
+import os
+import json
+import io
+import csv
+import traceback
+
+import run_rbj
+import rbj_common
+from rbj_common import runtime, check_data_reviewer, write_csv
+
+
+# Manifest column for each tool parameter, in parameter order
+MANIFEST_COLUMNS = ("production_gdb", "rbj_file", "reviewer_gdb", "output_folder", "AOI", "engine", "chunk_size", "workers", "tile_limit", "incremental", "export_chunk_size", "breakdowns", "session_retention", "profile", "prune", "cache_size", "output_format", "baseline_rbj")
+MANIFEST_REQUIRED = ("production_gdb", "rbj_file", "reviewer_gdb", "output_folder")
+BATCH_FIELDS = ("job", "production_gdb", "rbj_file", "output_folder", "status", "seconds", "report", "error")
+
+def read_manifest(manifest_file, defaults=None): # Returns a {column: value} dict per job of a .csv or .json manifest, defaults filling blank columns
+	if manifest_file.lower().endswith(".json"):
+		with open(manifest_file) as f:
+			rows = [dict((key, u"" if value is None else u"{0}".format(value)) for key, value in row.items()) for row in json.load(f)]
+	elif bytes is str:
+		with open(manifest_file, 'rb') as f:
+			rows = [dict((key.decode("utf-8-sig"), (value or "").decode("utf-8")) for key, value in row.items() if key) for row in csv.DictReader(f)]
+	else:
+		with io.open(manifest_file, newline='', encoding='utf-8-sig') as f:
+			rows = [dict((key, value or "") for key, value in row.items() if key) for row in csv.DictReader(f)]
+	columns = dict((column.lower(), column) for column in MANIFEST_COLUMNS)
+	jobs = []
+	for number, row in enumerate(rows, 1):
+		unknown = [key for key in row if key.strip().lower() not in columns]
+		if unknown:
+			raise ValueError("Manifest job {0} has unknown columns {1}, expected some of {2}".format(number, ", ".join(unknown), ", ".join(MANIFEST_COLUMNS)))
+		job = dict((column, u"") for column in MANIFEST_COLUMNS)
+		job.update(defaults or {})
+		job.update((columns[key.strip().lower()], value.strip()) for key, value in row.items() if value.strip())
+		missing = [column for column in MANIFEST_REQUIRED if not job[column]]
+		if missing:
+			raise ValueError("Manifest job {0} has no {1}".format(number, ", ".join(missing)))
+		jobs.append(job)
+	return jobs
+
+def run_manifest(jobs, summary_file, stop_on_error=False): # Runs the jobs one after another in this process, returns their summary records
+	rbj_common._workspace_paths = {}
+	records = []
+	batch_start = dt.now()
+	check_data_reviewer('out')
+	try:
+		for number, job in enumerate(jobs, 1):
+			write("\n{0}\nJob {1} of {2}: '{3}' on '{4}'\n{0}".format("=" * 60, number, len(jobs), os.path.split(job["rbj_file"])[-1], job["production_gdb"]))
+			if not os.path.exists(job["output_folder"]):
+				os.makedirs(job["output_folder"])
+			job_start = dt.now()
+			record = {"job": number, "production_gdb": job["production_gdb"], "rbj_file": job["rbj_file"], "output_folder": job["output_folder"], "report": "", "error": ""}
+			try:
+				record["report"] = run_rbj.main(*[job[column] for column in MANIFEST_COLUMNS]) or ""
+				record["status"] = "succeeded"
+			except Exception as e:
+				# A failed job is logged and the batch carries on with the next one
+				record["status"] = "failed"
+				record["error"] = u"{0}: {1}".format(type(e).__name__, e)
+				ap.AddError("Job {0} failed:\n{1}".format(number, traceback.format_exc()))
+				# The job may have failed on a database changed under it, list it again next time
+				rbj_common._workspace_paths.pop(job["production_gdb"], None)
+			record["seconds"] = round((dt.now() - job_start).total_seconds(), 1)
+			records.append(record)
+			write("Job {0} {1} in {2}".format(number, record["status"], runtime(job_start, dt.now())))
+			# Rewritten after every job so a batch that dies still leaves its finished jobs' summary
+			write_csv(summary_file, BATCH_FIELDS, records)
+			if record["status"] == "failed" and stop_on_error:
+				ap.AddWarning("Stopping after the failed job, {0} jobs weren't run".format(len(jobs) - number))
+				break
+	finally:
+		check_data_reviewer('in')
+		rbj_common._workspace_paths = None
+	failed = len([record for record in records if record["status"] == "failed"])
+	write("\nRan {0} of {1} jobs in {2}, {3} failed. Summary written to {4}".format(len(records), len(jobs), runtime(batch_start, dt.now()), failed, summary_file))
+	return records
+
+def batch_main(args): # Command line entry point for manifest runs, returns the exit code
+	import argparse
+	parser = argparse.ArgumentParser(prog="run_rbj.py", description="Runs a manifest of RBJ check jobs in one process")
+	parser.add_argument("--manifest", required=True, help="CSV or JSON manifest with a job per row, columns: " + ", ".join(MANIFEST_COLUMNS))
+	parser.add_argument("--reviewer", help="Reviewer geodatabase for jobs with no reviewer_gdb")
+	parser.add_argument("--summary", help="Summary CSV to write, <manifest>_summary.csv by default")
+	parser.add_argument("--stop-on-error", action="store_true", help="Stop at the first failed job instead of running the rest")
+	options = parser.parse_args(args)
+	jobs = read_manifest(options.manifest, {"reviewer_gdb": options.reviewer} if options.reviewer else None)
+	summary_file = options.summary or os.path.splitext(options.manifest)[0] + "_summary.csv"
+	records = run_manifest(jobs, summary_file, options.stop_on_error)
+	return 1 if [record for record in records if record["status"] == "failed"] or len(records) < len(jobs) else 0
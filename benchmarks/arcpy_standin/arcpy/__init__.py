@@ -0,0 +1,709 @@
+# -*- coding: utf-8 -*-
+# ==================================== #
+#  arcpy stand-in for the benchmarks   #
+# ==================================== #
+
+# Just enough of arcpy and the Data Reviewer toolbox for the RBJ Checks modules to run without ArcGIS, with tables held in TABLES
+# ExecuteReviewerBatchJob_Reviewer calls the BATCH_JOB hook when one is set, since there's no Data Reviewer here
+
+import os
+import json
+import re
+import sys
+import copy
+import struct
+import shutil
+import collections
+try:
+	import cPickle as pickle
+except ImportError:
+	import pickle
+
+TABLES = collections.OrderedDict() # table key -> Table
+WORKSPACES = set()                 # workspace and feature dataset keys
+DOMAINS = {}                       # (workspace key, domain name) -> {code: description}
+MESSAGES = []                      # (severity, message) of every AddMessage/AddWarning/AddError
+ECHO = os.environ.get("ARCPY_STANDIN_ECHO") == "1"
+BATCH_JOB = None                   # function(reviewer_gdb, session, rbj_file, production_gdb, AOI) run for ExecuteReviewerBatchJob_Reviewer
+BATCH_JOBS = []                    # (rbj_file, production_gdb, AOI) of every batch job
+
+# ListFields type -> Python value check, and AddField_management type -> ListFields type
+FIELD_TYPES = {"TEXT": "String", "STRING": "String", "LONG": "Integer", "SHORT": "SmallInteger", "DOUBLE": "Double", "FLOAT": "Single", "DATE": "Date", "GUID": "Guid"}
+SHAPE_TYPES = {"POINT": "Point", "MULTIPOINT": "Multipoint", "POLYLINE": "Polyline", "POLYGON": "Polygon"}
+
+class ExecuteError(Exception):
+	pass
+
+def _key(path): # Table registry key of a path written with either separator
+	return os.path.normpath(str(path).replace("\\", "/")).lower()
+
+def _table(path):
+	try:
+		return TABLES[_key(path)]
+	except KeyError:
+		raise ExecuteError("ERROR 000732: Dataset {0} does not exist or is not supported".format(path))
+
+def save(path): # Pickles every workspace to a file, so other processes can load the same data
+	with open(path, 'wb') as f:
+		pickle.dump((TABLES, WORKSPACES, DOMAINS), f, 2)
+
+def load(path): # Replaces the workspaces with those pickled by save
+	global TABLES, WORKSPACES, DOMAINS
+	with open(path, 'rb') as f:
+		tables, workspaces, domains = pickle.load(f)
+	TABLES.clear()
+	TABLES.update(tables)
+	WORKSPACES.clear()
+	WORKSPACES.update(workspaces)
+	DOMAINS.clear()
+	DOMAINS.update(domains)
+
+
+'''
+╔══════════╗
+║ Geometry ║
+╚══════════╝
+'''
+class SpatialReference(object):
+	def __init__(self, factory_code=4326):
+		self.factoryCode = factory_code
+		self.name = "GCS_WGS_1984" if factory_code == 4326 else str(factory_code)
+		self.XYTolerance = 8.983152841195215e-09 if factory_code == 4326 else 0.001
+		self.type = "Geographic" if factory_code == 4326 else "Projected"
+		self.metersPerUnit = 1.0
+
+	def exportToString(self):
+		if self.factoryCode == 4326:
+			wkt = 'GEOGCS["GCS_WGS_1984",DATUM["D_WGS_1984",SPHEROID["WGS_1984",6378137.0,298.257223563]],PRIMEM["Greenwich",0.0],UNIT["Degree",0.0174532925199433]]'
+		else:
+			wkt = 'PROJCS["{0}"]'.format(self.name)
+		return wkt + ";-400 -400 1000000000;-100000 10000;-100000 10000;{0};0.001;0.001;IsHighPrecision".format(self.XYTolerance)
+
+class Extent(object):
+	def __init__(self, XMin=None, YMin=None, XMax=None, YMax=None):
+		self.XMin, self.YMin, self.XMax, self.YMax = XMin, YMin, XMax, YMax
+		self.width = (XMax - XMin) if XMin is not None else 0
+		self.height = (YMax - YMin) if YMin is not None else 0
+
+class Point(object):
+	def __init__(self, X=None, Y=None, Z=None, M=None, ID=None):
+		self.X, self.Y = X, Y
+
+class Array(list):
+	def __init__(self, items=None):
+		list.__init__(self, items or [])
+
+class Geometry(object):
+	def __init__(self, shape_type, parts, spatial_reference=None):
+		self.type = shape_type.lower()
+		self.parts = [[(float(x), float(y)) for x, y in part] for part in parts]
+		self.spatialReference = spatial_reference
+
+	def _points(self):
+		return [point for part in self.parts for point in part]
+
+	@property
+	def extent(self):
+		points = self._points()
+		if not points:
+			return Extent()
+		xs = [x for x, y in points]
+		ys = [y for x, y in points]
+		return Extent(min(xs), min(ys), max(xs), max(ys))
+
+	@property
+	def centroid(self):
+		points = self._points()
+		return Point(sum(x for x, y in points) / len(points), sum(y for x, y in points) / len(points)) if points else Point()
+
+	@property
+	def firstPoint(self):
+		points = self._points()
+		return Point(*points[0]) if points else None
+
+	@property
+	def pointCount(self):
+		return len(self._points())
+
+	@property
+	def partCount(self):
+		return len(self.parts)
+
+	@property
+	def WKB(self): # OGC WKB, little endian, single part lines and polygons as LineString and Polygon
+		def coordinates(points):
+			return struct.pack("<I", len(points)) + b"".join(struct.pack("<2d", x, y) for x, y in points)
+		if self.type == "point":
+			x, y = self.parts[0][0] if self.parts and self.parts[0] else (float("nan"), float("nan"))
+			return bytearray(struct.pack("<BI2d", 1, 1, x, y))
+		if self.type == "multipoint":
+			points = self._points()
+			return bytearray(struct.pack("<BII", 1, 4, len(points)) + b"".join(struct.pack("<BI2d", 1, 1, x, y) for x, y in points))
+		if self.type == "polyline":
+			lines = [struct.pack("<BI", 1, 2) + coordinates(part) for part in self.parts]
+			return bytearray(lines[0] if len(lines) == 1 else struct.pack("<BII", 1, 5, len(lines)) + b"".join(lines))
+		polygons = [struct.pack("<BII", 1, 3, 1) + coordinates(part) for part in self.parts]
+		return bytearray(polygons[0] if len(polygons) == 1 else struct.pack("<BII", 1, 6, len(polygons)) + b"".join(polygons))
+
+	@property
+	def JSON(self):
+		key = {"polygon": "rings", "polyline": "paths", "multipoint": "points"}.get(self.type)
+		reference = {"wkid": getattr(self.spatialReference, "factoryCode", None)}
+		if key is None:
+			x, y = self.parts[0][0] if self.parts and self.parts[0] else (None, None)
+			return json.dumps({"x": x, "y": y, "spatialReference": reference})
+		if key == "points":
+			return json.dumps({key: [list(point) for point in self._points()], "spatialReference": reference})
+		return json.dumps({key: [[list(point) for point in part] for part in self.parts], "spatialReference": reference})
+
+	def union(self, other):
+		if other is None:
+			return self
+		return Geometry(self.type, self.parts + other.parts, self.spatialReference)
+
+	def intersect(self, other, dimension):
+		return self
+
+	@property
+	def length(self):
+		return sum(((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5 for part in self.parts for (x1, y1), (x2, y2) in zip(part, part[1:]))
+
+	def disjoint(self, other):
+		a = self.extent
+		b = other.extent
+		if a.XMin is None or b.XMin is None:
+			return True
+		return a.XMax < b.XMin or b.XMax < a.XMin or a.YMax < b.YMin or b.YMax < a.YMin
+
+	def within(self, other):
+		a = self.extent
+		b = other.extent
+		return not self.disjoint(other) and b.XMin <= a.XMin and a.XMax <= b.XMax and b.YMin <= a.YMin and a.YMax <= b.YMax
+
+	def contains(self, other):
+		return other.within(self)
+
+	def touches(self, other):
+		a = self.extent
+		b = other.extent
+		return not self.disjoint(other) and (a.XMax == b.XMin or b.XMax == a.XMin or a.YMax == b.YMin or b.YMax == a.YMin)
+
+	def overlaps(self, other):
+		return self.type == other.type and not self.disjoint(other) and not self.touches(other) and not self.within(other) and not other.within(self)
+
+	def crosses(self, other):
+		return "polyline" in (self.type, other.type) and not self.disjoint(other) and not self.touches(other) and not self.within(other) and not other.within(self)
+
+	def distanceTo(self, other):
+		a = self.extent
+		b = other.extent
+		dx = max(0.0, b.XMin - a.XMax, a.XMin - b.XMax)
+		dy = max(0.0, b.YMin - a.YMax, a.YMin - b.YMax)
+		return (dx ** 2 + dy ** 2) ** 0.5
+
+	def projectAs(self, spatial_reference, transformation_name=None):
+		if getattr(self.spatialReference, "type", "Geographic") != "Geographic" or spatial_reference.type == "Geographic":
+			return self
+		import math
+		latitude = math.radians(self.centroid.Y)
+		parts = [[(x * 111320.0 * math.cos(latitude), y * 110540.0) for x, y in part] for part in self.parts]
+		return Geometry(self.type, parts, spatial_reference)
+
+	def __eq__(self, other):
+		return isinstance(other, Geometry) and self.type == other.type and self.parts == other.parts
+
+	def __ne__(self, other):
+		return not self == other
+
+	__hash__ = None
+
+def _parts(array):
+	if array and isinstance(array[0], (Array, list)) and not isinstance(array[0], Point):
+		return [[(point.X, point.Y) for point in part] for part in array]
+	return [[(point.X, point.Y) for point in array]]
+
+def Polygon(array, spatial_reference=None, has_z=False, has_m=False):
+	return Geometry("polygon", _parts(array), spatial_reference)
+
+def Polyline(array, spatial_reference=None, has_z=False, has_m=False):
+	return Geometry("polyline", _parts(array), spatial_reference)
+
+def Multipoint(array, spatial_reference=None, has_z=False, has_m=False):
+	return Geometry("multipoint", [[(point.X, point.Y)] for point in array], spatial_reference)
+
+def PointGeometry(point, spatial_reference=None, has_z=False, has_m=False):
+	return Geometry("point", [[(point.X, point.Y)]], spatial_reference)
+
+def AsShape(geojson_struct, esri_json=False):
+	if not esri_json:
+		raise RuntimeError("The arcpy stand-in only reads Esri JSON geometries")
+	wkid = (geojson_struct.get("spatialReference") or {}).get("wkid")
+	spatial_reference = SpatialReference(wkid) if wkid else None
+	for key, shape_type in (("rings", "polygon"), ("paths", "polyline")):
+		if key in geojson_struct:
+			return Geometry(shape_type, geojson_struct[key], spatial_reference)
+	if "points" in geojson_struct:
+		return Geometry("multipoint", [[point] for point in geojson_struct["points"]], spatial_reference)
+	return Geometry("point", [[(geojson_struct["x"], geojson_struct["y"])]], spatial_reference)
+
+
+'''
+╔════════╗
+║ Tables ║
+╚════════╝
+'''
+class Field(object):
+	def __init__(self, name, field_type, length=None, editable=True, domain=""):
+		self.name = name
+		self.type = field_type
+		self.length = length or (255 if field_type == "String" else 38 if field_type in ("Guid", "GlobalID") else 4 if field_type in ("OID", "Integer") else 8)
+		self.editable = editable
+		self.domain = domain
+		self.aliasName = name
+		self.isNullable = field_type not in ("OID",)
+		self.required = field_type in ("OID", "Geometry")
+
+class Table(object): # A table or feature class, rows kept as {OID: [values in field order]}
+	def __init__(self, path, shape_type=None, spatial_reference=None, oid_field="OBJECTID", first_oid=1):
+		self.path = path
+		self.name = os.path.basename(str(path).replace("\\", "/"))
+		self.fields = [Field(oid_field, "OID", editable=False)]
+		self.shape_type = shape_type
+		self.spatial_reference = spatial_reference
+		if shape_type:
+			self.fields.append(Field("SHAPE", "Geometry"))
+		self.rows = collections.OrderedDict()
+		self.next_oid = first_oid
+		self.subtype_field = ""
+		self.subtypes = collections.OrderedDict() # code -> name
+		self.default_subtype = None
+
+	@property
+	def oid_field(self):
+		return self.fields[0].name
+
+	def index(self, name): # Position of a field or cursor token in a row
+		upper = name.upper()
+		if upper == "OID@":
+			return 0
+		if upper.startswith("SHAPE@"):
+			if not self.shape_type:
+				raise RuntimeError("A column was specified that does not exist: {0}".format(name))
+			return 1
+		for i, field in enumerate(self.fields):
+			if field.name.upper() == upper:
+				return i
+		raise RuntimeError("A column was specified that does not exist: {0}".format(name))
+
+	def add_field(self, name, field_type, length=None):
+		if [f for f in self.fields if f.name.upper() == name.upper()]:
+			return
+		self.fields.append(Field(name, field_type, length))
+		for values in self.rows.values():
+			values.append(None)
+
+	def delete_field(self, name):
+		i = self.index(name)
+		if self.fields[i].type in ("OID", "Geometry"):
+			return
+		del self.fields[i]
+		for values in self.rows.values():
+			del values[i]
+
+	def insert(self, values):
+		oid = self.next_oid
+		self.next_oid += 1
+		values[0] = oid
+		self.rows[oid] = values
+		return oid
+
+def _new_table(path, table):
+	key = _key(path)
+	if key in TABLES and not env.overwriteOutput:
+		raise ExecuteError("ERROR 000725: Dataset {0} already exists".format(path))
+	TABLES[key] = table
+	return table
+
+def _shapefile(path): # Shapefiles and dbf tables number their rows from 0
+	return _key(path).endswith((".shp", ".dbf"))
+
+
+'''
+╔═════════════════════════╗
+║ Where Clauses and Order ║
+╚═════════════════════════╝
+'''
+WHERE_TOKENS = re.compile(r"\s*(?:(?P<number>-?\d+(?:\.\d*)?)|(?P<string>'(?:[^']|'')*')|(?P<op><>|!=|<=|>=|=|<|>)|(?P<punct>[(),])|(?P<name>[A-Za-z_][A-Za-z0-9_.]*))")
+_where_cache = {}
+
+class _Infix(object): # Binary operator written as left |op| right, for LIKE and BETWEEN
+	def __init__(self, function, left=None):
+		self.function = function
+		self.left = left
+
+	def __ror__(self, left):
+		return _Infix(self.function, left)
+
+	def __or__(self, right):
+		return self.function(self.left, right)
+
+def _like(value, pattern):
+	if value is None or pattern is None:
+		return False
+	expression = "".join(".*" if c == "%" else "." if c == "_" else re.escape(c) for c in pattern)
+	return re.match(expression + r"\Z", value, re.S) is not None
+
+_WHERE_NAMES = {
+	"_LIKE": _Infix(_like),
+	"_NOTLIKE": _Infix(lambda value, pattern: value is not None and not _like(value, pattern)),
+	"_BETWEEN": _Infix(lambda value, bounds: value is not None and bounds[0] <= value <= bounds[1]),
+	"_NOTBETWEEN": _Infix(lambda value, bounds: value is not None and not bounds[0] <= value <= bounds[1])}
+
+def where_predicate(table, where_clause): # Compiles a where clause into a function of a row, for the comparisons, IN lists, LIKE, BETWEEN, NULL tests and AND/OR/NOT of RBJs
+	if not where_clause or not where_clause.strip():
+		return None
+	cache_key = (id(table), tuple(f.name for f in table.fields), where_clause)
+	if cache_key in _where_cache:
+		return _where_cache[cache_key]
+	python = []
+	parens = [] # True for the parentheses of an IN list, which become a tuple
+	in_list = False
+	between = 0 # 1 before the AND of a BETWEEN, 2 before its upper bound
+	pos = 0
+	text = where_clause.strip()
+	while pos < len(text):
+		match = WHERE_TOKENS.match(text, pos)
+		if not match or match.end() == pos:
+			raise RuntimeError("An invalid SQL statement was used: {0}".format(where_clause))
+		pos = match.end()
+		kind = match.lastgroup
+		value = match.group(kind)
+		if kind == "name":
+			upper = value.upper()
+			if upper == "AND" and between == 1:
+				python.append(",")
+				between = 2
+				continue
+			if upper in ("AND", "OR", "NOT", "IN", "IS"):
+				python.append(upper.lower())
+				in_list = upper == "IN"
+			elif upper == "NULL":
+				python.append("None")
+			elif upper in ("LIKE", "BETWEEN"):
+				negate = python and python[-1] == "not"
+				if negate:
+					python.pop()
+				python.append("|_{0}{1}|".format("NOT" if negate else "", upper))
+				if upper == "BETWEEN":
+					python.append("(")
+					between = 1
+			elif upper == "ESCAPE":
+				raise RuntimeError("ESCAPE is not supported by the arcpy stand-in")
+			else:
+				python.append("r[{0}]".format(table.index(value.split(".")[-1])))
+		elif kind == "op":
+			python.append({"=": "==", "<>": "!="}.get(value, value))
+		elif kind == "string":
+			python.append(repr(value[1:-1].replace("''", "'")))
+		elif value == "(":
+			parens.append(in_list)
+			in_list = False
+			python.append("(")
+		elif value == ")":
+			python.append(",)" if parens and parens.pop() else ")")
+		else:
+			python.append(value)
+		if between == 2 and kind in ("number", "string", "name"):
+			python.append(")")
+			between = 0
+	expression = " ".join(python)
+	try:
+		code = eval("lambda r: ({0})".format(expression), dict(_WHERE_NAMES))
+	except SyntaxError:
+		raise RuntimeError("An invalid SQL statement was used: {0}".format(where_clause))
+	def predicate(row):
+		try:
+			return bool(code(row))
+		except TypeError:
+			return False # A comparison with NULL
+	_where_cache[cache_key] = predicate
+	return predicate
+
+def _select(table, where_clause=None, sql_clause=None): # Rows matching the where clause, in OID or ORDER BY order
+	predicate = where_predicate(table, where_clause)
+	rows = [values for values in table.rows.values() if predicate is None or predicate(values)]
+	order = (sql_clause or (None, None))[1]
+	if order:
+		match = re.match(r"\s*ORDER BY\s+(\w+)(?:\s+(ASC|DESC))?", order, re.I)
+		if match:
+			i = table.index(match.group(1))
+			rows.sort(key=lambda values: (values[i] is None, values[i]), reverse=(match.group(2) or "").upper() == "DESC")
+	return rows
+
+
+'''
+╔═══════════════════════╗
+║ Geoprocessing Results ║
+╚═══════════════════════╝
+'''
+class Result(object):
+	def __init__(self, *outputs):
+		self.outputs = outputs
+
+	def getOutput(self, index):
+		return self.outputs[index]
+
+class _Env(object):
+	def __init__(self):
+		self.overwriteOutput = False
+		self.workspace = None
+		self.scratchWorkspace = None
+
+env = _Env()
+
+def AddMessage(message):
+	MESSAGES.append((0, u"{0}".format(message)))
+	if ECHO:
+		sys.stdout.write(u"{0}\n".format(message))
+
+def AddWarning(message):
+	MESSAGES.append((1, u"{0}".format(message)))
+	if ECHO:
+		sys.stdout.write(u"WARNING {0}\n".format(message))
+
+def AddError(message):
+	MESSAGES.append((2, u"{0}".format(message)))
+	if ECHO:
+		sys.stdout.write(u"ERROR {0}\n".format(message))
+
+def GetArgumentCount():
+	return len(sys.argv) - 1
+
+def GetParameterAsText(index):
+	return sys.argv[index + 1] if index + 1 < len(sys.argv) else ""
+
+def CheckExtension(extension):
+	return "Available"
+
+def CheckOutExtension(extension):
+	return "CheckedOut"
+
+def CheckInExtension(extension):
+	return "CheckedIn"
+
+def AddFieldDelimiters(datasource, field):
+	return field
+
+def Exists(path):
+	return bool(path) and (_key(path) in TABLES or _key(path) in WORKSPACES)
+
+
+'''
+╔═══════════╗
+║ Workspace ║
+╚═══════════╝
+'''
+def CreateFileGDB_management(out_folder_path, out_name, out_version="CURRENT"):
+	name = out_name if out_name.lower().endswith(".gdb") else out_name + ".gdb"
+	path = os.path.join(out_folder_path, name)
+	if not os.path.isdir(path):
+		os.makedirs(path)
+	WORKSPACES.add(_key(path))
+	return Result(path)
+
+def CreateFeatureDataset_management(out_dataset_path, out_name, spatial_reference=None):
+	path = os.path.join(out_dataset_path, out_name)
+	WORKSPACES.add(_key(path))
+	return Result(path)
+
+def CreateFeatureclass_management(out_path, out_name, geometry_type=None, template=None, has_m="DISABLED", has_z="DISABLED", spatial_reference=None, *args, **kwargs):
+	path = os.path.join(out_path, out_name)
+	table = _new_table(path, Table(path, SHAPE_TYPES.get((geometry_type or "POLYGON").upper(), "Polygon"), spatial_reference or SpatialReference(), "FID" if _shapefile(path) else "OBJECTID", 0 if _shapefile(path) else 1))
+	if _shapefile(path):
+		table.add_field("Id", "Integer") # The placeholder field ArcGIS gives new shapefiles
+	return Result(path)
+
+def CreateTable_management(out_path, out_name, template=None, *args, **kwargs):
+	path = os.path.join(out_path, out_name)
+	table = _new_table(path, Table(path, oid_field="OID" if _shapefile(path) else "OBJECTID", first_oid=0 if _shapefile(path) else 1))
+	if _shapefile(path):
+		table.add_field("Field1", "Integer") # The placeholder field ArcGIS gives new dbf tables
+	return Result(path)
+
+def AddField_management(in_table, field_name, field_type, field_precision=None, field_scale=None, field_length=None, field_alias=None, field_is_nullable=None, field_is_required=None, field_domain=None):
+	table = _table(in_table)
+	table.add_field(field_name, FIELD_TYPES.get(field_type.upper(), field_type), field_length)
+	if field_domain:
+		table.fields[table.index(field_name)].domain = field_domain
+	return Result(in_table)
+
+def DeleteField_management(in_table, drop_field):
+	table = _table(in_table)
+	for name in (drop_field if isinstance(drop_field, (list, tuple)) else str(drop_field).split(";")):
+		table.delete_field(name)
+	return Result(in_table)
+
+def SetSubtypeField_management(in_table, field=None, clear_value=False):
+	_table(in_table).subtype_field = "" if clear_value else field
+	return Result(in_table)
+
+def AddSubtype_management(in_table, subtype_code, subtype_description):
+	_table(in_table).subtypes[int(subtype_code)] = subtype_description
+	return Result(in_table)
+
+def SetDefaultSubtype_management(in_table, subtype_code):
+	_table(in_table).default_subtype = int(subtype_code)
+	return Result(in_table)
+
+def _workspace_key(path):
+	key = _key(path)
+	while key and not key.endswith(".gdb"):
+		parent = os.path.dirname(key)
+		if parent == key:
+			break
+		key = parent
+	return key
+
+def CreateDomain_management(in_workspace, domain_name, domain_description=None, field_type="SHORT", domain_type="CODED", *args, **kwargs):
+	DOMAINS[(_workspace_key(in_workspace), domain_name)] = {}
+	return Result(in_workspace)
+
+def AddCodedValueToDomain_management(in_workspace, domain_name, code, code_description):
+	DOMAINS[(_workspace_key(in_workspace), domain_name)][code] = code_description
+	return Result(in_workspace)
+
+def AssignDomainToField_management(in_table, field_name, domain_name, subtype_code=None):
+	table = _table(in_table)
+	table.fields[table.index(field_name)].domain = domain_name
+	return Result(in_table)
+
+def ListFields(dataset, wild_card=None, field_type=None):
+	fields = list(_table(dataset).fields)
+	if wild_card:
+		pattern = re.compile("^" + re.escape(wild_card).replace("\\*", ".*") + "$", re.I)
+		fields = [f for f in fields if pattern.match(f.name)]
+	return fields
+
+class _Describe(object):
+	pass
+
+def Describe(value):
+	table = TABLES.get(_key(value))
+	desc = _Describe()
+	desc.catalogPath = value
+	desc.name = os.path.basename(str(value).replace("\\", "/"))
+	if table is None:
+		if _key(value) not in WORKSPACES:
+			raise IOError("\"{0}\" does not exist".format(value))
+		desc.dataType = "Workspace" if _key(value).endswith(".gdb") else "FeatureDataset"
+		return desc
+	desc.dataType = "FeatureClass" if table.shape_type else "Table"
+	desc.OIDFieldName = table.oid_field
+	desc.hasOID = True
+	desc.fields = list(table.fields)
+	desc.editorTrackingEnabled = False
+	desc.subtypeFieldName = table.subtype_field
+	if table.shape_type:
+		# Tables have no shapeType at all, which run_rbj.py tests with hasattr
+		desc.shapeType = table.shape_type
+		desc.shapeFieldName = "SHAPE"
+		desc.spatialReference = table.spatial_reference or SpatialReference()
+		shapes = [values[1] for values in table.rows.values() if values[1] is not None]
+		extents = [shape.extent for shape in shapes]
+		extents = [e for e in extents if e.XMin is not None]
+		desc.extent = Extent(min(e.XMin for e in extents), min(e.YMin for e in extents), max(e.XMax for e in extents), max(e.YMax for e in extents)) if extents else Extent(0.0, 0.0, 0.0, 0.0)
+	return desc
+
+def GetCount_management(in_rows):
+	return Result(str(len(_table(in_rows).rows)))
+
+def TruncateTable_management(in_table):
+	_table(in_table).rows.clear()
+	return Result(in_table)
+
+def DeleteRows_management(in_rows):
+	return TruncateTable_management(in_rows)
+
+def Delete_management(in_data, data_type=None):
+	key = _key(in_data)
+	for table_key in [k for k in TABLES if k == key or k.startswith(key + os.sep)]:
+		del TABLES[table_key]
+	for workspace in [k for k in WORKSPACES if k == key or k.startswith(key + os.sep)]:
+		WORKSPACES.discard(workspace)
+	if os.path.isdir(str(in_data)) and str(in_data).lower().endswith(".gdb"):
+		shutil.rmtree(str(in_data), ignore_errors=True)
+	return Result(in_data)
+
+def Copy_management(in_data, out_data, data_type=None):
+	source = _key(in_data)
+	target = _key(out_data)
+	if source in WORKSPACES and not os.path.isdir(str(out_data)) and source.endswith(".gdb"):
+		os.makedirs(str(out_data))
+	for workspace in [k for k in WORKSPACES if k == source or k.startswith(source + os.sep)]:
+		WORKSPACES.add(target + workspace[len(source):])
+	for table_key in [k for k in TABLES if k == source or k.startswith(source + os.sep)]:
+		table = copy.deepcopy(TABLES[table_key])
+		table.path = target + table_key[len(source):]
+		TABLES[target + table_key[len(source):]] = table
+	for (workspace, name), codes in list(DOMAINS.items()):
+		if workspace == source:
+			DOMAINS[(target, name)] = dict(codes)
+	return Result(out_data)
+
+def Compact_management(in_workspace):
+	return Result(in_workspace)
+
+def MakeFeatureLayer_management(in_features, out_layer, where_clause=None, *args, **kwargs):
+	raise NotImplementedError("Layers and AOI selections aren't covered by the arcpy stand-in")
+
+def SelectLayerByLocation_management(*args, **kwargs):
+	raise NotImplementedError("Layers and AOI selections aren't covered by the arcpy stand-in")
+
+
+'''
+╔═══════════════╗
+║ Data Reviewer ║
+╚═══════════════╝
+'''
+# Reviewer workspaces get the tables of the shipped reviewer geodatabase, read through fgdb_reader
+REVIEWER_TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))), "RBJ_Reviewer_Geodatabase_TDSv7_1.gdb")
+REVIEWER_SCHEMA = [] # (table name, shape type, OID field, [(field, type, length, editable)]) of the template, read when first needed
+
+def reviewer_schema(): # The reviewer tables of REVIEWER_TEMPLATE, read once
+	if not REVIEWER_SCHEMA:
+		repo_dir = os.path.dirname(REVIEWER_TEMPLATE)
+		if repo_dir not in sys.path:
+			sys.path.insert(0, repo_dir)
+		from fgdb_reader import FileGDB
+		gdb = FileGDB(REVIEWER_TEMPLATE)
+		for name in gdb.tables():
+			with gdb.table(name) as table:
+				oid_field = [f.name for f in table.fields if f.type == "OID"][0]
+				# SHAPE_Length and SHAPE_Area are kept up to date by the geodatabase, not edited
+				fields = [(f.name, f.type, f.length, f.name.upper() not in ("SHAPE_LENGTH", "SHAPE_AREA")) for f in table.fields if f.type not in ("OID", "Geometry")]
+				REVIEWER_SCHEMA.append((os.path.join("REVDATASET", name) if table.shape_type else name, table.shape_type, oid_field, fields))
+	return REVIEWER_SCHEMA
+
+def CreateReviewerWorkspace_Reviewer(reviewer_workspace, storage_type="STANDARD", spatial_reference=None, *args, **kwargs):
+	WORKSPACES.add(_key(os.path.join(reviewer_workspace, "REVDATASET")))
+	for name, shape_type, oid_field, fields in reviewer_schema():
+		path = os.path.join(reviewer_workspace, name)
+		table = _new_table(path, Table(path, shape_type, spatial_reference or SpatialReference(), oid_field))
+		for field_name, field_type, length, editable in fields:
+			table.fields.append(Field(field_name, field_type, length or None, editable))
+	return Result(reviewer_workspace)
+
+def CreateReviewerSession_Reviewer(reviewer_workspace, session_name, session_template=None, *args, **kwargs):
+	table = _table(os.path.join(reviewer_workspace, "REVSESSIONTABLE"))
+	values = [None] * len(table.fields)
+	values[table.index("SESSIONNAME")] = session_name
+	table.insert(values)
+	return Result(reviewer_workspace)
+
+def ExecuteReviewerBatchJob_Reviewer(reviewer_workspace, session, batch_job_file, production_workspace=None, analysis_area=None, *args, **kwargs):
+	BATCH_JOBS.append((batch_job_file, production_workspace, analysis_area))
+	if BATCH_JOB is not None:
+		BATCH_JOB(reviewer_workspace, session, batch_job_file, production_workspace, analysis_area)
+	return Result(reviewer_workspace)
+
+from arcpy import da
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+# arcpy.da stand-in - cursors, Walk, ListSubtypes and FeatureClassToNumPyArray over the in-memory tables of the arcpy stand-in
+
+import os
+import operator
+import arcpy
+from arcpy import _table, _key, _select, Geometry
+
+def _getter(table, token): # Function returning a cursor token's value from a row
+	upper = token.upper()
+	i = table.index(token)
+	if upper == "SHAPE@XY":
+		def xy(values):
+			shape = values[i]
+			if shape is None:
+				return (None, None)
+			centroid = shape.centroid
+			return (centroid.X, centroid.Y)
+		return xy
+	if upper == "SHAPE@WKB":
+		return lambda values: values[i].WKB if values[i] is not None else None
+	if upper == "SHAPE@JSON":
+		return lambda values: values[i].JSON if values[i] is not None else None
+	if upper in ("SHAPE@X", "SHAPE@Y"):
+		return lambda values: getattr(values[i].centroid, upper[-1]) if values[i] is not None else None
+	return operator.itemgetter(i)
+
+def _shape_value(table, token, value): # A value inserted through a SHAPE@ token as a Geometry
+	if value is None or isinstance(value, Geometry):
+		return value
+	if token.upper() == "SHAPE@XY":
+		return Geometry("point", [[value]], table.spatial_reference)
+	raise RuntimeError("The arcpy stand-in only inserts SHAPE@ geometries and SHAPE@XY tuples")
+
+class _Cursor(object):
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.rows = iter(())
+
+	def __iter__(self):
+		return self
+
+	def __next__(self):
+		return self.next()
+
+class SearchCursor(_Cursor):
+	def __init__(self, in_table, field_names, where_clause=None, spatial_reference=None, explode_to_points=False, sql_clause=(None, None), **kwargs):
+		table = _table(in_table)
+		if isinstance(field_names, str) or not hasattr(field_names, "__iter__"):
+			field_names = [name.strip() for name in str(field_names).split(";")] if field_names != "*" else [f.name for f in table.fields]
+		self.fields = tuple(field_names)
+		self.getters = [_getter(table, name) for name in field_names]
+		self.source = _select(table, where_clause, sql_clause)
+		self.reset()
+
+	def reset(self):
+		self.rows = iter(self.source)
+
+	def next(self):
+		values = next(self.rows)
+		return tuple(getter(values) for getter in self.getters)
+
+class UpdateCursor(_Cursor):
+	def __init__(self, in_table, field_names, where_clause=None, spatial_reference=None, explode_to_points=False, sql_clause=(None, None), **kwargs):
+		self.table = _table(in_table)
+		self.fields = tuple(field_names)
+		self.indexes = [self.table.index(name) for name in field_names]
+		self.getters = [_getter(self.table, name) for name in field_names]
+		self.source = _select(self.table, where_clause, sql_clause)
+		self.current = None
+		self.reset()
+
+	def reset(self):
+		self.rows = iter(self.source)
+
+	def next(self):
+		self.current = next(self.rows)
+		return [getter(self.current) for getter in self.getters]
+
+	def updateRow(self, row):
+		for name, i, value in zip(self.fields, self.indexes, row):
+			if i == 0:
+				continue
+			self.current[i] = _shape_value(self.table, name, value) if name.upper().startswith("SHAPE@") else value
+
+	def deleteRow(self):
+		self.table.rows.pop(self.current[0], None)
+
+class InsertCursor(object):
+	def __init__(self, in_table, field_names, **kwargs):
+		self.table = _table(in_table)
+		self.fields = tuple(field_names)
+		self.indexes = [self.table.index(name) for name in field_names]
+		self.shapes = [name.upper().startswith("SHAPE@") for name in field_names]
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		pass
+
+	def insertRow(self, row):
+		values = [None] * len(self.table.fields)
+		if self.table.default_subtype is not None and self.table.subtype_field:
+			values[self.table.index(self.table.subtype_field)] = self.table.default_subtype
+		for name, i, shape, value in zip(self.fields, self.indexes, self.shapes, row):
+			if i:
+				values[i] = _shape_value(self.table, name, value) if shape else value
+		return self.table.insert(values)
+
+def Walk(top, topdown=True, onerror=None, followlinks=False, datatype=None, type=None):
+	# Like os.walk over a geodatabase, yielding the feature datasets as directories
+	root = _key(top)
+	wanted = {"FeatureClass": True, "Table": False}.get(datatype)
+	datasets = {}
+	top_level = []
+	for key, table in arcpy.TABLES.items():
+		if not key.startswith(root + os.sep) or (wanted is not None and bool(table.shape_type) != wanted):
+			continue
+		parts = key[len(root) + 1:].split(os.sep)
+		if len(parts) == 1:
+			top_level.append(table.name)
+		elif len(parts) == 2:
+			dataset = os.path.basename(os.path.dirname(str(table.path).replace("\\", "/")))
+			datasets.setdefault(dataset, []).append(table.name)
+	yield top, sorted(datasets), top_level
+	for dataset in sorted(datasets):
+		yield os.path.join(top, dataset), [], datasets[dataset]
+
+def ListSubtypes(table):
+	table = _table(table)
+	if not table.subtype_field:
+		return {0: {"Name": table.name, "SubtypeField": "", "Default": True, "FieldValues": {}}}
+	return dict((code, {"Name": name, "SubtypeField": table.subtype_field, "Default": code == table.default_subtype, "FieldValues": {}}) for code, name in table.subtypes.items())
+
+NUMPY_TYPES = {"OID": "<i4", "Integer": "<i4", "SmallInteger": "<i2", "Double": "<f8", "Single": "<f4", "Date": "<M8[us]"}
+
+def FeatureClassToNumPyArray(in_table, field_names, where_clause=None, spatial_reference=None, explode_to_points=False, skip_nulls=False, null_value=None):
+	import numpy as np
+	table = _table(in_table)
+	rows = _select(table, where_clause)
+	dtype = []
+	getters = []
+	for name in field_names:
+		i = table.index(name)
+		field = table.fields[i]
+		dtype.append((str(name), NUMPY_TYPES.get(field.type, "<U{0}".format(field.length))))
+		getters.append((name, operator.itemgetter(i)))
+	data = []
+	for values in rows:
+		record = []
+		for name, getter in getters:
+			value = getter(values)
+			if value is None:
+				if isinstance(null_value, dict):
+					if name not in null_value:
+						raise RuntimeError("Null value found in field {0}, use the null_value parameter".format(name))
+					value = null_value[name]
+				elif null_value is not None:
+					value = null_value
+				elif skip_nulls:
+					record = None
+					break
+				else:
+					raise RuntimeError("Null value found in field {0}, use the null_value parameter".format(name))
+			record.append(value)
+		if record is not None:
+			data.append(tuple(record))
+	return np.array(data, dtype=dtype)
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+# ======================================= #
+#  Synthetic TDS v7.1 database generator  #
+# ======================================= #
+
+# Builds a TDS v7.1 shaped file geodatabase with the feature classes, subtypes, fields and domains the given RBJs test
+# python benchmarks/generate_tds.py <out.gdb> [--features 1000] [--seed 1] [--rbj file.rbj ...] [--standin]
+
+import os
+import sys
+import random
+import hashlib
+import argparse
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+STANDIN_DIR = os.path.join(BENCHMARK_DIR, "arcpy_standin")
+
+TDS_DATASET = "TDS"
+SENTINEL_NUMBER = -999999
+SENTINEL_TEXT = "noInformation"
+# Fields every TDS feature class has, whether the RBJs test them or not
+COMMON_FIELDS = (("F_CODE", "TEXT", 5), ("FCSUBTYPE", "LONG", None), ("UFI", "TEXT", 254), ("ZI001_SDV", "TEXT", 20))
+SHAPE_TYPES = {"PNT": "POINT", "CRV": "POLYLINE", "SRF": "POLYGON"}
+# Share of the values drawn from the tested values, the sentinel and NULL, the rest are untested values
+TESTED_SHARE = 0.45
+SENTINEL_SHARE = 0.2
+NULL_SHARE = 0.07
+UNTESTED_SUBTYPE = 999999 # Subtype no check is filtered to
+
+def use_standin(): # Puts the arcpy stand-in ahead of any installed arcpy
+	if STANDIN_DIR not in sys.path:
+		sys.path.insert(0, STANDIN_DIR)
+	if REPO_DIR not in sys.path:
+		sys.path.insert(0, REPO_DIR)
+
+def node_literals(node, fields, nullable): # Adds {FIELD: set(values)} compared against in a where clause node tree, and the fields tested for NULL
+	kind = node[0]
+	if kind in ("and", "or"):
+		for child in node[1]:
+			node_literals(child, fields, nullable)
+	elif kind == "not":
+		node_literals(node[1], fields, nullable)
+	elif kind == "cmp":
+		for field, value in ((node[2], node[3]), (node[3], node[2])):
+			if field[0] == "field" and value[0] == "lit":
+				fields.setdefault(field[1], set()).add(value[1])
+			elif field[0] == "field":
+				fields.setdefault(field[1], set())
+	elif kind == "in" and node[1][0] == "field":
+		fields.setdefault(node[1][1], set()).update(value for value in node[2] if value is not None)
+	elif kind == "null" and node[1][0] == "field":
+		fields.setdefault(node[1][1], set())
+		nullable.add(node[1][1])
+	elif kind == "like" and node[1][0] == "field":
+		fields.setdefault(node[1][1], set()).add(node[2].replace("%", "").replace("_", ""))
+	elif kind == "between" and node[1][0] == "field":
+		fields.setdefault(node[1][1], set()).update(operand[1] for operand in node[2:] if operand[0] == "lit")
+
+def rbj_schema(rbj_files): # Returns {dataset: {"subtypes": set(codes), "fields": {FIELD: set(values)}}} for every dataset the RBJs read
+	import rbj_model
+	import native_sql
+	schema = {}
+	for rbj_file in rbj_files:
+		for check in rbj_model.load_rbj(rbj_file).checks:
+			resources = [(check.dataset, check.subtype, check.where_clause)] + [(dataset, subtype, where) for name, dataset, field, subtype, where in check.secondary]
+			for dataset, subtype, where_clause in resources:
+				if not dataset:
+					continue
+				entry = schema.setdefault(dataset, {"subtypes": set(), "fields": {}})
+				if subtype is not None:
+					entry["subtypes"].add(int(subtype))
+				if where_clause:
+					try:
+						node_literals(native_sql.parse_where_clause(where_clause), entry["fields"], set())
+					except native_sql.SQLCompileError:
+						pass # Left to the untested values of the fields the other checks read
+	return schema
+
+def field_type(values): # AddField type for the values a field is compared against
+	if any(not isinstance(value, (int, float)) for value in values):
+		return "TEXT"
+	if any(isinstance(value, float) and not value.is_integer() for value in values):
+		return "DOUBLE"
+	return "LONG"
+
+def shape_type(dataset): # TDS feature classes end in Pnt, Crv or Srf
+	return SHAPE_TYPES.get(dataset[-3:].upper(), "POLYGON")
+
+def random_value(rng, ftype, tested): # One attribute value, tested, sentinel, NULL or untested
+	draw = rng.random()
+	if tested and draw < TESTED_SHARE:
+		return rng.choice(tested)
+	if draw < TESTED_SHARE + SENTINEL_SHARE:
+		return SENTINEL_TEXT if ftype == "TEXT" else SENTINEL_NUMBER
+	if draw < TESTED_SHARE + SENTINEL_SHARE + NULL_SHARE:
+		return None
+	if ftype == "TEXT":
+		return "value{0}".format(rng.randint(1, 50))
+	if ftype == "DOUBLE":
+		return round(rng.uniform(0, 1000), 3)
+	return rng.randint(1, 1000)
+
+def random_shape(ap, rng, shape, spatial_reference): # A small point, line or square within a one degree cell
+	x = rng.uniform(0.0, 1.0)
+	y = rng.uniform(0.0, 1.0)
+	if shape == "POINT":
+		return ap.PointGeometry(ap.Point(x, y), spatial_reference)
+	if shape == "POLYLINE":
+		points = [ap.Point(x, y)]
+		for i in range(rng.randint(1, 4)):
+			points.append(ap.Point(points[-1].X + rng.uniform(-0.005, 0.005), points[-1].Y + rng.uniform(-0.005, 0.005)))
+		return ap.Polyline(ap.Array(points), spatial_reference)
+	size = rng.uniform(0.0005, 0.005)
+	return ap.Polygon(ap.Array([ap.Point(x, y), ap.Point(x, y + size), ap.Point(x + size, y + size), ap.Point(x + size, y), ap.Point(x, y)]), spatial_reference)
+
+def dataset_random(seed, dataset): # Random generator of a dataset, so its features don't change when other datasets are added
+	return random.Random(int(hashlib.sha1("{0}:{1}".format(seed, dataset).encode("utf-8")).hexdigest()[:12], 16))
+
+def generate(gdb_path, schema, features=1000, seed=1): # Builds the database from rbj_schema output, returns {dataset: feature count}
+	import arcpy as ap
+	folder, name = os.path.split(os.path.abspath(gdb_path))
+	gdb = ap.CreateFileGDB_management(folder, name).getOutput(0)
+	spatial_reference = ap.SpatialReference(4326)
+	ap.CreateFeatureDataset_management(gdb, TDS_DATASET, spatial_reference)
+	feature_dataset = os.path.join(gdb, TDS_DATASET)
+
+	# A field compared in several feature classes gets one domain of every value tested on it
+	field_values = {}
+	for entry in schema.values():
+		for field, values in entry["fields"].items():
+			field_values.setdefault(field, set()).update(values)
+	field_types = dict((field, field_type(values)) for field, values in field_values.items())
+	for field, ftype in field_types.items():
+		if field_values[field] and field not in ("FCSUBTYPE", "F_CODE"):
+			ap.CreateDomain_management(gdb, "{0}_domain".format(field), field, "TEXT" if ftype == "TEXT" else ftype, "CODED")
+			for value in sorted(field_values[field] | set([SENTINEL_TEXT if ftype == "TEXT" else SENTINEL_NUMBER]), key=repr):
+				ap.AddCodedValueToDomain_management(gdb, "{0}_domain".format(field), value, str(value))
+
+	counts = {}
+	for dataset in sorted(schema):
+		entry = schema[dataset]
+		rng = dataset_random(seed, dataset)
+		shape = shape_type(dataset)
+		ap.CreateFeatureclass_management(feature_dataset, dataset, shape, spatial_reference=spatial_reference)
+		fc = os.path.join(feature_dataset, dataset)
+		fields = [(field, ftype, length) for field, ftype, length in COMMON_FIELDS]
+		fields += [(field, field_types[field], 254 if field_types[field] == "TEXT" else None) for field in sorted(entry["fields"]) if field not in [common[0] for common in COMMON_FIELDS]]
+		for field, ftype, length in fields:
+			ap.AddField_management(fc, field, ftype, field_length=length)
+			if field_values.get(field) and field not in ("FCSUBTYPE", "F_CODE"):
+				ap.AssignDomainToField_management(fc, field, "{0}_domain".format(field))
+		# Every tested subtype, plus one no check is filtered to
+		subtypes = sorted(entry["subtypes"]) + [UNTESTED_SUBTYPE]
+		ap.SetSubtypeField_management(fc, "FCSUBTYPE")
+		for code in subtypes:
+			ap.AddSubtype_management(fc, code, "Subtype {0}".format(code))
+		ap.SetDefaultSubtype_management(fc, subtypes[0])
+
+		tested = dict((field, sorted(entry["fields"].get(field, ()), key=repr)) for field, ftype, length in fields)
+		count = int(features * (0.5 + rng.random()))
+		names = [field for field, ftype, length in fields]
+		with ap.da.InsertCursor(fc, ["SHAPE@"] + names) as cursor:
+			for i in range(count):
+				row = [random_shape(ap, rng, shape, spatial_reference)]
+				for field, ftype, length in fields:
+					if field == "FCSUBTYPE":
+						row.append(rng.choice(subtypes))
+					elif field == "F_CODE":
+						row.append(dataset[:2].upper() + "{0:03d}".format(rng.randint(0, 999)))
+					elif field == "UFI":
+						row.append("{{{0:08X}-0000-0000-0000-{1:012X}}}".format(rng.getrandbits(32), i))
+					elif field == "ZI001_SDV":
+						row.append(rng.choice([SENTINEL_TEXT, "2021-05-06", "2020-10-26"]))
+					else:
+						row.append(random_value(rng, ftype, tested[field]))
+				cursor.insertRow(row)
+		counts[dataset] = count
+	return counts
+
+def default_rbjs(): # Every shipped RBJ outside the archive
+	rbj_dir = os.path.join(REPO_DIR, "RBJs")
+	return sorted(os.path.join(root, name) for root, dirs, files in os.walk(rbj_dir) if "_archive" not in root for name in files if name.lower().endswith(".rbj"))
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Builds a synthetic TDS v7.1 shaped geodatabase for the RBJs")
+	parser.add_argument("gdb", help="Output file geodatabase")
+	parser.add_argument("--features", type=int, default=1000, help="Average features per feature class")
+	parser.add_argument("--seed", type=int, default=1)
+	parser.add_argument("--rbj", action="append", help="RBJ whose datasets to generate, every shipped RBJ by default")
+	parser.add_argument("--standin", action="store_true", help="Use the arcpy stand-in and pickle the result next to the gdb")
+	args = parser.parse_args()
+	if args.standin:
+		use_standin()
+	elif REPO_DIR not in sys.path:
+		sys.path.insert(0, REPO_DIR)
+	counts = generate(args.gdb, rbj_schema(args.rbj or default_rbjs()), args.features, args.seed)
+	if args.standin:
+		import arcpy
+		arcpy.save(args.gdb + ".pkl")
+	print("{0} features in {1} feature classes".format(sum(counts.values()), len(counts)))
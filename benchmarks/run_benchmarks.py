@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+# =========================== #
+#  Run RBJ Checks benchmarks  #
+# =========================== #
+
+# Times loading, checking and reporting of the shipped RBJs against a synthetic TDS database, one process per scenario
+# Without --arcgis the arcpy stand-in runs the batch job's SQL checks through the native engine
+# python benchmarks/run_benchmarks.py [--features 1000] [--scenario name ...] [--out results.json] [--compare earlier.json]
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import argparse
+import subprocess
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+RBJ_DIR = os.path.join(REPO_DIR, "RBJs")
+sys.path.insert(0, BENCHMARK_DIR)
+import generate_tds
+
+BABY_GATE_50K = os.path.join(RBJ_DIR, "Baby_GATE_RBJs", "RBJ_50K_simplified.rbj")
+LEIDOS_50K_COND = os.path.join(RBJ_DIR, "Leidos_RBJ_checks_20210506", "JG020-234_50K_Cond_20210506.rbj")
+MAXAR_V2 = [os.path.join(RBJ_DIR, "Maxar_RBJs_v2", name) for name in (
+	"v2_Act1_SURGE_PA_Prep_Maxar_RBJ.rbj", "v2_Act2_Currency_Refresh_Maxar_RBJ.rbj",
+	"v2_Act3_Data_Conditioning_Maxar_RBJ.rbj", "v2_Act4_Continual_Enrichment_Maxar_RBJ.rbj")]
+
+# Scenario name -> tool parameters it runs with, RBJs in rbj_files run together as one multiple value parameter
+SCENARIOS = {
+	"baby_gate_50k_batch_job": {"rbj_files": [BABY_GATE_50K], "engine": "Batch Job"},
+	"baby_gate_50k_native_sql": {"rbj_files": [BABY_GATE_50K], "engine": "Native SQL"},
+	"baby_gate_50k_columnar": {"rbj_files": [BABY_GATE_50K], "engine": "Columnar"},
+	"baby_gate_50k_chunked_export": {"rbj_files": [BABY_GATE_50K], "engine": "Native SQL", "export_chunk_size": 1000},
+	"leidos_50k_cond_native_sql": {"rbj_files": [LEIDOS_50K_COND], "engine": "Native SQL"},
+	"leidos_50k_cond_columnar": {"rbj_files": [LEIDOS_50K_COND], "engine": "Columnar"},
+	"maxar_v2_all_acts_native_sql": {"rbj_files": MAXAR_V2, "engine": "Native SQL"},
+}
+PHASES = ("load", "run", "report")
+
+def peak_memory_mb(): # Peak resident memory of this process in MB, None where it can't be read
+	try:
+		import resource
+	except ImportError:
+		try:
+			import psutil
+			return round(psutil.Process().memory_info().peak_wset / 1048576.0, 1)
+		except (ImportError, AttributeError):
+			return None
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# Linux reports KB, macOS bytes
+	return round(peak / (1048576.0 if sys.platform == "darwin" else 1024.0), 1)
+
+def git_commit(): # Commit the benchmarks ran on, marked dirty when the RBJ Checks modules have uncommitted changes
+	try:
+		commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR).decode().strip()
+		dirty = subprocess.check_output(["git", "status", "--porcelain", "--", ":(glob)*.py"], cwd=REPO_DIR).decode().strip()
+		return commit + ("-dirty" if dirty else "")
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def results_digest(reviewer_gdb): # SHA-1 of the sorted errors in REVTABLEMAIN, equal when two runs found the same errors
+	import arcpy as ap
+	rows = []
+	with ap.da.SearchCursor(os.path.join(reviewer_gdb, "REVTABLEMAIN"), ["ORIGINTABLE", "OBJECTID", "CHECKTITLE", "SUBTYPE"]) as cursor:
+		for row in cursor:
+			rows.append(tuple(u"" if value is None else u"{0}".format(value) for value in row))
+	digest = hashlib.sha1()
+	for row in sorted(rows):
+		digest.update(u"\t".join(row).encode("utf-8") + b"\n")
+	return len(rows), digest.hexdigest()
+
+def standin_batch_job(cache_dir): # Batch job hook for the stand-in, running the RBJ's SQL checks natively
+	import rbj_model
+	import native_sql
+	def batch_job(reviewer_gdb, session, rbj_file, production_gdb, AOI):
+		native_sql.run_native_sql(rbj_model.load_rbj(rbj_file, cache_dir), production_gdb, reviewer_gdb, session, AOI, rbj_file=rbj_file)
+	return batch_job
+
+def run_scenario(name, production_gdb, work_dir): # Runs one scenario in this process, returns its results
+	import arcpy as ap
+	import rbj_common
+	import rbj_model
+	import tiling
+	import reviewer_sessions
+	import frequency_report
+	import error_export
+	import multiple_rbjs
+	scenario = SCENARIOS[name]
+	cache_dir = os.path.join(work_dir, "cache")
+	output_folder = os.path.join(work_dir, "output")
+	os.makedirs(output_folder)
+	if getattr(ap, "BATCH_JOB", False) is None:
+		ap.BATCH_JOB = standin_batch_job(cache_dir)
+	reviewer_gdb = ap.CreateFileGDB_management(work_dir, "reviewer.gdb").getOutput(0)
+	ap.CreateReviewerWorkspace_Reviewer(reviewer_gdb, "STANDARD", ap.SpatialReference(4326))
+	rbj_files = scenario["rbj_files"]
+	names = [os.path.basename(path) for path in rbj_files]
+	engine = scenario["engine"]
+	seconds = {}
+
+	# Every scenario starts from an empty RBJ cache, so loading times the parse
+	start = time.time()
+	rbjs = [rbj_model.load_rbj(path, cache_dir) for path in rbj_files]
+	seconds["load"] = time.time() - start
+
+	start = time.time()
+	session = reviewer_sessions.run_session(reviewer_gdb, ", ".join(names))
+	if len(rbjs) > 1:
+		owned = multiple_rbjs.run_rbjs(engine, rbjs, rbj_files, names, production_gdb, reviewer_gdb, session)
+	else:
+		tiling.run_all_checks(engine, rbjs[0], rbj_files[0], production_gdb, reviewer_gdb, session)
+	seconds["run"] = time.time() - start
+	run_memory = peak_memory_mb()
+
+	start = time.time()
+	export_chunk_size = scenario.get("export_chunk_size", 0)
+	breakdowns = sorted(frequency_report.FREQUENCY_BREAKDOWNS)
+	if len(rbjs) > 1:
+		multiple_rbjs.write_rbj_reports(reviewer_gdb, owned, names, output_folder, export_chunk_size, breakdowns, session)
+	else:
+		error_export.write_reports(reviewer_gdb, output_folder, export_chunk_size, breakdowns, session)
+	seconds["report"] = time.time() - start
+
+	fc_paths = rbj_common.feature_class_paths(production_gdb)
+	datasets = set(dataset.upper() for rbj in rbjs for dataset in rbj.datasets())
+	features = sum(rbj_common.get_count(fc_paths[dataset]) for dataset in datasets if dataset in fc_paths)
+	errors, digest = results_digest(reviewer_gdb)
+	return {
+		"engine": engine, "rbjs": names, "checks": sum(len(rbj) for rbj in rbjs), "features": features, "errors": errors, "results_sha1": digest,
+		"seconds": dict((phase, round(seconds[phase], 3)) for phase in PHASES),
+		"features_per_second": round(features / seconds["run"], 1) if seconds["run"] else None,
+		"peak_memory_mb": {"run": run_memory, "total": peak_memory_mb()}}
+
+def child(name, production_gdb, data_file): # Entry point of the scenario processes, prints the results as JSON
+	if data_file:
+		generate_tds.use_standin()
+		import arcpy
+		arcpy.load(data_file)
+	elif REPO_DIR not in sys.path:
+		sys.path.insert(0, REPO_DIR)
+	work_dir = tempfile.mkdtemp(prefix="rbj_benchmark_")
+	try:
+		results = run_scenario(name, production_gdb, work_dir)
+	finally:
+		shutil.rmtree(work_dir, ignore_errors=True)
+	sys.stdout.write("\nRESULTS " + json.dumps(results) + "\n")
+
+def run_child(name, production_gdb, data_file, verbose=False): # Runs a scenario in its own process, returns its results
+	command = [sys.executable, os.path.abspath(__file__), "--child", name, "--gdb", production_gdb]
+	if data_file:
+		command += ["--data", data_file]
+	env = dict(os.environ)
+	if verbose:
+		env["ARCPY_STANDIN_ECHO"] = "1"
+	process = subprocess.Popen(command, stdout=subprocess.PIPE, env=env)
+	output = process.communicate()[0].decode("utf-8", "replace")
+	if process.returncode:
+		raise RuntimeError("Scenario {0} failed with exit code {1}".format(name, process.returncode))
+	for line in output.splitlines():
+		if verbose and not line.startswith("RESULTS "):
+			print(line)
+	return json.loads([line for line in output.splitlines() if line.startswith("RESULTS ")][-1][len("RESULTS "):])
+
+def compare(results, earlier): # Prints each scenario's timings, memory and errors against an earlier results file
+	print("\nCompared to {0} ({1} features per feature class):".format(earlier.get("commit"), earlier.get("features")))
+	if results.get("features") != earlier.get("features"):
+		print("  The databases differ in size, the timings aren't comparable")
+	for name in sorted(results["scenarios"]):
+		now = results["scenarios"][name]
+		then = earlier.get("scenarios", {}).get(name)
+		if not then:
+			print("  {0}: new scenario".format(name))
+			continue
+		changes = []
+		for phase in PHASES:
+			before, after = then["seconds"][phase], now["seconds"][phase]
+			changes.append("{0} {1:.2f} -> {2:.2f} s ({3:+.0%})".format(phase, before, after, (after - before) / before if before else 0))
+		before, after = then["peak_memory_mb"]["total"], now["peak_memory_mb"]["total"]
+		if before and after:
+			changes.append("memory {0:.0f} -> {1:.0f} MB".format(before, after))
+		print("  {0}: {1}".format(name, ", ".join(changes)))
+		if now["results_sha1"] != then["results_sha1"]:
+			print("    RESULTS CHANGED: {0} -> {1} errors".format(then["errors"], now["errors"]))
+
+def main():
+	parser = argparse.ArgumentParser(description="Times the shipped RBJs end to end against a synthetic TDS database")
+	parser.add_argument("--features", type=int, default=1000, help="Average features per feature class of the generated database")
+	parser.add_argument("--seed", type=int, default=1)
+	parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Scenario to run, all of them by default")
+	parser.add_argument("--out", default=os.path.join(BENCHMARK_DIR, "results.json"), help="Results file to write")
+	parser.add_argument("--compare", help="Earlier results file to compare against")
+	parser.add_argument("--arcgis", metavar="GDB", help="Use the installed arcpy and this database from generate_tds.py instead of the stand-in")
+	parser.add_argument("--verbose", action="store_true", help="Print the scenarios' tool messages")
+	parser.add_argument("--child", help=argparse.SUPPRESS)
+	parser.add_argument("--gdb", help=argparse.SUPPRESS)
+	parser.add_argument("--data", help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	if args.child:
+		child(args.child, args.gdb, args.data)
+		return
+
+	names = args.scenario or sorted(SCENARIOS)
+	scratch = tempfile.mkdtemp(prefix="rbj_benchmark_data_")
+	try:
+		data_file = None
+		production_gdb = args.arcgis
+		if not production_gdb:
+			# One database of every dataset any scenario reads, whichever are run, pickled for the scenario processes to load
+			generate_tds.use_standin()
+			import arcpy
+			rbj_files = sorted(set(path for scenario in SCENARIOS.values() for path in scenario["rbj_files"]))
+			production_gdb = os.path.join(scratch, "tds.gdb")
+			start = time.time()
+			counts = generate_tds.generate(production_gdb, generate_tds.rbj_schema(rbj_files), args.features, args.seed)
+			data_file = production_gdb + ".pkl"
+			arcpy.save(data_file)
+			print("Generated {0} features in {1} feature classes in {2:.1f} s".format(sum(counts.values()), len(counts), time.time() - start))
+
+		results = {"commit": git_commit(), "python": sys.version.split()[0], "features": args.features, "seed": args.seed, "arcgis": bool(args.arcgis), "scenarios": {}}
+		for name in names:
+			scenario = run_child(name, production_gdb, data_file, args.verbose)
+			results["scenarios"][name] = scenario
+			print("{0}: {1} s, {2} features/s, {3} errors, {4} MB peak".format(name, " / ".join("{0} {1:.2f}".format(phase, scenario["seconds"][phase]) for phase in PHASES),
+				scenario["features_per_second"], scenario["errors"], scenario["peak_memory_mb"]["total"]))
+	finally:
+		shutil.rmtree(scratch, ignore_errors=True)
+
+	with open(args.out, 'w') as f:
+		json.dump(results, f, indent=1, sort_keys=True)
+	print("Results written to {0}".format(args.out))
+	if args.compare:
+		with open(args.compare) as f:
+			compare(results, json.load(f))
+
+if __name__ == '__main__':
+	main()
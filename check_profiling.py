@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# ================= #
+#  Check Profiling  #
+# ================= #
+
+# Times each check group or check and keeps the timings between runs
+
+# ArcPy aliasing
+import arcpy as ap
+from arcpy import AddMessage as write
+# STOP! Hammer time
+from datetime import datetime as dt
+# System Modules
+import os
+import json
+
+from rbj_common import session_id, write_csv
+from rbj_model import RBJ_CACHE_DIR
+from columnar import DEFAULT_CHUNK_SIZE
+from parallel import run_checks, save_shard_history
+from reviewer_sessions import session_where
+
+
+PROFILE_HISTORY_FILE = os.path.join(RBJ_CACHE_DIR, "check_profiles.json")
+PROFILE_HISTORY_RUNS = 10 # Timings kept per check or check group
+PROFILE_TOP = 20          # Slowest checks listed in the tool messages
+PROFILE_FIELDS = ("unit", "group", "check_type", "title", "dataset", "checks", "seconds", "rows", "errors", "median_seconds", "regression")
+
+def profile_units(rbj, granularity): # Returns [(unit key, group, checks)] in RBJ order, one per check group or per check
+	if granularity == "Check":
+		return [(check.key, check.group, [check]) for check in rbj.checks]
+	groups = {}
+	for check in rbj.checks:
+		groups.setdefault(check.group, []).append(check)
+	return [(group, group, groups[group]) for group in rbj.groups]
+
+def check_run_totals(reviewer_gdb, session, seen): # Returns (rows validated, results) of the session's REVCHECKRUNTABLE rows not in seen, adding them to seen
+	validated = 0
+	results = 0
+	with ap.da.SearchCursor(os.path.join(reviewer_gdb, "REVCHECKRUNTABLE"), ["CHECKRUNID", "TOTALVALIDATED", "TOTALRESULTS"], session_where(reviewer_gdb, [session_id(session)])) as cursor:
+		for run_id, total_validated, total_results in cursor:
+			if run_id not in seen:
+				seen.add(run_id)
+				validated += total_validated or 0
+				results += total_results or 0
+	return validated, results
+
+def load_profile_history(rbj_name, granularity, history_file=PROFILE_HISTORY_FILE): # Returns {unit key: [seconds, ...]} of an RBJ's earlier profiles, oldest first
+	try:
+		with open(history_file) as f:
+			return json.load(f).get(rbj_name, {}).get(granularity, {})
+	except (IOError, OSError, ValueError):
+		return {}
+
+def save_profile_history(rbj_name, granularity, timings, history_file=PROFILE_HISTORY_FILE): # Appends {unit key: seconds} to the history, keeping the last PROFILE_HISTORY_RUNS per unit
+	try:
+		history = {}
+		if os.path.exists(history_file):
+			with open(history_file) as f:
+				history = json.load(f)
+		units = history.setdefault(rbj_name, {}).setdefault(granularity, {})
+		for unit, seconds in timings.items():
+			units[unit] = (units.get(unit, []) + [seconds])[-PROFILE_HISTORY_RUNS:]
+		if not os.path.exists(os.path.dirname(history_file)):
+			os.makedirs(os.path.dirname(history_file))
+		temp_file = history_file + ".{0}.tmp".format(os.getpid())
+		with open(temp_file, 'w') as f:
+			json.dump(history, f, indent=1, sort_keys=True)
+		if os.path.exists(history_file):
+			os.remove(history_file)
+		os.rename(temp_file, history_file)
+	except (IOError, OSError, ValueError):
+		write("  .. Couldn't save the profile history")
+
+def write_profile_trace(records, out_base): # Writes the trace records to out_base.json and out_base.csv, returns both paths
+	with open(out_base + ".json", 'w') as f:
+		json.dump(records, f, indent=1, sort_keys=True)
+	return out_base + ".json", write_csv(out_base + ".csv", PROFILE_FIELDS, records)
+
+def run_profiled(engine, rbj, rbj_file, production_gdb, reviewer_gdb, session, AOI="", chunk_size=DEFAULT_CHUNK_SIZE, granularity="Check Group", output_folder=None): # Runs and times the RBJ one check group or check at a time, returns the trace records
+	units = profile_units(rbj, granularity)
+	history = load_profile_history(rbj.name, granularity)
+	write("  .. Profiling {0} {1}s one at a time ({2} timed on earlier runs)".format(len(units), granularity.lower(), len([unit for unit in units if unit[0] in history])))
+	seen = set()
+	check_run_totals(reviewer_gdb, session, seen) # Results already in the session aren't this run's
+	records = []
+	for unit, group, checks in units:
+		start = dt.now()
+		run_checks(engine, rbj, rbj_file, production_gdb, reviewer_gdb, session, AOI, chunk_size, [check.key for check in checks])
+		seconds = (dt.now() - start).total_seconds()
+		rows, errors = check_run_totals(reviewer_gdb, session, seen)
+		past = sorted(history.get(unit, []))
+		median = past[len(past) // 2] if past else None
+		single = len(checks) == 1
+		records.append({
+			"unit": unit, "group": group, "checks": len(checks), "seconds": round(seconds, 3), "rows": rows, "errors": errors,
+			"check_type": checks[0].check_type if single else None, "title": checks[0].title if single else None,
+			"dataset": ";".join(sorted(set(check.dataset or "" for check in checks))),
+			"median_seconds": median,
+			# Slower than half again its usual time, ignoring the jitter of checks that take a second
+			"regression": median is not None and seconds > median * 1.5 and seconds - median > 1.0})
+
+	write("  .. Slowest {0}s:".format(granularity.lower()))
+	for record in sorted(records, key=lambda record: -record["seconds"])[:PROFILE_TOP]:
+		name = record["title"] or record["group"]
+		change = " - REGRESSED from a median of {0:.1f} s".format(record["median_seconds"]) if record["regression"] else ""
+		write("     {0:>9.1f} s  {1} ({2}) - {3} rows, {4} errors{5}".format(record["seconds"], name, record["dataset"], record["rows"], record["errors"], change))
+	regressions = len([record for record in records if record["regression"]])
+	if regressions:
+		ap.AddWarning("{0} {1}s ran at least half again slower than their median on earlier runs".format(regressions, granularity.lower()))
+
+	save_profile_history(rbj.name, granularity, dict((record["unit"], record["seconds"]) for record in records))
+	# The timings balance later parallel runs, which shard along check groups
+	group_seconds = {}
+	for record in records:
+		group_seconds[record["group"]] = group_seconds.get(record["group"], 0.0) + record["seconds"]
+	save_shard_history(rbj.name, group_seconds)
+	if output_folder:
+		for path in write_profile_trace(records, os.path.join(output_folder, "RBJ_check_profile")):
+			write("  .. Profile trace written to {0}".format(path))
+	return records
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# =============== #
+#  Check Pruning  #
+# =============== #
+
+# Drops the checks whose dataset or subtype has no features in the database
+
+# ArcPy aliasing
+import arcpy as ap
+from arcpy import AddMessage as write
+# STOP! Hammer time
+from datetime import datetime as dt
+# System Modules
+import os
+import hashlib
+
+from rbj_common import runtime, get_count, feature_class_paths
+from rbj_model import RBJ_CACHE_DIR, load_rbj, write_rbj_subset
+from native_sql import feature_subtypes, subtype_bucketed
+from parallel import load_shard_history
+from check_profiling import load_profile_history
+
+
+PRUNED_RBJ_DIR = os.path.join(RBJ_CACHE_DIR, "pruned")
+PRUNED_CHECK_SECONDS = 1.0 # Batch job setup per check, for checks that were never timed
+
+def dataset_inventory(production_gdb, rbjs): # Returns {DATASET: (feature count, subtype field, {subtype code: count} or None)} of every dataset the RBJs check
+	fc_paths = feature_class_paths(production_gdb)
+	inventory = {}
+	for dataset in sorted(set(ds for rbj in rbjs for ds in rbj.datasets())):
+		fc_path = fc_paths.get(dataset.upper())
+		if not fc_path:
+			inventory[dataset.upper()] = (0, None, None)
+			continue
+		subtype_field, subtypes = feature_subtypes(fc_path)
+		if any(subtype_bucketed(check, subtype_field) for rbj in rbjs for check in rbj.for_dataset(dataset)):
+			# Only the subtype field is read, the rest of the row never leaves the database
+			histogram = {}
+			with ap.da.SearchCursor(fc_path, [subtype_field]) as cursor:
+				for row in cursor:
+					histogram[row[0]] = histogram.get(row[0], 0) + 1
+			inventory[dataset.upper()] = (sum(histogram.values()), subtype_field, histogram)
+		else:
+			inventory[dataset.upper()] = (get_count(fc_path), subtype_field, None)
+	return inventory
+
+def prunable(check, inventory): # True when the check's dataset, or its subtype of the dataset, has no features
+	if not check.dataset:
+		return False
+	count, subtype_field, histogram = inventory.get(check.dataset.upper(), (0, None, None))
+	if not count:
+		return True
+	return histogram is not None and subtype_bucketed(check, subtype_field) and not histogram.get(check.subtype)
+
+def pruned_seconds(rbj, checks): # Estimated run time of the checks, from earlier profiles and shard timings of the RBJ
+	profiles = load_profile_history(rbj.name, "Check")
+	groups = load_shard_history(rbj.name)
+	group_sizes = {}
+	for check in rbj.checks:
+		group_sizes[check.group] = group_sizes.get(check.group, 0) + 1
+	seconds = 0.0
+	for check in checks:
+		past = sorted(profiles.get(check.key, []))
+		if past:
+			seconds += past[len(past) // 2]
+		elif groups.get(check.group):
+			seconds += groups[check.group] / group_sizes[check.group]
+		else:
+			seconds += PRUNED_CHECK_SECONDS
+	return seconds
+
+def prune_rbj(rbj, rbj_file, inventory, cache_dir=PRUNED_RBJ_DIR): # Returns (RBJModel, RBJ file) without the prunable checks, the same ones when none are
+	pruned = [check for check in rbj.checks if prunable(check, inventory)]
+	if not pruned:
+		return rbj, rbj_file
+	keys = sorted(set(check.key for check in rbj.checks) - set(check.key for check in pruned))
+	variant = hashlib.sha1("{0}:{1}".format(rbj.file_hash, ";".join(keys)).encode("utf-8")).hexdigest()[:16]
+	pruned_file = os.path.join(cache_dir, variant, os.path.basename(rbj_file))
+	if not os.path.exists(pruned_file):
+		if not os.path.exists(os.path.dirname(pruned_file)):
+			os.makedirs(os.path.dirname(pruned_file))
+		temp_file = pruned_file + ".{0}.tmp".format(os.getpid())
+		write_rbj_subset(rbj_file, keys, temp_file)
+		os.rename(temp_file, pruned_file)
+	model = load_rbj(pruned_file)
+	write("  .. Pruned {0} of {1} checks on datasets or subtypes without features from '{2}', saving an estimated {3:.0f} seconds".format(len(pruned), len(rbj), rbj.name, pruned_seconds(rbj, pruned)))
+	return model, pruned_file
+
+def prune_rbjs(rbjs, rbj_files, production_gdb): # Returns the RBJ models and files to run with the checks that can't find anything left out
+	start = dt.now()
+	inventory = dataset_inventory(production_gdb, rbjs)
+	write("\nCounted the features of {0} datasets ({1} empty) in {2}".format(len(inventory), len([ds for ds in inventory if not inventory[ds][0]]), runtime(start, dt.now())))
+	pruned = [prune_rbj(rbj, rbj_file, inventory) for rbj, rbj_file in zip(rbjs, rbj_files)]
+	return [model for model, path in pruned], [path for model, path in pruned]
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+# ======================== #
+#  Columnar NumPy Backend  #
+# ======================== #
+
+# Evaluates the native engine's where clause trees as NumPy masks over OID chunks read with FeatureClassToNumPyArray
+
+# ArcPy aliasing
+import arcpy as ap
+from arcpy import AddMessage as write
+import numpy as np
+# STOP! Hammer time
+from datetime import datetime as dt
+# System Modules
+import re
+
+from rbj_common import runtime, rows_per_second
+from native_sql import NUMERIC_FIELDS, TEXT_FIELDS, SQL_OPERATORS, SQLCompileError, check_node, node_fields, SQLProgram, feature_subtypes, oid_where_clauses, write_dataset_results, aoi_layer
+
+
+DEFAULT_CHUNK_SIZE = 50000
+# FeatureClassToNumPyArray can't hold NULLs, these stand in for them and are masked back out.
+# A real value equal to one is told apart by querying which rows of the chunk hold NULL
+# np.in1d predates ArcMap's numpy 1.9 and is gone from numpy 2, np.isin covers newer installs
+np_isin = getattr(np, "isin", None) or np.in1d
+COLUMNAR_NULLS = {"SmallInteger": -32768, "Integer": -2147483648, "Single": np.nan, "Double": np.nan, "String": u"\x01", "Guid": u"\x01", "GlobalID": u"\x01"}
+
+class ColumnarChunk(object): # One OID range of a dataset as {FIELD: column} with lazily built NULL masks
+	def __init__(self, array, names, field_types, source=None, where=None):
+		self.array = array
+		self.names = names # Upper case field name -> column name in the array
+		self.field_types = field_types
+		self.source = source # Table the chunk was read from with the where clause, to look up NULLs in
+		self.where = where
+		self.nulls = {}
+
+	def __len__(self):
+		return len(self.array)
+
+	def column(self, field): # Returns (values, null mask)
+		values = self.array[self.names[field]]
+		if field not in self.nulls:
+			null = COLUMNAR_NULLS.get(self.field_types[field])
+			if null is None:
+				self.nulls[field] = np.zeros(len(values), bool)
+			elif self.field_types[field] in ("Single", "Double"):
+				self.nulls[field] = np.isnan(values)
+			else:
+				self.nulls[field] = values == null
+				if self.source is not None and self.nulls[field].any():
+					self.nulls[field] = np_isin(self.array["OID@"], null_oids(self.source, self.names[field], self.where))
+		return values, self.nulls[field]
+
+def null_oids(source, field_name, where=None): # OIDs of the rows of a table holding NULL in the field, within the where clause
+	clause = "{0} IS NULL".format(ap.AddFieldDelimiters(source, field_name))
+	if where:
+		clause = "({0}) AND {1}".format(where, clause)
+	with ap.da.SearchCursor(source, ["OID@"], clause) as cursor:
+		return [row[0] for row in cursor]
+
+def columnar_operand(operand, chunk): # Returns (values, null mask) of a field or literal operand
+	if operand[0] == "lit":
+		return operand[1], np.zeros(len(chunk), bool)
+	return chunk.column(operand[1])
+
+def evaluate_columnar(node, chunk, memo): # Returns the (true, false) masks of a node tree over a chunk, sharing repeated nodes through memo
+	if node in memo:
+		return memo[node]
+	kind = node[0]
+	if kind in ("and", "or"):
+		true_mask, false_mask = evaluate_columnar(node[1][0], chunk, memo)
+		for child in node[1][1:]:
+			child_true, child_false = evaluate_columnar(child, chunk, memo)
+			if kind == "and":
+				true_mask, false_mask = true_mask & child_true, false_mask | child_false
+			else:
+				true_mask, false_mask = true_mask | child_true, false_mask & child_false
+	elif kind == "not":
+		false_mask, true_mask = evaluate_columnar(node[1], chunk, memo)
+	elif kind == "null":
+		values, null = columnar_operand(node[1], chunk)
+		true_mask, false_mask = null, ~null
+	else:
+		subject = node[1] if kind != "cmp" else node[2]
+		values, null = columnar_operand(subject, chunk)
+		if subject[0] == "lit":
+			values = np.repeat(values, len(chunk))
+		if kind == "cmp":
+			other, other_null = columnar_operand(node[3], chunk)
+			null = null | other_null
+			result = SQL_OPERATORS[node[1]](values, other)
+		elif kind == "in":
+			result = np_isin(values, [v for v in node[2] if v is not None])
+		elif kind == "like":
+			pattern = re.compile("".join(".*" if c == "%" else "." if c == "_" else re.escape(c) for c in node[2]) + r"\Z", re.S)
+			unique, inverse = np.unique(values, return_inverse=True)
+			result = np.array([pattern.match(value) is not None for value in unique], bool)[inverse]
+		elif kind == "between":
+			low, low_null = columnar_operand(node[2], chunk)
+			high, high_null = columnar_operand(node[3], chunk)
+			null = null | low_null | high_null
+			result = (values >= low) & (values <= high)
+		else:
+			raise SQLCompileError("Unsupported expression {0}".format(kind))
+		valid = ~null
+		true_mask = valid & result
+		# x IN (NULL, ...) can never be False, only True or unknown
+		false_mask = valid & ~result if not (kind == "in" and None in node[2]) else np.zeros(len(chunk), bool)
+	memo[node] = (true_mask, false_mask)
+	return true_mask, false_mask
+
+def oid_chunks(fc_path, chunk_size): # Yields where clauses covering the feature class in OID ranges of chunk_size
+	oid_name = ap.Describe(fc_path).OIDFieldName
+	oid_field = ap.AddFieldDelimiters(fc_path, oid_name)
+	bounds = []
+	for order in ("ASC", "DESC"):
+		with ap.da.SearchCursor(fc_path, ["OID@"], sql_clause=(None, "ORDER BY {0} {1}".format(oid_name, order))) as cursor:
+			for row in cursor:
+				bounds.append(row[0])
+				break
+	if not bounds:
+		return
+	for low in range(bounds[0], bounds[-1] + 1, chunk_size):
+		yield "{0} >= {1} AND {0} < {2}".format(oid_field, low, low + chunk_size)
+
+def run_columnar_dataset(writer, dataset, fc_path, checks, AOI="", oids=None, chunk_size=DEFAULT_CHUNK_SIZE): # Evaluates a dataset's SQL checks as vectorized masks, one OID chunk at a time
+	ds_start = dt.now()
+	names = dict((f.name.upper(), f.name) for f in ap.ListFields(fc_path))
+	field_types = dict((f.name.upper(), f.type) for f in ap.ListFields(fc_path))
+	subtype_field, subtypes = feature_subtypes(fc_path)
+	nodes = []
+	unsupported = []
+	fields = set([subtype_field]) if subtype_field else set()
+	for check in checks:
+		try:
+			node = check_node(check)
+			check_fields = set()
+			node_fields(node, check_fields)
+			if any(field not in field_types or (field_types[field] not in NUMERIC_FIELDS and field_types[field] not in TEXT_FIELDS) for field in check_fields):
+				raise SQLCompileError("Field missing or of an unsupported type")
+			# Compiling through the row engine applies the same literal and type rules to both backends
+			validator = SQLProgram(field_types)
+			validator.prepare([node])
+			validator.compile(node)
+		except SQLCompileError:
+			unsupported.append(check)
+			continue
+		nodes.append((check, node))
+		fields.update(check_fields)
+	if not nodes:
+		return unsupported
+	columns = sorted(fields)
+	null_values = dict((names[field], COLUMNAR_NULLS[field_types[field]]) for field in columns if field_types[field] in COLUMNAR_NULLS)
+	source = aoi_layer(fc_path, AOI, "columnar_aoi_lyr")
+	matches = {}
+	validated = 0
+	try:
+		for where in (oid_where_clauses(fc_path, oids) if oids is not None else oid_chunks(fc_path, chunk_size)):
+			array = ap.da.FeatureClassToNumPyArray(source, ["OID@"] + [names[field] for field in columns], where, null_value=null_values)
+			if not len(array):
+				continue
+			validated += len(array)
+			chunk = ColumnarChunk(array, names, field_types, source, where)
+			memo = {}
+			for check, node in nodes:
+				true_mask = evaluate_columnar(node, chunk, memo)[0]
+				if true_mask.any():
+					found = array["OID@"][true_mask].tolist()
+					codes = array[names[subtype_field]][true_mask].tolist() if subtype_field else [None] * len(found)
+					matches.setdefault(check.key, []).extend(zip(found, codes))
+			del array, chunk, memo
+	finally:
+		if AOI and ap.Exists(source):
+			ap.Delete_management(source)
+	errors = write_dataset_results(writer, dataset, fc_path, [check for check, node in nodes], matches, validated, subtypes)
+	write("  .. {0}: {1} checks over {2} features in chunks of {3}, {4} errors in {5} ({6})".format(dataset, len(nodes), validated, chunk_size, errors, runtime(ds_start, dt.now()), rows_per_second(validated, ds_start, dt.now())))
+	return unsupported
@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+# ============== #
+#  Error Export  #
+# ============== #
+
+# Exports a session's errors to shapefiles or GeoPackage layers along with its frequency report
+
+# ArcPy aliasing
+import arcpy as ap
+from arcpy import AddMessage as write
+# STOP! Hammer time
+from datetime import datetime as dt
+# System Modules
+import os
+import functools
+import json
+
+from rbj_common import runtime, rows_per_second, get_count, session_id, combine_where
+from columnar import oid_chunks
+from reviewer_sessions import session_where
+from geopackage import GEOPACKAGE_NAME, GPKG_FIELD_TYPES, GeoPackage, GeoPackageLayerWriter, GeoPackageTables
+from frequency_report import FrequencyReport
+
+
+# Shapefile/dbf field types for REVTABLEMAIN field types
+EXPORT_FIELD_TYPES = {"String": "TEXT", "Integer": "LONG", "OID": "LONG", "SmallInteger": "SHORT", "Double": "DOUBLE", "Single": "FLOAT", "Date": "DATE", "Guid": "TEXT", "GlobalID": "TEXT"}
+
+class ErrorExportWriter(object): # Creates an export shapefile or dbf table on its first row and inserts error rows into it
+	def __init__(self, out_path, out_fields, geometry_type=None, spatial_reference=None):
+		self.out_path = out_path
+		self.out_fields = out_fields # [(name, type, length)]
+		self.geometry_type = geometry_type
+		self.spatial_reference = spatial_reference
+		self.cursor = None
+		self.count = 0
+
+	def create(self):
+		folder, name = os.path.split(self.out_path)
+		if self.geometry_type:
+			ap.CreateFeatureclass_management(folder, name, self.geometry_type, spatial_reference=self.spatial_reference)
+			default_field = "Id"
+		else:
+			ap.CreateTable_management(folder, name)
+			default_field = "Field1"
+		for field_name, field_type, length in self.out_fields:
+			ap.AddField_management(self.out_path, field_name, field_type, field_length=length)
+		# Shapefiles and dbf tables are created with a placeholder field, which the old export never had
+		ap.DeleteField_management(self.out_path, default_field)
+
+	def open(self): # Opens the insert cursor, creating the output unless it's being appended to
+		if not ap.Exists(self.out_path):
+			self.create()
+		names = [field_name for field_name, field_type, length in self.out_fields]
+		self.cursor = ap.da.InsertCursor(self.out_path, names + ["SHAPE@"] if self.geometry_type else names)
+
+	def truncate(self, count): # Drops every row after the first count, left by a chunk that never finished
+		if ap.Exists(self.out_path):
+			with ap.da.UpdateCursor(self.out_path, ["OID@"]) as cursor:
+				for row in cursor:
+					if row[0] >= count:
+						cursor.deleteRow()
+		self.count = count
+
+	def insert(self, values, shape=None):
+		if self.cursor is None:
+			self.open()
+		row = []
+		for value, (field_name, field_type, length) in zip(values, self.out_fields):
+			if length and value is not None:
+				value = u"{0}".format(value)[:length]
+			row.append(value)
+		if self.geometry_type:
+			row.append(shape)
+		self.cursor.insertRow(row)
+		self.count += 1
+
+	def delete(self): # Deletes the output, for an export that failed part way
+		if ap.Exists(self.out_path):
+			ap.Delete_management(self.out_path)
+
+	def close(self):
+		if self.cursor is not None:
+			del self.cursor
+			self.cursor = None
+
+def export_geometry_errors(geometry_table, errors, writer, where=None, merge=False, links=None): # Streams a reviewer geometry table, hash joining each row to its REVTABLEMAIN values on LINKGUID
+	if links is not None:
+		# Chunked export - only the chunk's LINKGUIDs are queried, so all the rows of an error arrive together
+		link_field = ap.AddFieldDelimiters(geometry_table, "LINKGUID")
+		parts = {}
+		order = []
+		for i in range(0, len(links), 500):
+			link_where = "{0} IN ({1})".format(link_field, ",".join("'{0}'".format(link) for link in links[i:i + 500]))
+			with ap.da.SearchCursor(geometry_table, ["LINKGUID", "SHAPE@"], combine_where(where, link_where)) as cursor:
+				for link, shape in cursor:
+					if link not in parts:
+						order.append(link)
+					parts.setdefault(link, []).append(shape)
+		for link in order:
+			shapes = parts.pop(link)
+			if merge and len(shapes) > 1:
+				shapes = [functools.reduce(lambda a, b: a.union(b), [shape for shape in shapes if shape is not None] or [None])]
+			for shape in shapes:
+				writer.insert(errors[link], shape)
+		return writer.count
+	counts = {}
+	if merge:
+		# A cheap LINKGUID only pass finds the errors stored as several rows, only those get unioned
+		with ap.da.SearchCursor(geometry_table, ["LINKGUID"], where) as cursor:
+			for row in cursor:
+				if row[0] in errors:
+					counts[row[0]] = counts.get(row[0], 0) + 1
+	parts = {}
+	with ap.da.SearchCursor(geometry_table, ["LINKGUID", "SHAPE@"], where) as cursor:
+		for link, shape in cursor:
+			if link not in errors:
+				continue # Geometry without an error record, left out like the old KEEP_COMMON join
+			if merge and counts[link] > 1:
+				if shape is not None:
+					parts[link] = parts[link].union(shape) if link in parts else shape
+				continue
+			writer.insert(errors[link], shape)
+	for link, shape in parts.items():
+		writer.insert(errors[link], shape)
+	return writer.count
+
+def export_dr_to_shp(reviewer_workspace, fields, output_path, chunk_size=0, report=None, session=None, output_format="Shapefile"): # Exports the session's Data Reviewer errors to point, line and polygon shapefiles and a table of errors without geometry, or to layers of a GeoPackage
+	# REVTABLEMAIN is read into a dict on ID and each geometry table hash joined to it on LINKGUID, a RECORDID range at a time with a chunk_size
+	field_list = fields.split(";")
+
+	# Check if shapefiles created by script exists. If so error and do not process.
+	ShapeName = 'RBJ_error.shp'
+	FileName = ShapeName[:-4] + "_Table.dbf"
+	FinalPointShape = output_path + "\\" + ShapeName[:-4] + '_pnt.shp'
+	FinalLineShape = output_path + "\\" + ShapeName[:-4] + '_crv.shp'
+	FinalPolygonShape = output_path + "\\" + ShapeName[:-4] + '_srf.shp'
+	Table = output_path + "\\" + FileName
+
+	# Paths to tables in Reviewer workspace
+	REVTABLEMAIN = reviewer_workspace + "\\REVTABLEMAIN"
+	REVTABLEPOINT = reviewer_workspace + "\\REVDATASET\\REVTABLEPOINT"
+	REVTABLELINE = reviewer_workspace + "\\REVDATASET\\REVTABLELINE"
+	REVTABLEPOLY = reviewer_workspace + "\\REVDATASET\\REVTABLEPOLY"
+
+	# Only records from the session
+	WhereClause = session_where(reviewer_workspace, [session_id(session)]) if session else None
+
+	# A chunked export that didn't finish picks up where it stopped. Per RBJ reports export from
+	# a new copy of the workspace every run, so the progress matches on the error count, not the path
+	progress_file = os.path.join(output_path, "RBJ_error_export_progress.json")
+	progress = None
+	settings = {"errors": get_count(REVTABLEMAIN), "fields": fields, "chunk_size": chunk_size, "output_format": output_format} if chunk_size else None
+	if chunk_size and os.path.exists(progress_file):
+		try:
+			with open(progress_file) as f:
+				progress = json.load(f)
+		except (IOError, OSError, ValueError):
+			progress = None
+		if progress and any(progress.get(key) != value for key, value in settings.items()):
+			progress = None
+
+	# Check to see if output shapefile already exists. If exists do not process, unless resuming.
+	Exists = False
+	geopackage = None
+	if output_format == "GeoPackage":
+		geopackage = GeoPackage(os.path.join(output_path, GEOPACKAGE_NAME))
+		# Layers are named after the shapefiles they replace
+		layer = lambda out_path: os.path.splitext(os.path.basename(out_path.replace("\\", os.sep)))[0]
+		layers = geopackage.tables()
+		for out_path, label in ((FinalPointShape, "Point layer"), (FinalLineShape, "Line layer"), (FinalPolygonShape, "Polygon layer"), (Table, "Table for non geometry errors")):
+			if not progress and layer(out_path) in layers:
+				ap.AddError("{0} already exists in output GeoPackage {1}".format(label, os.path.join(geopackage.path, layer(out_path))))
+				Exists = True
+	elif not progress and ap.Exists(FinalPointShape):
+		ap.AddError("Point shapefile already exists in output workspace " + FinalPointShape)
+		Exists = True
+	if geopackage is None and not progress and ap.Exists(FinalLineShape):
+		ap.AddError("Line shapefile already exists in output workspace " + FinalLineShape)
+		Exists = True
+	if geopackage is None and not progress and ap.Exists(FinalPolygonShape):
+		ap.AddError("Polygon shapefile already exists in output workspace " + FinalPolygonShape)
+		Exists = True
+	if geopackage is None and not progress and ap.Exists(Table):
+		ap.AddError("Table for non geometry errors already exists in output workspace " + Table)
+		Exists = True
+	if Exists:
+		ap.AddError("Please choose new output directory or delete existing files")
+		if geopackage is not None:
+			geopackage.close()
+		if report is not None:
+			# The frequency report is still written, from a pass of its own
+			count_frequencies(REVTABLEMAIN, WhereClause, report)
+		return
+
+	RenameFields = ["ORIGINTABLE", "ORIGINCHECK", "REVIEWSTATUS", "CORRECTIONSTATUS", "VERIFICATIONSTATUS", "REVIEWTECHNICIAN", "REVIEWDATE", "CORRECTIONTECHNICIAN", "CORRECTIONDATE", "VERIFICATIONTECHNICIAN", "VERIFICATIONDATE", "LIFECYCLESTATUS", "LIFECYCLEPHASE"]
+
+	NewNames = ["ORIG_TABLE", "ORIG_CHECK", "ERROR_DESC", "COR_STATUS", "VER_STATUS", "REV_TECH", "REV_DATE", "COR_TECH", "COR_DATE", "VER_TECH", "VER_DATE", "STATUS", "PHASE"]
+
+	# The visible REVTABLEMAIN fields, renamed where they are over the 10 character dbf limit
+	main_fields = [f for f in ap.ListFields(REVTABLEMAIN) if f.name in field_list]
+	read_fields = [f.name for f in main_fields]
+	out_fields = []
+	for f in main_fields:
+		length = min(f.length, 254) if f.type == "String" else 38 if f.type in ("Guid", "GlobalID") else None
+		out_fields.append((NewNames[RenameFields.index(f.name)] if f.name in RenameFields else f.name, EXPORT_FIELD_TYPES.get(f.type, "TEXT"), length))
+
+	export_start = dt.now()
+	if geopackage is not None:
+		# Full length field names, the GeoPackage has no dbf limits
+		gpkg_fields = [(f.name, GPKG_FIELD_TYPES.get(f.type, "TEXT"), None) for f in main_fields]
+		writers = [
+			GeoPackageLayerWriter(geopackage, layer(FinalPointShape), gpkg_fields, ap.Describe(REVTABLEPOINT).shapeType.upper(), ap.Describe(REVTABLEPOINT).spatialReference),
+			GeoPackageLayerWriter(geopackage, layer(FinalLineShape), gpkg_fields, "POLYLINE", ap.Describe(REVTABLELINE).spatialReference),
+			GeoPackageLayerWriter(geopackage, layer(FinalPolygonShape), gpkg_fields, "POLYGON", ap.Describe(REVTABLEPOLY).spatialReference),
+			GeoPackageLayerWriter(geopackage, layer(Table), gpkg_fields)]
+	else:
+		writers = [
+			ErrorExportWriter(FinalPointShape, out_fields, ap.Describe(REVTABLEPOINT).shapeType.upper(), ap.Describe(REVTABLEPOINT).spatialReference),
+			ErrorExportWriter(FinalLineShape, out_fields, "POLYLINE", ap.Describe(REVTABLELINE).spatialReference),
+			ErrorExportWriter(FinalPolygonShape, out_fields, "POLYGON", ap.Describe(REVTABLEPOLY).spatialReference),
+			ErrorExportWriter(Table, out_fields)]
+	point_writer, line_writer, poly_writer, table_writer = writers
+	try:
+		if chunk_size:
+			export_dr_chunks(REVTABLEMAIN, (REVTABLEPOINT, REVTABLELINE, REVTABLEPOLY), read_fields, writers, WhereClause, chunk_size, progress_file, progress, settings, report)
+		else:
+			export_dr_all(REVTABLEMAIN, (REVTABLEPOINT, REVTABLELINE, REVTABLEPOLY), read_fields, writers, WhereClause, report)
+		if geopackage is not None:
+			# Indexed once every row is in, a single bulk load instead of a trigger per insert
+			geopackage.index()
+	finally:
+		if geopackage is not None:
+			geopackage.close()
+
+	# Provide summary information about processing
+	total = sum(writer.count for writer in writers)
+	write("\nTotal Errors Exported: {0} ({1})".format(total, rows_per_second(total, export_start, dt.now())))
+	for writer in writers:
+		if writer.count:
+			write("Output {0} path {1}".format("table" if writer is table_writer else "shapefile" if geopackage is None else "layer", writer.out_path))
+	if not table_writer.count:
+		write("No errors exist with no geometry in selected session.  No table will be created.")
+
+def count_frequencies(REVTABLEMAIN, where, report): # Counts the REVTABLEMAIN rows matching where into the frequency report
+	with ap.da.SearchCursor(REVTABLEMAIN, report.fields, where) as cursor:
+		for row in cursor:
+			report.add(row)
+
+def read_errors(REVTABLEMAIN, read_fields, where, table_writer, report=None): # Reads the REVTABLEMAIN rows matching where, writing errors without geometry to the table, returns {ID: values} of the rest
+	errors = {}
+	report_fields = report.fields if report is not None else []
+	values_end = 2 + len(read_fields)
+	with ap.da.SearchCursor(REVTABLEMAIN, ["ID", "GEOMETRYTYPE"] + read_fields + report_fields, where) as cursor:
+		for row in cursor:
+			if report is not None:
+				report.add(row[values_end:])
+			if row[1] is None:
+				table_writer.insert(row[2:values_end])
+			else:
+				errors[row[0]] = row[2:values_end]
+	return errors
+
+def export_dr_all(REVTABLEMAIN, geometry_tables, read_fields, writers, WhereClause, report=None): # Exports every error in one pass over REVTABLEMAIN and each geometry table
+	point_writer, line_writer, poly_writer, table_writer = writers
+	REVTABLEPOINT, REVTABLELINE, REVTABLEPOLY = geometry_tables
+	try:
+		# One pass over REVTABLEMAIN - errors without geometry go straight to the table, the rest wait for their geometry
+		write("\nReading error records...")
+		errors = read_errors(REVTABLEMAIN, read_fields, WhereClause, table_writer, report)
+		write("  .. {0} errors with geometry, {1} errors with no geometry".format(len(errors), table_writer.count))
+
+		write("\nProcessing Point Errors...")
+		export_geometry_errors(REVTABLEPOINT, errors, point_writer, WhereClause)
+		write("  .. {0} point errors exported".format(point_writer.count))
+		write("\nProcessing Line Errors...")
+		export_geometry_errors(REVTABLELINE, errors, line_writer, WhereClause, merge=True)
+		write("  .. {0} line errors exported".format(line_writer.count))
+		write("\nProcessing Polygon Errors...")
+		export_geometry_errors(REVTABLEPOLY, errors, poly_writer, WhereClause, merge=True)
+		write("  .. {0} polygon errors exported".format(poly_writer.count))
+	except Exception:
+		# Delete the outputs created so far, they would be incomplete
+		for writer in writers:
+			writer.close()
+			writer.delete()
+		raise
+	finally:
+		for writer in writers:
+			writer.close()
+
+def save_export_progress(progress_file, settings, chunks, writers): # Records the finished chunks and the rows each output held after them
+	settings = dict(settings, chunks=chunks, counts=dict((writer.out_path, writer.count) for writer in writers))
+	temp_file = progress_file + ".tmp"
+	with open(temp_file, 'w') as f:
+		json.dump(settings, f)
+	if os.path.exists(progress_file):
+		os.remove(progress_file)
+	os.rename(temp_file, progress_file)
+
+def export_dr_chunks(REVTABLEMAIN, geometry_tables, read_fields, writers, WhereClause, chunk_size, progress_file, progress, settings, report=None): # Exports the errors one RECORDID range at a time, recording each finished chunk in the progress file
+	done = 0
+	if progress:
+		# Rows written after the last finished chunk are dropped, that chunk is exported again
+		done = progress["chunks"]
+		for writer in writers:
+			writer.truncate(progress["counts"].get(writer.out_path, 0))
+		write("\nResuming the export after chunk {0} ({1} errors already exported)".format(done, sum(writer.count for writer in writers)))
+	else:
+		# Recorded before the first chunk, so outputs left by a chunk that dies are resumed rather than refused
+		save_export_progress(progress_file, settings, 0, writers)
+	table_writer = writers[3]
+	chunks = list(oid_chunks(REVTABLEMAIN, chunk_size))
+	for index, chunk_where in enumerate(chunks):
+		if index < done:
+			if report is not None:
+				# Finished before the export died, only counted for the frequency report
+				count_frequencies(REVTABLEMAIN, combine_where(WhereClause, chunk_where), report)
+			continue
+		chunk_start = dt.now()
+		errors = {}
+		try:
+			errors = read_errors(REVTABLEMAIN, read_fields, combine_where(WhereClause, chunk_where), table_writer, report)
+			links = sorted(errors)
+			for geometry_table, writer, merge in zip(geometry_tables, writers, (False, True, True)):
+				export_geometry_errors(geometry_table, errors, writer, WhereClause, merge, links)
+		finally:
+			# Closing the cursors flushes the chunk to disk before it's recorded as finished
+			for writer in writers:
+				writer.close()
+		save_export_progress(progress_file, settings, index + 1, writers)
+		write("  .. Exported chunk {0} of {1} ({2} errors) in {3}".format(index + 1, len(chunks), len(errors), runtime(chunk_start, dt.now())))
+	if os.path.exists(progress_file):
+		os.remove(progress_file)
+
+def write_reports(reviewer_gdb, output_folder, export_chunk_size=0, breakdowns=(), session=None, report=None, output_format="Shapefile"): # Writes the frequency report and error shapefiles of a reviewer workspace to the output folder, or both into one GeoPackage, returns the report path
+	# Export RBJ errors to shapefiles in the output folder, counting the frequency report on the way
+	shp_start = dt.now()
+	write("\nConverting Data Reviewer validation outputs to {0}...".format("a GeoPackage" if output_format == "GeoPackage" else "shapefiles"))
+	rev_fields = 'RECORDID;OBJECTID;SUBTYPE;CHECKTITLE;ORIGINTABLE;ORIGINCHECK;REVIEWSTATUS;REVIEWTECHNICIAN;REVIEWDATE'
+	report = report or FrequencyReport(reviewer_gdb, breakdowns)
+	export_dr_to_shp(reviewer_gdb, rev_fields, output_folder, export_chunk_size, report, session, output_format)
+	shp_finish = dt.now()
+	write("Exported error {0} in {1}".format("layers" if output_format == "GeoPackage" else "shapefiles", runtime(shp_start, shp_finish)))
+
+	freq_start = dt.now()
+	if output_format == "GeoPackage":
+		# The frequency report goes into the GeoPackage with the errors, as a table per sheet
+		write("\nWriting Frequency Report tables into the GeoPackage...")
+		geopackage_path = os.path.join(output_folder, GEOPACKAGE_NAME)
+		out_xls = report.write(geopackage_path, GeoPackageTables(geopackage_path))
+	else:
+		# Write the Frequency Report as an Excel doc to the output folder
+		write("\nExporting Frequency Report as Excel file...")
+		out_xls = report.write(os.path.join(output_folder, "RBJ_error_frequency_report.xlsx"))
+	freq_finish = dt.now()
+	write("Created Frequency Report of {0} errors in {1}".format(sum(report.counts.values()), runtime(freq_start, freq_finish)))
+	return out_xls
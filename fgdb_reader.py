@@ -0,0 +1,524 @@
+# -*- coding: utf-8 -*-
+# =================================== #
+#  Read-only File Geodatabase reader  #
+# =================================== #
+
+# Reads reviewer workspace tables and geometry straight from the .gdbtable/.gdbtablx files, without arcpy
+# python fgdb_reader.py <gdb>                       Lists the tables with their row counts and fields
+# python fgdb_reader.py <gdb> <table> [--fields "A;B"] [--session 3 ...] [--count-by "A;B"] [--out rows.csv|rows.geojson] [--limit n]
+
+# System Modules
+import os
+import io
+import sys
+import csv
+import json
+import mmap
+import struct
+import argparse
+from datetime import datetime, timedelta
+
+# Field types, named as arcpy.ListFields names them
+FIELD_TYPES = {0: "SmallInteger", 1: "Integer", 2: "Single", 3: "Double", 4: "String", 5: "Date", 6: "OID", 7: "Geometry", 8: "Blob", 9: "Raster", 10: "Guid", 11: "GlobalID", 12: "XML", 13: "BigInteger", 14: "DateOnly", 15: "TimeOnly", 16: "TimestampOffset"}
+FIXED_FORMATS = {0: "<h", 1: "<i", 2: "<f", 3: "<d", 5: "<d", 13: "<q", 14: "<d", 15: "<d"}
+FIXED_SIZES = dict((code, struct.calcsize(fmt)) for code, fmt in FIXED_FORMATS.items())
+VARIABLE_TYPES = (4, 7, 8, 9, 12) # Stored as a varuint length and that many bytes
+GEOMETRY_TYPES = {0: None, 1: "Point", 2: "Multipoint", 3: "Polyline", 4: "Polygon", 9: "MultiPatch"}
+EPOCH = datetime(1899, 12, 30) # Dates are stored as days since
+SYSTEM_CATALOG = "a00000001.gdbtable"
+
+# Shape types of the geometry blobs, with the Z and M the shapefile style codes imply
+POINT_SHAPES = (1, 9, 11, 21, 52)
+MULTIPOINT_SHAPES = (8, 18, 20, 28, 53)
+POLYLINE_SHAPES = (3, 10, 13, 23, 50)
+POLYGON_SHAPES = (5, 15, 19, 25, 51)
+Z_SHAPES = (9, 11, 18, 20, 10, 13, 15, 19)
+M_SHAPES = (11, 21, 18, 28, 13, 23, 15, 25)
+GENERAL_SHAPES = (50, 51, 52, 53, 54)
+HAS_Z, HAS_M, HAS_CURVES = 0x80000000, 0x40000000, 0x20000000
+
+class FGDBError(Exception): # Raised for files this reader can't make sense of
+	pass
+
+def read_varuint(buf, pos): # Returns (value, next position) of an unsigned 7 bits per byte integer
+	value = 0
+	shift = 0
+	while True:
+		byte = buf[pos]
+		pos += 1
+		value |= (byte & 0x7F) << shift
+		if not byte & 0x80:
+			return value, pos
+		shift += 7
+
+def read_varint(buf, pos): # Returns (value, next position) of a signed integer, the sign in bit 6 of the first byte
+	byte = buf[pos]
+	pos += 1
+	value = byte & 0x3F
+	negative = byte & 0x40
+	shift = 6
+	while byte & 0x80:
+		byte = buf[pos]
+		pos += 1
+		value |= (byte & 0x7F) << shift
+		shift += 7
+	return (-value if negative else value), pos
+
+def read_utf16(buf, pos, chars): # Returns (text, next position) of chars UTF-16LE characters
+	end = pos + 2 * chars
+	return bytes(buf[pos:end]).decode("utf-16-le"), end
+
+def guid_text(raw): # "{XXXXXXXX-XXXX-XXXX-XXXX-XXXXXXXXXXXX}" of a 16 byte GUID, stored Microsoft style
+	data1, data2, data3 = struct.unpack_from("<IHH", raw, 0)
+	tail = "".join("{0:02X}".format(byte) for byte in bytearray(raw[8:16]))
+	return "{{{0:08X}-{1:04X}-{2:04X}-{3}-{4}}}".format(data1, data2, data3, tail[:4], tail[4:])
+
+class Field(object): # A field of a table, with the coordinate system of geometry fields
+	def __init__(self, name, alias, code):
+		self.name = name
+		self.aliasName = alias
+		self.code = code
+		self.type = FIELD_TYPES.get(code, "Unknown")
+		self.length = 0
+		self.isNullable = False
+		self.wkt = None
+		self.has_z = self.has_m = False
+		self.xy_origin = (0.0, 0.0)
+		self.xy_scale = self.z_scale = self.m_scale = 1.0
+		self.z_origin = self.m_origin = 0.0
+
+	def __repr__(self):
+		return "Field({0!r}, {1})".format(self.name, self.type)
+
+class Shape(object): # Decoded geometry, its shape type and parts of (x, y), (x, y, z), (x, y, m) or (x, y, z, m) points
+	__slots__ = ("type", "parts", "has_z", "has_m")
+
+	def __init__(self, shape_type, parts, has_z=False, has_m=False):
+		self.type = shape_type
+		self.parts = parts
+		self.has_z = has_z
+		self.has_m = has_m
+
+	@property
+	def points(self):
+		return [point for part in self.parts for point in part]
+
+	@property
+	def pointCount(self):
+		return sum(len(part) for part in self.parts)
+
+	@property
+	def extent(self): # (xmin, ymin, xmax, ymax), None when empty
+		points = self.points
+		if not points:
+			return None
+		xs = [point[0] for point in points]
+		ys = [point[1] for point in points]
+		return (min(xs), min(ys), max(xs), max(ys))
+
+	@property
+	def __geo_interface__(self): # GeoJSON geometry, Z kept and M left out
+		width = 3 if self.has_z else 2
+		parts = [[list(point[:width]) for point in part] for part in self.parts]
+		if self.type == "Point":
+			return {"type": "Point", "coordinates": parts[0][0] if parts and parts[0] else []}
+		if self.type == "Multipoint":
+			return {"type": "MultiPoint", "coordinates": [point for part in parts for point in part]}
+		if self.type == "Polyline":
+			return {"type": "MultiLineString", "coordinates": parts}
+		# Esri rings run clockwise around the outside and counterclockwise around holes
+		polygons = []
+		for ring in parts:
+			area = sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip([p[:2] for p in ring], [p[:2] for p in ring[1:]]))
+			if area <= 0 or not polygons:
+				polygons.append([ring])
+			else:
+				polygons[-1].append(ring)
+		return {"type": "MultiPolygon", "coordinates": polygons}
+
+	def __repr__(self):
+		return "Shape({0!r}, {1} parts, {2} points)".format(self.type, len(self.parts), self.pointCount)
+
+def decode_shape(blob, field): # Shape of a geometry blob, using the geometry field's origins and scales
+	shape_type, pos = read_varuint(blob, 0)
+	base = shape_type & 0xFF
+	general = base in GENERAL_SHAPES
+	has_z = bool(shape_type & HAS_Z) if general else base in Z_SHAPES
+	has_m = bool(shape_type & HAS_M) if general else base in M_SHAPES
+	x_origin, y_origin = field.xy_origin
+	xy_scale = field.xy_scale
+	if base == 0:
+		return None
+	if base in POINT_SHAPES:
+		x, pos = read_varuint(blob, pos)
+		y, pos = read_varuint(blob, pos)
+		if x == 0:
+			return Shape("Point", [], has_z, has_m)
+		point = [(x - 1) / xy_scale + x_origin, (y - 1) / xy_scale + y_origin]
+		if has_z:
+			z, pos = read_varuint(blob, pos)
+			point.append((z - 1) / field.z_scale + field.z_origin)
+		if has_m:
+			m, pos = read_varuint(blob, pos)
+			point.append((m - 1) / field.m_scale + field.m_origin if m else None)
+		return Shape("Point", [[tuple(point)]], has_z, has_m)
+	if base in MULTIPOINT_SHAPES:
+		kind = "Multipoint"
+		count, pos = read_varuint(blob, pos)
+		sizes = [count]
+		curves = 0
+	elif base in POLYLINE_SHAPES or base in POLYGON_SHAPES:
+		kind = "Polyline" if base in POLYLINE_SHAPES else "Polygon"
+		count, pos = read_varuint(blob, pos)
+		parts, pos = read_varuint(blob, pos)
+		curves = 0
+		if general and shape_type & HAS_CURVES:
+			curves, pos = read_varuint(blob, pos)
+	else:
+		raise FGDBError("Shape type {0} isn't supported".format(base))
+	if not count:
+		return Shape(kind, [], has_z, has_m)
+	for i in range(4):
+		# Envelope, recomputed from the points when it's asked for
+		value, pos = read_varuint(blob, pos)
+	if kind != "Multipoint":
+		sizes = []
+		for i in range(parts - 1):
+			size, pos = read_varuint(blob, pos)
+			sizes.append(size)
+		sizes.append(count - sum(sizes))
+	# Coordinates are deltas from the previous point, carried across parts
+	coords = []
+	dx = dy = 0
+	for i in range(count):
+		delta, pos = read_varint(blob, pos)
+		dx += delta
+		delta, pos = read_varint(blob, pos)
+		dy += delta
+		coords.append([dx / xy_scale + x_origin, dy / xy_scale + y_origin])
+	if has_z:
+		dz = 0
+		for coord in coords:
+			delta, pos = read_varint(blob, pos)
+			dz += delta
+			coord.append(dz / field.z_scale + field.z_origin)
+	if has_m:
+		if blob[pos] == 0x42:
+			# Every M is NaN
+			for coord in coords:
+				coord.append(None)
+		else:
+			dm = 0
+			for coord in coords:
+				delta, pos = read_varint(blob, pos)
+				dm += delta
+				coord.append(dm / field.m_scale + field.m_origin)
+	parts = []
+	start = 0
+	for size in sizes:
+		parts.append([tuple(coord) for coord in coords[start:start + size]])
+		start += size
+	return Shape(kind, parts, has_z, has_m)
+
+def mapped(path): # Read-only memory map of a file
+	with open(path, 'rb') as f:
+		return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+class Table(object): # One table of a File Geodatabase, read through its .gdbtable and .gdbtablx files
+	def __init__(self, path, name=None):
+		self.path = path
+		self.name = name or os.path.basename(path)
+		self.data = mapped(path)
+		self.index = mapped(os.path.splitext(path)[0] + ".gdbtablx")
+		version, self.count = struct.unpack_from("<iI", self.data, 0)
+		if version != 3:
+			raise FGDBError("{0} is a version {1} table, only ArcGIS 10.x and Pro 3.1 and earlier tables (version 3) are read".format(path, version))
+		fields_offset = struct.unpack_from("<Q", self.data, 32)[0]
+		self.read_fields(fields_offset)
+		self.read_index()
+
+	def __len__(self):
+		return self.count
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def close(self):
+		self.data.close()
+		self.index.close()
+
+	def read_fields(self, pos): # Parses the field descriptions section
+		buf = bytearray(self.data[pos:pos + 4 + struct.unpack_from("<I", self.data, pos)[0]])
+		layer_flags, field_count = struct.unpack_from("<IH", buf, 8)
+		self.shape_type = GEOMETRY_TYPES.get(layer_flags & 0xFF)
+		pos = 14
+		self.fields = []
+		for i in range(field_count):
+			name, pos = read_utf16(buf, pos + 1, buf[pos])
+			alias, pos = read_utf16(buf, pos + 1, buf[pos])
+			field = Field(name, alias or name, buf[pos])
+			pos += 1
+			code = field.code
+			if code == 4:
+				field.length, flags = struct.unpack_from("<IB", buf, pos)
+				pos += 5
+				if flags & 4:
+					size, pos = read_varuint(buf, pos)
+					pos += size
+			elif code in (6, 8, 10, 11, 12):
+				flags = buf[pos + 1]
+				field.length = buf[pos]
+				pos += 2
+			elif code == 7:
+				flags = buf[pos + 1]
+				pos = self.read_geometry_field(field, buf, pos + 2)
+			elif code == 9:
+				flags = buf[pos + 1]
+				chars = buf[pos + 2]
+				pos += 3 + 2 * chars
+				pos = self.read_geometry_field(field, buf, pos, raster=True)
+				pos += 1 # Raster storage type
+			elif code in FIXED_SIZES or code == 16:
+				field.length, flags, default_size = buf[pos], buf[pos + 1], buf[pos + 2]
+				pos += 3
+				if flags & 4:
+					pos += default_size
+			else:
+				raise FGDBError("{0}: field {1} has the unknown type {2}".format(self.path, name, code))
+			field.isNullable = bool(flags & 1) and code != 6
+			self.fields.append(field)
+		self.nullable = [field for field in self.fields if field.isNullable]
+		self.oid_field = next((field.name for field in self.fields if field.code == 6), None)
+		self.shape_field = next((field.name for field in self.fields if field.code == 7), None)
+
+	def read_geometry_field(self, field, buf, pos, raster=False): # Parses a geometry field's spatial reference, origins and scales, returns the next position
+		wkt_size = struct.unpack_from("<H", buf, pos)[0]
+		field.wkt = bytes(buf[pos + 2:pos + 2 + wkt_size]).decode("utf-16-le")
+		pos += 2 + wkt_size
+		flags = buf[pos]
+		pos += 1
+		field.has_m = bool(flags & 2)
+		field.has_z = bool(flags & 4)
+		x_origin, y_origin, field.xy_scale = struct.unpack_from("<3d", buf, pos)
+		field.xy_origin = (x_origin, y_origin)
+		pos += 24
+		if field.has_m:
+			field.m_origin, field.m_scale = struct.unpack_from("<2d", buf, pos)
+			pos += 16
+		if field.has_z:
+			field.z_origin, field.z_scale = struct.unpack_from("<2d", buf, pos)
+			pos += 16
+		pos += 8 * (1 + field.has_m + field.has_z) # XY, M and Z tolerances
+		if raster:
+			return pos
+		pos += 32 # XY extent
+		# Z and M ranges may come next, then a zero byte and the count of spatial index grid sizes
+		for i in range(3):
+			if buf[pos] == 0 and 1 <= buf[pos + 1] <= 3 and buf[pos + 2:pos + 5] == bytearray(3):
+				break
+			pos += 16
+		else:
+			raise FGDBError("{0}: couldn't find the spatial index grid of {1}".format(self.path, field.name))
+		return pos + 5 + 8 * buf[pos + 1]
+
+	def read_index(self): # Reads the .gdbtablx header and the map of its 1024 row blocks
+		blocks, self.max_oid, self.offset_size = struct.unpack_from("<iiI", self.index, 4)
+		trailer = 16 + blocks * 1024 * self.offset_size
+		self.block_slots = None
+		if blocks and len(self.index) >= trailer + 16:
+			bitmap_words, block_bits = struct.unpack_from("<II", self.index, trailer)
+			if bitmap_words:
+				# Sparse index - only the blocks with rows are stored, the bitmap says which ones
+				bitmap = struct.unpack_from("<{0}I".format(bitmap_words), self.index, trailer + 16)
+				self.block_slots = {}
+				for block in range(block_bits):
+					if bitmap[block // 32] >> (block % 32) & 1:
+						self.block_slots[block] = len(self.block_slots)
+
+	def row_offset(self, oid): # Offset of a row in the .gdbtable, 0 when the OID has no row
+		entry = oid - 1
+		if self.block_slots is not None:
+			slot = self.block_slots.get(entry // 1024)
+			if slot is None:
+				return 0
+			entry = slot * 1024 + entry % 1024
+		raw = self.index[16 + entry * self.offset_size:16 + (entry + 1) * self.offset_size]
+		return struct.unpack("<Q", raw + b"\x00" * (8 - len(raw)))[0]
+
+	def field(self, name): # The field named, also as the OID@ and SHAPE@ tokens
+		upper = name.upper()
+		if upper == "OID@":
+			upper = (self.oid_field or "").upper()
+		elif upper == "SHAPE@":
+			upper = (self.shape_field or "").upper()
+		for field in self.fields:
+			if field.name.upper() == upper:
+				return field
+		raise FGDBError("{0} has no field {1}".format(self.name, name))
+
+	def rows(self, fields=None): # Yields a tuple of the fields' values for every row, all fields by default
+		wanted = [self.field(name) for name in fields] if fields else self.fields
+		columns = dict((id(field), i) for i, field in enumerate(wanted))
+		null_bytes = (len(self.nullable) + 7) // 8
+		# Each stored field as (field, output column or None, bit of its NULL flag or None)
+		layout = []
+		bit = 0
+		for field in self.fields:
+			if field.code == 6:
+				continue
+			if field.code == 9 and id(field) in columns:
+				raise FGDBError("{0}: Raster fields can't be read".format(self.name))
+			layout.append((field, columns.get(id(field)), bit if field.isNullable else None))
+			if field.isNullable:
+				bit += 1
+		oid_columns = [columns[id(field)] for field in wanted if field.code == 6]
+		last = max([i for i, (field, column, null_bit) in enumerate(layout) if column is not None] or [-1])
+		layout = layout[:last + 1] # Nothing after the last field asked for is decoded
+		for oid in range(1, self.max_oid + 1):
+			offset = self.row_offset(oid)
+			if not offset:
+				continue
+			size = struct.unpack_from("<i", self.data, offset)[0]
+			if size < 0:
+				continue # Deleted row
+			blob = bytearray(self.data[offset + 4:offset + 4 + size])
+			values = [None] * len(wanted)
+			for column in oid_columns:
+				values[column] = oid
+			pos = null_bytes
+			for field, column, null_bit in layout:
+				if null_bit is not None and blob[null_bit >> 3] >> (null_bit & 7) & 1:
+					continue
+				code = field.code
+				if code in FIXED_SIZES:
+					if column is not None:
+						value = struct.unpack_from(FIXED_FORMATS[code], blob, pos)[0]
+						if code in (5, 14):
+							value = EPOCH + timedelta(milliseconds=round(value * 86400000))
+						elif code == 15:
+							value = (EPOCH + timedelta(milliseconds=round(value * 86400000))).time()
+						values[column] = value
+					pos += FIXED_SIZES[code]
+				elif code in (10, 11):
+					if column is not None:
+						values[column] = guid_text(blob[pos:pos + 16])
+					pos += 16
+				elif code == 16:
+					if column is not None:
+						days, minutes = struct.unpack_from("<dh", blob, pos)
+						values[column] = EPOCH + timedelta(milliseconds=round(days * 86400000))
+					pos += 10
+				else:
+					size, pos = read_varuint(blob, pos)
+					if column is not None:
+						raw = blob[pos:pos + size]
+						if code in (4, 12):
+							values[column] = bytes(raw).decode("utf-8")
+						elif code == 7:
+							values[column] = decode_shape(raw, field)
+						else:
+							values[column] = bytes(raw)
+					pos += size
+			yield tuple(values)
+
+class FileGDB(object): # A File Geodatabase folder, its tables found through the GDB_SystemCatalog
+	def __init__(self, path):
+		self.path = path
+		catalog_path = os.path.join(path, SYSTEM_CATALOG)
+		if not os.path.exists(catalog_path):
+			raise FGDBError("{0} isn't a file geodatabase".format(path))
+		self.table_files = {}
+		with Table(catalog_path, "GDB_SystemCatalog") as catalog:
+			for oid, name, file_format in catalog.rows(["OID@", "Name", "FileFormat"]):
+				table_file = os.path.join(path, "a{0:08x}.gdbtable".format(oid))
+				if file_format == 0 and os.path.exists(table_file):
+					self.table_files[name.upper()] = (name, table_file)
+
+	def tables(self, system=False): # Names of the tables and feature classes, without the GDB_ system tables unless asked
+		return sorted(name for name, table_file in self.table_files.values() if system or not name.upper().startswith("GDB_"))
+
+	def table(self, name): # Opens a table by name, "REVDATASET\REVTABLEPOINT" also finds a feature class in a feature dataset
+		key = name.replace("\\", "/").split("/")[-1].upper()
+		if key not in self.table_files:
+			raise FGDBError("{0} has no table {1}".format(self.path, name))
+		return Table(self.table_files[key][1], self.table_files[key][0])
+
+def write_rows(out_path, fields, rows, shape_index=None): # Writes rows as a UTF-8 CSV, geometry left out, or as GeoJSON features, returns the rows written
+	written = 0
+	if out_path.lower().endswith(".geojson"):
+		with io.open(out_path, 'w', encoding='utf-8') as f:
+			f.write(u'{"type": "FeatureCollection", "features": [\n')
+			for row in rows:
+				shape = row[shape_index] if shape_index is not None else None
+				properties = dict((name, value.isoformat() if hasattr(value, "isoformat") else value) for i, (name, value) in enumerate(zip(fields, row)) if i != shape_index and not isinstance(value, bytes))
+				feature = {"type": "Feature", "geometry": shape.__geo_interface__ if shape is not None else None, "properties": properties}
+				f.write((u",\n" if written else u"") + u"{0}".format(json.dumps(feature)))
+				written += 1
+			f.write(u"\n]}\n")
+		return written
+	if bytes is str:
+		# Python 2 csv only takes byte strings
+		f = open(out_path, 'wb')
+		encode = lambda value: value.encode("utf-8") if isinstance(value, type(u"")) else value
+	else:
+		f = io.open(out_path, 'w', newline='', encoding='utf-8')
+		encode = lambda value: value
+	with f:
+		writer = csv.writer(f)
+		writer.writerow([name for i, name in enumerate(fields) if i != shape_index])
+		for row in rows:
+			writer.writerow([encode(value) for i, value in enumerate(row) if i != shape_index])
+			written += 1
+	return written
+
+def main(args): # Command line entry point, returns the exit code
+	parser = argparse.ArgumentParser(description="Reads the tables of a File Geodatabase without arcpy")
+	parser.add_argument("gdb", help="File geodatabase folder")
+	parser.add_argument("table", nargs="?", help="Table to read, ie REVTABLEMAIN or REVDATASET\\REVTABLEPOLY. Lists the tables when left out")
+	parser.add_argument("--fields", help="Fields to read, separated by ;, every field by default")
+	parser.add_argument("--session", type=int, action="append", help="Only rows of this reviewer SESSIONID, repeat for several")
+	parser.add_argument("--count-by", help="Counts the rows by these fields, separated by ;, like the frequency report")
+	parser.add_argument("--out", help="Writes the rows to a .csv or .geojson file instead of printing them")
+	parser.add_argument("--limit", type=int, help="Stops after this many rows")
+	options = parser.parse_args(args)
+	gdb = FileGDB(options.gdb)
+	if not options.table:
+		for name in gdb.tables():
+			with gdb.table(name) as table:
+				print(u"{0} ({1} rows{2}): {3}".format(name, len(table), ", " + table.shape_type if table.shape_type else "", ", ".join(field.name for field in table.fields)))
+		return 0
+	with gdb.table(options.table) as table:
+		if options.count_by:
+			fields = [name.strip() for name in options.count_by.split(";") if name.strip()]
+		elif options.fields:
+			fields = [name.strip() for name in options.fields.split(";") if name.strip()]
+		else:
+			fields = [field.name for field in table.fields]
+		read = fields + (["SESSIONID"] if options.session else [])
+		rows = table.rows(read)
+		if options.session:
+			sessions = set(options.session)
+			rows = (row[:len(fields)] for row in rows if row[-1] in sessions)
+		if options.limit is not None:
+			rows = (row for i, row in zip(range(options.limit), rows))
+		if options.count_by:
+			counts = {}
+			for row in rows:
+				counts[row] = counts.get(row, 0) + 1
+			fields = fields + ["COUNT"]
+			rows = [key + (count,) for key, count in sorted(counts.items(), key=lambda item: (-item[1], [u"{0}".format(value) for value in item[0]]))]
+		shape_index = next((i for i, name in enumerate(fields) if table.field(name).code == 7), None) if not options.count_by else None
+		if options.out:
+			written = write_rows(options.out, fields, rows, shape_index)
+			print(u"Wrote {0} rows of {1} to {2}".format(written, table.name, options.out))
+		else:
+			print(u"\t".join(fields))
+			for row in rows:
+				print(u"\t".join(u"" if value is None else u"{0}".format(value) for value in row))
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
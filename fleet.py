@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# ======= #
+#  Fleet  #
+# ======= #
+
+# Runs one RBJ over every geodatabase of a delivery in a worker pool, python run_rbj.py --fleet
+
+# ArcPy aliasing
+import arcpy as ap
+from arcpy import AddMessage as write
+# STOP! Hammer time
+from datetime import datetime as dt
+# System Modules
+import os
+import shutil
+import tempfile
+import multiprocessing
+import traceback
+
+from rbj_common import runtime, get_count, check_data_reviewer, write_csv, feature_class_paths, worker_pool
+from rbj_model import load_rbj
+from columnar import DEFAULT_CHUNK_SIZE
+from parallel import run_checks, clear_reviewer_results
+from reviewer_sessions import run_session
+from frequency_report import FrequencyReport
+from error_export import write_reports
+
+
+FLEET_FIELDS = ("database", "estimated_cost", "status", "seconds", "errors", "output_folder", "error")
+_fleet_reviewer = None # Private reviewer geodatabase of a fleet worker process
+
+def fleet_databases(paths): # Returns the geodatabases named, inside the folders named or listed one per line in the .txt files named
+	databases = []
+	for path in paths:
+		if path.lower().endswith(".txt"):
+			with open(path) as f:
+				databases.extend(fleet_databases([line.strip() for line in f if line.strip() and not line.startswith("#")]))
+		elif path.lower().rstrip("\\/").endswith(".gdb") or not os.path.isdir(path):
+			databases.append(path)
+		else:
+			databases.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.lower().endswith(".gdb"))
+	return databases
+
+def estimate_cost(rbj, production_gdb): # Features of each dataset the RBJ checks times the checks on it, the relative cost of validating a database
+	fc_paths = feature_class_paths(production_gdb)
+	cost = 0
+	for dataset in rbj.datasets():
+		if dataset.upper() in fc_paths:
+			cost += get_count(fc_paths[dataset.upper()]) * len(rbj.for_dataset(dataset))
+	return cost
+
+def init_fleet_worker(reviewer_gdbs): # Fleet worker process initializer, claims a private reviewer geodatabase and the license for the worker's lifetime
+	global _fleet_reviewer
+	_fleet_reviewer = reviewer_gdbs.get()
+	ap.env.overwriteOutput = True
+	ap.CheckOutExtension('datareviewer')
+
+def run_fleet_job(job): # Fleet worker entry point, validates one database into the worker's reviewer geodatabase and writes its reports
+	index, engine, rbj_file, production_gdb, AOI, output_folder, chunk_size, export_chunk_size, breakdowns = job
+	start = dt.now()
+	counts = breakdown_counts = None
+	try:
+		rbj = load_rbj(rbj_file)
+		session = run_session(_fleet_reviewer, "{0} {1}".format(rbj.name, os.path.basename(production_gdb.rstrip("\\/"))))
+		run_checks(engine, rbj, rbj_file, production_gdb, _fleet_reviewer, session, AOI, chunk_size)
+		if not os.path.exists(output_folder):
+			os.makedirs(output_folder)
+		report = FrequencyReport(_fleet_reviewer, breakdowns)
+		write_reports(_fleet_reviewer, output_folder, export_chunk_size, breakdowns, session, report)
+		counts, breakdown_counts = report.counts, report.breakdown_counts
+		error = None
+	except Exception:
+		# arcpy errors don't always survive pickling back to the main process, send the traceback instead
+		error = traceback.format_exc()
+	return index, start, dt.now(), counts, breakdown_counts, error
+
+def run_fleet(engine, rbj_file, databases, reviewer_gdb, output_folder, AOI="", chunk_size=DEFAULT_CHUNK_SIZE, workers=2, export_chunk_size=0, breakdowns=()): # Runs the RBJ over every database in a pool of workers, returns the fleet summary records
+	rbj = load_rbj(rbj_file)
+	fleet_start = dt.now()
+	costs = [estimate_cost(rbj, database) for database in databases]
+	write("Estimated the cost of {0} databases in {1}".format(len(databases), runtime(fleet_start, dt.now())))
+	# Output folders are named after the databases, same named databases from different folders are numbered
+	folders = []
+	for database in databases:
+		name = os.path.splitext(os.path.basename(database.rstrip("\\/")))[0]
+		while os.path.join(output_folder, name) in folders:
+			name = "{0}_{1}".format(name, len(folders))
+		folders.append(os.path.join(output_folder, name))
+	if AOI:
+		AOI = ap.Describe(AOI).catalogPath
+	workers = max(1, min(workers, len(databases)))
+	scratch = tempfile.mkdtemp(prefix="run_rbj_fleet_")
+	records = [None] * len(databases)
+	report = FrequencyReport(None)
+	try:
+		reviewer_gdbs = multiprocessing.Queue()
+		for index in range(workers):
+			worker_gdb = os.path.join(scratch, "worker_{0}.gdb".format(index))
+			ap.Copy_management(reviewer_gdb, worker_gdb)
+			clear_reviewer_results(worker_gdb)
+			reviewer_gdbs.put(worker_gdb)
+		# Largest first, each worker takes the next database as soon as it's free
+		order = sorted(range(len(databases)), key=lambda index: -costs[index])
+		tasks = [(index, engine, rbj_file, databases[index], AOI, folders[index], chunk_size, export_chunk_size, list(breakdowns)) for index in order]
+		pool = worker_pool(workers, init_fleet_worker, (reviewer_gdbs,))
+		try:
+			for index, start, finish, counts, breakdown_counts, error in pool.imap_unordered(run_fleet_job, tasks, 1):
+				record = {"database": databases[index], "estimated_cost": costs[index], "seconds": round((finish - start).total_seconds(), 1), "output_folder": folders[index], "errors": "", "error": ""}
+				if error:
+					record["status"] = "failed"
+					record["error"] = error.strip().splitlines()[-1]
+					ap.AddError("{0} failed:\n{1}".format(databases[index], error))
+				else:
+					record["status"] = "succeeded"
+					record["errors"] = sum(counts.values())
+					report.merge(counts, breakdown_counts)
+					report.merge({}, {"Database": {os.path.basename(folders[index]): record["errors"]}})
+				records[index] = record
+				write("  .. {0}: {1} errors in {2}".format(os.path.basename(folders[index]), record["errors"] if not error else "FAILED", runtime(start, finish)))
+		except Exception:
+			pool.terminate()
+			raise
+		else:
+			pool.close()
+		finally:
+			pool.join()
+	finally:
+		shutil.rmtree(scratch, ignore_errors=True)
+
+	out_xls = report.write(os.path.join(output_folder, "RBJ_fleet_frequency_report.xlsx"))
+	summary_file = write_csv(os.path.join(output_folder, "RBJ_fleet_summary.csv"), FLEET_FIELDS, records)
+	failed = len([record for record in records if record["status"] == "failed"])
+	write("\nValidated {0} databases with {1} workers in {2}, {3} failed".format(len(databases), workers, runtime(fleet_start, dt.now()), failed))
+	write("  .. Fleet frequency report of {0} errors written to {1}".format(sum(report.counts.values()), out_xls))
+	write("  .. Fleet summary written to {0}".format(summary_file))
+	return records
+
+def fleet_main(args): # Command line entry point for fleet runs, returns the exit code
+	import argparse
+	parser = argparse.ArgumentParser(prog="run_rbj.py", description="Runs one RBJ over many geodatabases in a pool of worker processes")
+	parser.add_argument("--fleet", nargs="+", required=True, help="Geodatabases, folders of geodatabases or .txt lists of geodatabases")
+	parser.add_argument("--rbj", required=True, help="RBJ file to run")
+	parser.add_argument("--reviewer", required=True, help="Reviewer geodatabase every worker gets a copy of")
+	parser.add_argument("--output", required=True, help="Output folder, each database's outputs go in a subfolder named after it")
+	parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+	parser.add_argument("--engine", default="Batch Job", choices=("Batch Job", "Native SQL", "Columnar"))
+	parser.add_argument("--aoi", default="", help="AOI polygon feature class")
+	parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+	parser.add_argument("--export-chunk-size", type=int, default=0)
+	parser.add_argument("--breakdowns", default="", help="Semicolon separated frequency report breakdowns")
+	options = parser.parse_args(args)
+	databases = fleet_databases(options.fleet)
+	if not databases:
+		ap.AddError("No geodatabases found in {0}".format(", ".join(options.fleet)))
+		return 1
+	if not os.path.exists(options.output):
+		os.makedirs(options.output)
+	breakdowns = [name.strip() for name in options.breakdowns.split(";") if name.strip()]
+	check_data_reviewer('out')
+	try:
+		records = run_fleet(options.engine, options.rbj, databases, options.reviewer, options.output, options.aoi, options.chunk_size, options.workers, options.export_chunk_size, breakdowns)
+	finally:
+		check_data_reviewer('in')
+	return 1 if [record for record in records if record["status"] == "failed"] else 0
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# ================== #
+#  Frequency Report  #
+# ================== #
+
+# Counts errors in memory and streams them into an .xlsx workbook, one sheet per breakdown
+
+# ArcPy aliasing
+import arcpy as ap
+# System Modules
+import os
+import shutil
+import re
+import tempfile
+import io
+import zipfile
+import numbers
+from xml.sax.saxutils import escape
+
+
+FREQUENCY_FIELDS = ("SUBTYPE", "CHECKTITLE", "ORIGINTABLE", "REVIEWSTATUS")
+# Optional breakdown sheets - sheet name: REVTABLEMAIN field counted
+FREQUENCY_BREAKDOWNS = {"Severity": "SEVERITY", "Check Group": "CHECKRUNID", "Dataset": "ORIGINTABLE"}
+XML_INVALID_CHARS = re.compile(u"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+def xlsx_cell(column, row, value): # Inline cell XML of a value, numbers as numbers and anything else as text
+	ref = u""
+	column += 1
+	while column:
+		column, remainder = divmod(column - 1, 26)
+		ref = u"ABCDEFGHIJKLMNOPQRSTUVWXYZ"[remainder] + ref
+	if value is None:
+		return u""
+	if isinstance(value, numbers.Real) and not isinstance(value, bool):
+		return u'<c r="{0}{1}"><v>{2}</v></c>'.format(ref, row, int(value) if isinstance(value, numbers.Integral) else repr(float(value)))
+	return u'<c r="{0}{1}" t="inlineStr"><is><t xml:space="preserve">{2}</t></is></c>'.format(ref, row, escape(XML_INVALID_CHARS.sub(u"", u"{0}".format(value))))
+
+class XlsxWriter(object): # Streams rows into an .xlsx workbook, one sheet at a time, through temporary sheet files
+	def __init__(self, out_path):
+		self.out_path = out_path
+		self.temp_dir = tempfile.mkdtemp(prefix="run_rbj_xlsx_")
+		self.sheets = [] # [(name, sheet file)]
+		self.sheet = None
+		self.rows = 0
+
+	def add_sheet(self, name):
+		self.end_sheet()
+		path = os.path.join(self.temp_dir, "sheet{0}.xml".format(len(self.sheets) + 1))
+		self.sheets.append((name[:31], path))
+		self.sheet = io.open(path, 'w', encoding='utf-8')
+		self.sheet.write(u'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+		self.rows = 0
+
+	def write_row(self, values):
+		self.rows += 1
+		self.sheet.write(u'<row r="{0}">{1}</row>'.format(self.rows, u"".join(xlsx_cell(column, self.rows, value) for column, value in enumerate(values))))
+
+	def end_sheet(self):
+		if self.sheet is not None:
+			self.sheet.write(u'</sheetData></worksheet>')
+			self.sheet.close()
+			self.sheet = None
+
+	def close(self):
+		self.end_sheet()
+		main = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+		relationships = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+		sheet_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+		try:
+			with zipfile.ZipFile(self.out_path, 'w', zipfile.ZIP_DEFLATED) as workbook:
+				workbook.writestr("[Content_Types].xml", '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types"><Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/><Default Extension="xml" ContentType="application/xml"/><Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+					+ "".join('<Override PartName="/xl/worksheets/sheet{0}.xml" ContentType="{1}"/>'.format(i + 1, sheet_type) for i in range(len(self.sheets))) + '</Types>')
+				workbook.writestr("_rels/.rels", '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships"><Relationship Id="rId1" Type="{0}/officeDocument" Target="xl/workbook.xml"/></Relationships>'.format(relationships))
+				workbook.writestr("xl/workbook.xml", (u'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<workbook xmlns="{0}" xmlns:r="{1}"><sheets>'.format(main, relationships)
+					+ u"".join(u'<sheet name="{0}" sheetId="{1}" r:id="rId{1}"/>'.format(escape(name, {'"': "&quot;"}), i + 1) for i, (name, path) in enumerate(self.sheets)) + u'</sheets></workbook>').encode("utf-8"))
+				workbook.writestr("xl/_rels/workbook.xml.rels", '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+					+ "".join('<Relationship Id="rId{0}" Type="{1}/worksheet" Target="worksheets/sheet{0}.xml"/>'.format(i + 1, relationships) for i in range(len(self.sheets))) + '</Relationships>')
+				for i, (name, path) in enumerate(self.sheets):
+					workbook.write(path, "xl/worksheets/sheet{0}.xml".format(i + 1))
+		finally:
+			shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+class FrequencyReport(object): # Counts the session's errors by the frequency report fields and the chosen breakdowns, fed by the export's REVTABLEMAIN pass
+	def __init__(self, reviewer_gdb, breakdowns=()):
+		self.breakdowns = [name for name in breakdowns if name in FREQUENCY_BREAKDOWNS]
+		self.fields = list(FREQUENCY_FIELDS)
+		for name in self.breakdowns:
+			if FREQUENCY_BREAKDOWNS[name] not in self.fields:
+				self.fields.append(FREQUENCY_BREAKDOWNS[name])
+		self.counts = {} # (SUBTYPE, CHECKTITLE, ORIGINTABLE, REVIEWSTATUS) -> errors
+		self.breakdown_counts = dict((name, {}) for name in self.breakdowns)
+		self.groups = {} # CHECKRUNID -> check group
+		if "Check Group" in self.breakdowns and reviewer_gdb:
+			with ap.da.SearchCursor(os.path.join(reviewer_gdb, "REVCHECKRUNTABLE"), ["CHECKRUNID", "BATCHJOBGROUPNAME"]) as cursor:
+				for run_id, group in cursor:
+					self.groups[run_id] = group
+
+	def add(self, row): # Counts one REVTABLEMAIN row of self.fields values
+		key = tuple(row[:len(FREQUENCY_FIELDS)])
+		self.counts[key] = self.counts.get(key, 0) + 1
+		for name in self.breakdowns:
+			value = row[self.fields.index(FREQUENCY_BREAKDOWNS[name])]
+			if name == "Check Group":
+				value = self.groups.get(value)
+			counts = self.breakdown_counts[name]
+			counts[value] = counts.get(value, 0) + 1
+
+	def merge(self, counts, breakdown_counts): # Adds the counts of another report, adding the breakdowns this one doesn't have
+		for key, count in counts.items():
+			self.counts[key] = self.counts.get(key, 0) + count
+		for name, values in breakdown_counts.items():
+			if name not in self.breakdown_counts:
+				self.breakdowns.append(name)
+				self.breakdown_counts[name] = {}
+			target = self.breakdown_counts[name]
+			for value, count in values.items():
+				target[value] = target.get(value, 0) + count
+
+	def write(self, out_path, workbook=None): # Writes the report workbook, or into the GeoPackageTables given, returns out_path
+		workbook = workbook or XlsxWriter(out_path)
+		# Same columns and order as the old Frequency_analysis table
+		workbook.add_sheet("Frequency")
+		workbook.write_row(["FREQUENCY"] + list(FREQUENCY_FIELDS))
+		for key in sorted(self.counts, key=lambda key: tuple((value is None, value) for value in key)):
+			workbook.write_row([self.counts[key]] + list(key))
+		for name in self.breakdowns:
+			counts = self.breakdown_counts[name]
+			workbook.add_sheet(name)
+			workbook.write_row([name.upper(), "FREQUENCY"])
+			for value in sorted(counts, key=lambda value: (-counts[value], value is None, value)):
+				workbook.write_row([value, counts[value]])
+		workbook.close()
+		return out_path
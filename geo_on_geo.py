@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+# ============================= #
+#  Geometry on Geometry Engine  #
+# ============================= #
+
+# Relates each primary feature to the secondary features a uniform envelope grid puts within tolerance, in a worker pool
+
+# ArcPy aliasing
+import arcpy as ap
+from arcpy import AddMessage as write
+# STOP! Hammer time
+from datetime import datetime as dt
+# System Modules
+import math
+import traceback
+
+from rbj_common import runtime, rows_per_second, get_count, feature_class_paths, combine_where, ShardError, worker_pool
+from rbj_model import load_rbj
+from native_sql import ReviewerWriter, feature_subtypes, fetch_shapes, aoi_layer
+from columnar import oid_chunks
+
+
+GEO_ON_GEO_CHECK = "Geometry on Geometry Check"
+# esriSpatialRelEnum value of SpatialEnum -> arcpy relationship test of the primary against the secondary feature
+GEO_RELATIONS = {
+	1: lambda a, b: not a.disjoint(b),
+	4: lambda a, b: a.touches(b),
+	5: lambda a, b: a.overlaps(b),
+	6: lambda a, b: a.crosses(b),
+	7: lambda a, b: a.within(b),
+	8: lambda a, b: a.contains(b)}
+# CustomSpatialRel DE-9IM pattern of SpatialEnum 9 -> relationship test
+GEO_DE9IM = {
+	"T********": lambda a, b: not a.disjoint(b) and not a.touches(b),                                # Interiors intersect
+	"1********": lambda a, b: not a.disjoint(b) and not a.touches(b) and shared_length(a, b) > 0,    # Interiors intersect along a line
+	"F***1****": lambda a, b: a.touches(b) and shared_length(a, b) > 0}                             # Only the boundaries meet, along a line
+METERS_PER_DEGREE = 111320.0
+MAX_GRID_SIDE = 1024   # Grid cells per side of the secondary extent
+SPATIAL_INDEX_CACHE = 8 # Secondary grids kept per process for the checks sharing them
+
+def shared_length(a, b): # Length of the line where two geometries meet
+	try:
+		return a.intersect(b, 2).length
+	except Exception:
+		return 0.0
+
+class EnvelopeGrid(object): # Uniform grid over feature envelopes, returning the features whose envelope meets a query envelope
+	def __init__(self, features):
+		self.features = [(shape.extent, oid, shape) for oid, shape in features if shape is not None and shape.extent.XMin is not None]
+		self.cells = {}
+		if not self.features:
+			return
+		self.xmin = min(extent.XMin for extent, oid, shape in self.features)
+		self.ymin = min(extent.YMin for extent, oid, shape in self.features)
+		width = max(extent.XMax for extent, oid, shape in self.features) - self.xmin
+		height = max(extent.YMax for extent, oid, shape in self.features) - self.ymin
+		# Around one feature per cell, so a query tests few more candidates than it has to
+		side = max(1, min(MAX_GRID_SIDE, int(len(self.features) ** 0.5)))
+		self.cell_width = (width / side) or 1.0
+		self.cell_height = (height / side) or 1.0
+		for index, (extent, oid, shape) in enumerate(self.features):
+			for cell in self.cover(extent.XMin, extent.YMin, extent.XMax, extent.YMax):
+				self.cells.setdefault(cell, []).append(index)
+
+	def cover(self, xmin, ymin, xmax, ymax): # Grid cells an envelope falls in
+		first_col = int((xmin - self.xmin) // self.cell_width)
+		last_col = int((xmax - self.xmin) // self.cell_width)
+		first_row = int((ymin - self.ymin) // self.cell_height)
+		last_row = int((ymax - self.ymin) // self.cell_height)
+		return [(col, row) for col in range(first_col, last_col + 1) for row in range(first_row, last_row + 1)]
+
+	def query(self, xmin, ymin, xmax, ymax): # Yields the (oid, shape) of every feature whose envelope meets the query envelope
+		if not self.features:
+			return
+		seen = set()
+		for cell in self.cover(xmin, ymin, xmax, ymax):
+			for index in self.cells.get(cell, ()):
+				if index in seen:
+					continue
+				seen.add(index)
+				extent, oid, shape = self.features[index]
+				if extent.XMin <= xmax and extent.XMax >= xmin and extent.YMin <= ymax and extent.YMax >= ymin:
+					yield oid, shape
+
+def geo_relation(check): # Returns the relationship test of a Geometry on Geometry check, or None when the engine can't evaluate it
+	params = check.params
+	if check.check_type != GEO_ON_GEO_CHECK or len(check.secondary) != 1 or not check.dataset or not check.secondary[0][1]:
+		return None
+	if params.get("CheckAttributes") or params.get("MergeFeatures"):
+		return None
+	relation = params.get("SpatialEnum")
+	if relation == 9:
+		return GEO_DE9IM.get((params.get("CustomSpatialRel") or "").strip("'"))
+	if params.get("Tolerance") and relation != 1:
+		return None # Only intersects is run with a search tolerance
+	return GEO_RELATIONS.get(relation)
+
+def resource_where(fc_path, subtype_field, subtype, where_clause): # Where clause of a resource's subtype and SQL filters
+	subtype_where = "{0} = {1}".format(ap.AddFieldDelimiters(fc_path, subtype_field), subtype) if subtype is not None and subtype_field else None
+	return combine_where(subtype_where, where_clause)
+
+def utm_reference(shape): # UTM spatial reference of the zone a geographic geometry's centroid is in
+	centroid = shape.centroid
+	zone = min(60, max(1, int((centroid.X + 180) // 6) + 1))
+	return ap.SpatialReference((32600 if centroid.Y >= 0 else 32700) + zone)
+
+class ToleranceTest(object): # Intersects within a tolerance in meters, projecting geographic data to UTM to measure it
+	def __init__(self, spatial_reference, meters):
+		self.geographic = getattr(spatial_reference, "type", "") == "Geographic"
+		self.tolerance = meters if self.geographic else meters / (getattr(spatial_reference, "metersPerUnit", 1.0) or 1.0)
+
+	def expansion(self, extent): # (x, y) the envelope of a feature at extent is grown by before searching
+		if not self.geographic:
+			return self.tolerance, self.tolerance
+		# A degree of longitude is shortest at the latitude furthest from the equator
+		latitude = min(89.0, max(abs(extent.YMin), abs(extent.YMax)))
+		return self.tolerance / (METERS_PER_DEGREE * math.cos(math.radians(latitude))), self.tolerance / METERS_PER_DEGREE
+
+	def __call__(self, a, b):
+		if not a.disjoint(b):
+			return True
+		if self.geographic:
+			utm = utm_reference(a)
+			a, b = a.projectAs(utm), b.projectAs(utm)
+		return a.distanceTo(b) <= self.tolerance
+
+_spatial_indexes = {} # (secondary path, where clause, AOI) -> EnvelopeGrid of the filtered secondary features
+
+def secondary_grid(fc_path, where_clause, AOI=""): # Returns the EnvelopeGrid of a secondary resource, cached for the checks sharing it
+	key = (fc_path, where_clause, AOI)
+	if key not in _spatial_indexes:
+		if len(_spatial_indexes) >= SPATIAL_INDEX_CACHE:
+			_spatial_indexes.clear()
+		source = aoi_layer(fc_path, AOI, "geo_secondary_lyr")
+		try:
+			with ap.da.SearchCursor(source, ["OID@", "SHAPE@"], where_clause) as cursor:
+				_spatial_indexes[key] = EnvelopeGrid([(row[0], row[1]) for row in cursor])
+		finally:
+			if AOI and ap.Exists(source):
+				ap.Delete_management(source)
+	return _spatial_indexes[key]
+
+def evaluate_geo_check(check, fc_paths, partition=None, AOI=""): # Returns ([(oid, subtype code)] in error, features validated) of one check over the primary features in the partition
+	fc_path = fc_paths[check.dataset.upper()]
+	name, secondary, subtype_field, subtype, where_clause = check.secondary[0]
+	secondary_path = fc_paths[secondary.upper()]
+	grid = secondary_grid(secondary_path, resource_where(secondary_path, subtype_field, subtype, where_clause), AOI)
+	test = geo_relation(check)
+	expand = lambda extent: (0.0, 0.0)
+	if check.params.get("SpatialEnum") == 1 and check.params.get("Tolerance"):
+		test = ToleranceTest(ap.Describe(fc_path).spatialReference, float(check.params["Tolerance"]))
+		expand = test.expansion
+	same_dataset = fc_path == secondary_path
+	primary_subtype_field = feature_subtypes(fc_path)[0]
+	fields = ["OID@", "SHAPE@"] + ([primary_subtype_field] if primary_subtype_field else [])
+	errors = []
+	validated = 0
+	source = aoi_layer(fc_path, AOI, "geo_primary_lyr")
+	try:
+		with ap.da.SearchCursor(source, fields, combine_where(partition, resource_where(fc_path, check.subtype_field, check.subtype, check.where_clause))) as cursor:
+			for row in cursor:
+				validated += 1
+				shape = row[1]
+				related = False
+				if shape is not None and shape.extent.XMin is not None:
+					extent = shape.extent
+					dx, dy = expand(extent)
+					for oid, other in grid.query(extent.XMin - dx, extent.YMin - dy, extent.XMax + dx, extent.YMax + dy):
+						if same_dataset and oid == row[0]:
+							continue
+						if test(shape, other):
+							# One error per primary feature, the other secondary features can't add to it
+							related = True
+							break
+				# NotQuery checks report the features that aren't related to any secondary feature
+				if related != bool(check.params.get("NotQuery")):
+					errors.append((row[0], row[2] if primary_subtype_field else None))
+	finally:
+		if AOI and ap.Exists(source):
+			ap.Delete_management(source)
+	return errors, validated
+
+def run_geo_unit(job): # Worker entry point, evaluates a primary dataset's checks over one OID range of it
+	index, rbj_file, keys, production_gdb, partition, AOI = job
+	try:
+		ap.env.overwriteOutput = True
+		keys = set(keys)
+		checks = [check for check in load_rbj(rbj_file).checks if check.key in keys]
+		fc_paths = feature_class_paths(production_gdb)
+		results = dict((check.key, evaluate_geo_check(check, fc_paths, partition, AOI)) for check in checks)
+		error = None
+	except Exception:
+		# arcpy errors don't always survive pickling back to the main process, send the traceback instead
+		results = None
+		error = traceback.format_exc()
+	return index, results, error
+
+def run_geo_checks(rbj, rbj_file, checks, production_gdb, reviewer_gdb, session, AOI="", workers=1): # Evaluates the Geometry on Geometry checks the engine can, returns the checks left for the batch job
+	fc_paths = feature_class_paths(production_gdb)
+	supported = [check for check in checks if geo_relation(check) is not None and check.dataset.upper() in fc_paths and check.secondary[0][1].upper() in fc_paths]
+	if not supported:
+		return checks
+	geo_start = dt.now()
+	by_dataset = {}
+	for check in supported:
+		by_dataset.setdefault(check.dataset, []).append(check)
+	jobs = []
+	for dataset in sorted(by_dataset):
+		keys = [check.key for check in by_dataset[dataset]]
+		partitions = [None]
+		if workers > 1:
+			# A few OID ranges per worker keeps them busy when the features aren't spread evenly
+			count = get_count(fc_paths[dataset.upper()])
+			partitions = list(oid_chunks(fc_paths[dataset.upper()], max(1000, count // (workers * 4) + 1))) or [None]
+		jobs.extend((len(jobs), rbj_file, keys, production_gdb, partition, AOI) for partition in partitions)
+	matches = dict((check.key, []) for check in supported)
+	validated = dict((check.key, 0) for check in supported)
+	def collect(results):
+		for key, (errors, count) in results.items():
+			matches[key].extend(errors)
+			validated[key] += count
+	if workers > 1 and len(jobs) > 1:
+		if AOI:
+			AOI = ap.Describe(AOI).catalogPath
+			jobs = [job[:5] + (AOI,) for job in jobs]
+		pool = worker_pool(min(workers, len(jobs)))
+		try:
+			for index, results, error in pool.imap_unordered(run_geo_unit, jobs):
+				if error:
+					raise ShardError("Geometry on Geometry partition {0} failed:\n{1}".format(index, error))
+				collect(results)
+		except Exception:
+			pool.terminate()
+			raise
+		else:
+			pool.close()
+		finally:
+			pool.join()
+	else:
+		for job in jobs:
+			index, results, error = run_geo_unit(job)
+			if error:
+				raise ShardError("Geometry on Geometry checks failed:\n{0}".format(error))
+			collect(results)
+
+	# Written in RBJ order from this process, whichever worker found them
+	writer = ReviewerWriter(reviewer_gdb, session, rbj.name, rbj_file)
+	errors = 0
+	try:
+		for dataset in sorted(by_dataset):
+			fc_path = fc_paths[dataset.upper()]
+			shape_type = ap.Describe(fc_path).shapeType
+			subtypes = feature_subtypes(fc_path)[1]
+			found = [oid for check in by_dataset[dataset] for oid, code in matches[check.key]]
+			shapes = fetch_shapes(fc_path, set(found)) if found else {}
+			for check in sorted(by_dataset[dataset], key=lambda check: check.index):
+				check_run_id = writer.new_check_run()
+				for oid, code in sorted(matches[check.key]):
+					writer.add_error(check, check_run_id, dataset, oid, subtypes.get(code), shape_type, shapes.get(oid))
+				writer.add_check_run(check, check_run_id, validated[check.key], len(matches[check.key]))
+				errors += len(matches[check.key])
+	finally:
+		writer.close()
+	rows = sum(validated.values())
+	write("  .. Geometry on Geometry: {0} checks in {1} units, {2} errors in {3} ({4})".format(len(supported), len(jobs), errors, runtime(geo_start, dt.now()), rows_per_second(rows, geo_start, dt.now())))
+	keys = set(check.key for check in supported)
+	return [check for check in checks if check.key not in keys]
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+# =================== #
+#  GeoPackage Output  #
+# =================== #
+
+# Writes the error layers and frequency tables into one GeoPackage through sqlite3
+
+# ArcPy aliasing
+import arcpy as ap
+from arcpy import AddMessage as write
+# STOP! Hammer time
+from datetime import datetime as dt
+# System Modules
+import os
+import re
+import numbers
+import struct
+import sqlite3
+
+from rbj_common import runtime
+
+
+GEOPACKAGE_NAME = "RBJ_errors.gpkg"
+GPKG_BATCH_ROWS = 5000
+# GeoPackage column types for REVTABLEMAIN field types
+GPKG_FIELD_TYPES = {"String": "TEXT", "Integer": "INTEGER", "OID": "INTEGER", "SmallInteger": "SMALLINT", "Double": "DOUBLE", "Single": "FLOAT", "Date": "DATETIME", "Guid": "TEXT", "GlobalID": "TEXT"}
+# Layer geometry type for each export geometry type, single parts are promoted so a layer holds one type
+GPKG_GEOMETRY_TYPES = {"POINT": "MULTIPOINT", "MULTIPOINT": "MULTIPOINT", "POLYLINE": "MULTILINESTRING", "POLYGON": "MULTIPOLYGON"}
+GPKG_SCHEMA = """
+CREATE TABLE gpkg_spatial_ref_sys (srs_name TEXT NOT NULL, srs_id INTEGER NOT NULL PRIMARY KEY, organization TEXT NOT NULL, organization_coordsys_id INTEGER NOT NULL, definition TEXT NOT NULL, description TEXT);
+CREATE TABLE gpkg_contents (table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL, identifier TEXT UNIQUE, description TEXT DEFAULT '', last_change DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')), min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, srs_id INTEGER, CONSTRAINT fk_gc_r_srs_id FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys(srs_id));
+CREATE TABLE gpkg_geometry_columns (table_name TEXT NOT NULL, column_name TEXT NOT NULL, geometry_type_name TEXT NOT NULL, srs_id INTEGER NOT NULL, z TINYINT NOT NULL, m TINYINT NOT NULL, CONSTRAINT pk_geom_cols PRIMARY KEY (table_name, column_name), CONSTRAINT uk_gc_table_name UNIQUE (table_name), CONSTRAINT fk_gc_tn FOREIGN KEY (table_name) REFERENCES gpkg_contents(table_name), CONSTRAINT fk_gc_srs FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys (srs_id));
+CREATE TABLE gpkg_extensions (table_name TEXT, column_name TEXT, extension_name TEXT NOT NULL, definition TEXT NOT NULL, scope TEXT NOT NULL, CONSTRAINT ge_tce UNIQUE (table_name, column_name, extension_name));
+INSERT INTO gpkg_spatial_ref_sys VALUES ('Undefined cartesian SRS', -1, 'NONE', -1, 'undefined', 'undefined cartesian coordinate reference system');
+INSERT INTO gpkg_spatial_ref_sys VALUES ('Undefined geographic SRS', 0, 'NONE', 0, 'undefined', 'undefined geographic coordinate reference system');
+INSERT INTO gpkg_spatial_ref_sys VALUES ('WGS 84 geodetic', 4326, 'EPSG', 4326, 'GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563,AUTHORITY["EPSG","7030"]],AUTHORITY["EPSG","6326"]],PRIMEM["Greenwich",0,AUTHORITY["EPSG","8901"]],UNIT["degree",0.0174532925199433,AUTHORITY["EPSG","9122"]],AUTHORITY["EPSG","4326"]]', 'longitude/latitude coordinates in decimal degrees on the WGS 84 spheroid');
+"""
+# Spatial index triggers of the GeoPackage R-tree extension, {t} table, {c} geometry column, {i} fid column
+GPKG_RTREE_TRIGGERS = """
+CREATE TRIGGER "rtree_{t}_{c}_insert" AFTER INSERT ON "{t}" WHEN (new."{c}" NOT NULL AND NOT ST_IsEmpty(NEW."{c}"))
+BEGIN INSERT OR REPLACE INTO "rtree_{t}_{c}" VALUES (NEW."{i}", ST_MinX(NEW."{c}"), ST_MaxX(NEW."{c}"), ST_MinY(NEW."{c}"), ST_MaxY(NEW."{c}")); END;
+CREATE TRIGGER "rtree_{t}_{c}_update1" AFTER UPDATE OF "{c}" ON "{t}" WHEN OLD."{i}" = NEW."{i}" AND (NEW."{c}" NOTNULL AND NOT ST_IsEmpty(NEW."{c}"))
+BEGIN INSERT OR REPLACE INTO "rtree_{t}_{c}" VALUES (NEW."{i}", ST_MinX(NEW."{c}"), ST_MaxX(NEW."{c}"), ST_MinY(NEW."{c}"), ST_MaxY(NEW."{c}")); END;
+CREATE TRIGGER "rtree_{t}_{c}_update2" AFTER UPDATE OF "{c}" ON "{t}" WHEN OLD."{i}" = NEW."{i}" AND (NEW."{c}" ISNULL OR ST_IsEmpty(NEW."{c}"))
+BEGIN DELETE FROM "rtree_{t}_{c}" WHERE id = OLD."{i}"; END;
+CREATE TRIGGER "rtree_{t}_{c}_update3" AFTER UPDATE ON "{t}" WHEN OLD."{i}" != NEW."{i}" AND (NEW."{c}" NOTNULL AND NOT ST_IsEmpty(NEW."{c}"))
+BEGIN DELETE FROM "rtree_{t}_{c}" WHERE id = OLD."{i}"; INSERT OR REPLACE INTO "rtree_{t}_{c}" VALUES (NEW."{i}", ST_MinX(NEW."{c}"), ST_MaxX(NEW."{c}"), ST_MinY(NEW."{c}"), ST_MaxY(NEW."{c}")); END;
+CREATE TRIGGER "rtree_{t}_{c}_update4" AFTER UPDATE ON "{t}" WHEN OLD."{i}" != NEW."{i}" AND (NEW."{c}" ISNULL OR ST_IsEmpty(NEW."{c}"))
+BEGIN DELETE FROM "rtree_{t}_{c}" WHERE id IN (OLD."{i}", NEW."{i}"); END;
+CREATE TRIGGER "rtree_{t}_{c}_delete" AFTER DELETE ON "{t}" WHEN old."{c}" NOT NULL
+BEGIN DELETE FROM "rtree_{t}_{c}" WHERE id = OLD."{i}"; END;
+"""
+
+def gpkg_envelope(blob): # (minx, maxx, miny, maxy) from the header of a GeoPackage geometry blob, None when it's empty or has no envelope
+	if blob is None:
+		return None
+	flags = bytearray(blob[3:4])[0]
+	if flags & 0x10 or not flags & 0x0E:
+		return None
+	return struct.unpack_from("<4d" if flags & 0x01 else ">4d", blob, 8)
+
+def gpkg_is_empty(blob): # 1 for an empty GeoPackage geometry blob, None for NULL
+	if blob is None:
+		return None
+	return 1 if bytearray(blob[3:4])[0] & 0x10 else 0
+
+def register_gpkg_functions(connection): # The SQL functions the R-tree index and its triggers call, which plain SQLite doesn't have
+	for i, name in enumerate(("ST_MinX", "ST_MaxX", "ST_MinY", "ST_MaxY")):
+		connection.create_function(name, 1, lambda blob, i=i: (gpkg_envelope(blob) or (None,) * 4)[i])
+	connection.create_function("ST_IsEmpty", 1, gpkg_is_empty)
+
+def gpkg_geometry(shape, srs_id): # GeoPackage geometry blob of an arcpy geometry - header, envelope and WKB, single parts promoted to their multipart type
+	if shape is None:
+		return None
+	wkb = bytes(shape.WKB)
+	extent = shape.extent
+	if extent.XMin is None or extent.XMin != extent.XMin:
+		# Empty flag and no envelope
+		return sqlite3.Binary(b"GP" + struct.pack("<BBi", 0, 0x11, srs_id) + wkb)
+	wkb_type = struct.unpack_from("<I" if bytearray(wkb[:1])[0] == 1 else ">I", wkb, 1)[0]
+	if (wkb_type & 0xFFFF) % 1000 in (1, 2, 3):
+		# Point, LineString and Polygon wrapped in a collection of one
+		wkb = struct.pack("<BII", 1, wkb_type + 3, 1) + wkb
+	return sqlite3.Binary(b"GP" + struct.pack("<BBi4d", 0, 0x03, srs_id, extent.XMin, extent.XMax, extent.YMin, extent.YMax) + wkb)
+
+def gpkg_value(value): # A row value as SQLite stores it, dates as GeoPackage DATETIME text
+	if isinstance(value, dt):
+		return "{0:%Y-%m-%dT%H:%M:%S}.{1:03d}Z".format(value, value.microsecond // 1000)
+	return value
+
+def gpkg_column_type(values): # GeoPackage column type of a frequency table column's values
+	values = [value for value in values if value is not None]
+	if values and all(isinstance(value, numbers.Integral) and not isinstance(value, bool) for value in values):
+		return "INTEGER"
+	if values and all(isinstance(value, numbers.Real) and not isinstance(value, bool) for value in values):
+		return "DOUBLE"
+	return "TEXT"
+
+class GeoPackage(object): # A GeoPackage file, created on first open, with one connection shared by its writers so their inserts never wait on each other's locks
+	def __init__(self, path):
+		self.path = path
+		new = not os.path.exists(path)
+		self.connection = sqlite3.connect(path)
+		register_gpkg_functions(self.connection)
+		if new:
+			self.connection.execute("PRAGMA application_id = 1196444487") # "GPKG"
+			self.connection.execute("PRAGMA user_version = 10200")
+			self.connection.executescript(GPKG_SCHEMA)
+			self.connection.commit()
+
+	def tables(self): # Names of the layers and tables in the GeoPackage
+		return set(row[0] for row in self.connection.execute("SELECT table_name FROM gpkg_contents"))
+
+	def srs_id(self, spatial_reference): # The srs_id of an arcpy spatial reference, adding it to gpkg_spatial_ref_sys the first time
+		if spatial_reference is None:
+			return -1
+		code = getattr(spatial_reference, "factoryCode", 0) or 0
+		definition = spatial_reference.exportToString().split(";")[0]
+		if code:
+			if self.connection.execute("SELECT 1 FROM gpkg_spatial_ref_sys WHERE srs_id = ?", (code,)).fetchone():
+				return code
+			srs_id = code
+		else:
+			row = self.connection.execute("SELECT srs_id FROM gpkg_spatial_ref_sys WHERE definition = ?", (definition,)).fetchone()
+			if row:
+				return row[0]
+			# Custom coordinate systems get ids past every EPSG and Esri code
+			srs_id = max(1000000, self.connection.execute("SELECT MAX(srs_id) FROM gpkg_spatial_ref_sys").fetchone()[0] + 1)
+		self.connection.execute("INSERT INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, NULL)", (spatial_reference.name, srs_id, "EPSG" if 0 < code < 100000 else "ESRI" if code else "NONE", code or srs_id, definition))
+		return srs_id
+
+	def drop(self, table): # Deletes a layer or table with its spatial index and registration
+		self.connection.execute('DROP TABLE IF EXISTS "rtree_{0}_geom"'.format(table))
+		self.connection.execute('DROP TABLE IF EXISTS "{0}"'.format(table))
+		for metadata in ("gpkg_extensions", "gpkg_geometry_columns", "gpkg_contents"):
+			self.connection.execute("DELETE FROM {0} WHERE table_name = ?".format(metadata), (table,))
+		self.connection.commit()
+
+	def index(self): # Builds the R-tree spatial index of every layer without one and records the layer extents
+		layers = self.connection.execute("SELECT table_name, column_name FROM gpkg_geometry_columns").fetchall()
+		indexed = set(row[0] for row in self.connection.execute("SELECT table_name FROM gpkg_extensions WHERE extension_name = 'gpkg_rtree_index'"))
+		for table, column in layers:
+			extent = self.connection.execute('SELECT MIN(ST_MinX("{1}")), MIN(ST_MinY("{1}")), MAX(ST_MaxX("{1}")), MAX(ST_MaxY("{1}")) FROM "{0}"'.format(table, column)).fetchone()
+			self.connection.execute("UPDATE gpkg_contents SET min_x = ?, min_y = ?, max_x = ?, max_y = ?, last_change = strftime('%Y-%m-%dT%H:%M:%fZ','now') WHERE table_name = ?", tuple(extent) + (table,))
+			if table in indexed:
+				continue
+			index_start = dt.now()
+			try:
+				self.connection.execute('CREATE VIRTUAL TABLE "rtree_{0}_{1}" USING rtree(id, minx, maxx, miny, maxy)'.format(table, column))
+			except sqlite3.OperationalError as e:
+				ap.AddWarning("SQLite can't build spatial indexes here ({0}), the GeoPackage layers are written without them".format(e))
+				break
+			# Loaded in one statement, then the triggers keep it current through later edits
+			self.connection.execute('INSERT INTO "rtree_{0}_{1}" SELECT fid, ST_MinX("{1}"), ST_MaxX("{1}"), ST_MinY("{1}"), ST_MaxY("{1}") FROM "{0}" WHERE "{1}" NOT NULL AND NOT ST_IsEmpty("{1}")'.format(table, column))
+			self.connection.executescript(GPKG_RTREE_TRIGGERS.format(t=table, c=column, i="fid"))
+			self.connection.execute("INSERT INTO gpkg_extensions VALUES (?, ?, 'gpkg_rtree_index', 'http://www.geopackage.org/spec120/#extension_rtree', 'write-only')", (table, column))
+			write("  .. Spatial index of {0} built in {1}".format(table, runtime(index_start, dt.now())))
+		self.connection.commit()
+
+	def close(self):
+		self.connection.commit()
+		self.connection.close()
+
+class GeoPackageLayerWriter(object): # Creates a GeoPackage layer or attributes table on its first row and inserts error rows into it in batches, in place of an ErrorExportWriter
+	def __init__(self, geopackage, table, out_fields, geometry_type=None, spatial_reference=None):
+		self.geopackage = geopackage
+		self.table = table
+		self.out_path = os.path.join(geopackage.path, table)
+		self.out_fields = out_fields # [(name, type, length)], full length names and no length limits
+		self.geometry_type = GPKG_GEOMETRY_TYPES.get(geometry_type, geometry_type) if geometry_type else None
+		self.spatial_reference = spatial_reference
+		self.srs_id = None
+		self.rows = None
+		self.count = 0
+		names = (["geom"] if self.geometry_type else []) + [field_name for field_name, field_type, length in out_fields]
+		self.sql = 'INSERT INTO "{0}" ({1}) VALUES ({2})'.format(table, ", ".join('"{0}"'.format(name) for name in names), ", ".join("?" for name in names))
+
+	def create(self):
+		connection = self.geopackage.connection
+		columns = ['"fid" INTEGER PRIMARY KEY NOT NULL']
+		if self.geometry_type:
+			columns.append('"geom" {0}'.format(self.geometry_type))
+		columns += ['"{0}" {1}'.format(field_name, field_type) for field_name, field_type, length in self.out_fields]
+		connection.execute('CREATE TABLE "{0}" ({1})'.format(self.table, ", ".join(columns)))
+		connection.execute("INSERT INTO gpkg_contents (table_name, data_type, identifier, srs_id) VALUES (?, ?, ?, ?)", (self.table, "features" if self.geometry_type else "attributes", self.table, self.srs_id if self.geometry_type else None))
+		if self.geometry_type:
+			connection.execute("INSERT INTO gpkg_geometry_columns VALUES (?, 'geom', ?, ?, 2, 0)", (self.table, self.geometry_type, self.srs_id))
+
+	def open(self): # Starts a batch, creating the layer unless it's being appended to
+		if self.geometry_type and self.srs_id is None:
+			self.srs_id = self.geopackage.srs_id(self.spatial_reference)
+		if self.table not in self.geopackage.tables():
+			self.create()
+		self.rows = []
+
+	def truncate(self, count): # Drops every row after the first count, left by a chunk that never finished
+		if self.table in self.geopackage.tables():
+			# fid is the rowid, so rows are numbered 1, 2, ... in insert order
+			self.geopackage.connection.execute('DELETE FROM "{0}" WHERE fid > ?'.format(self.table), (count,))
+			self.geopackage.connection.commit()
+		self.count = count
+
+	def insert(self, values, shape=None):
+		if self.rows is None:
+			self.open()
+		row = [gpkg_value(value) for value in values]
+		if self.geometry_type:
+			row.insert(0, gpkg_geometry(shape, self.srs_id))
+		self.rows.append(row)
+		self.count += 1
+		if len(self.rows) >= GPKG_BATCH_ROWS:
+			self.flush()
+
+	def flush(self):
+		if self.rows:
+			self.geopackage.connection.executemany(self.sql, self.rows)
+			self.rows = []
+
+	def delete(self): # Deletes the layer, for an export that failed part way
+		self.rows = None
+		self.geopackage.connection.rollback()
+		self.geopackage.drop(self.table)
+
+	def close(self):
+		if self.rows is not None:
+			self.flush()
+			self.geopackage.connection.commit()
+			self.rows = None
+
+class GeoPackageTables(object): # Writes the frequency report's sheets as attributes tables of a GeoPackage, in place of an XlsxWriter
+	def __init__(self, path):
+		self.geopackage = GeoPackage(path)
+		self.name = None
+		self.rows = []
+
+	def add_sheet(self, name):
+		self.end_sheet()
+		self.name = "RBJ_frequency" if name == "Frequency" else "RBJ_frequency_" + re.sub(r"\W+", "_", name).lower()
+		self.rows = []
+
+	def write_row(self, values):
+		self.rows.append(list(values))
+
+	def end_sheet(self): # Replaces the table with the sheet's rows, the first of them the column names
+		if self.name is None:
+			return
+		header, rows = self.rows[0], self.rows[1:]
+		out_fields = [(re.sub(r"\W+", "_", u"{0}".format(name)), gpkg_column_type([row[i] for row in rows]), None) for i, name in enumerate(header)]
+		self.geopackage.drop(self.name)
+		writer = GeoPackageLayerWriter(self.geopackage, self.name, out_fields)
+		writer.open()
+		for row in rows:
+			writer.insert(row)
+		writer.close()
+		self.name = None
+
+	def close(self):
+		self.end_sheet()
+		self.geopackage.close()
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+# ======================== #
+#  Incremental Validation  #
+# ======================== #
+
+# Revalidates only the features edited since the last run of the RBJ, carrying the other errors forward
+
+# ArcPy aliasing
+import arcpy as ap
+from arcpy import AddMessage as write
+# STOP! Hammer time
+from datetime import datetime as dt
+# System Modules
+import os
+import shutil
+import hashlib
+import functools
+import tempfile
+try:
+	import cPickle as pickle
+except ImportError:
+	import pickle
+
+from rbj_common import runtime, session_id, feature_class_paths, REVIEWER_RESULT_TABLES, guid_where_clauses
+from rbj_model import RBJ_CACHE_DIR, base_dataset_name, check_signature
+from native_sql import SQL_CHECK, SQLCompileError, check_node, node_fields, fetch_shapes, aoi_layer, execute_batch_job
+from columnar import DEFAULT_CHUNK_SIZE
+from geo_on_geo import ToleranceTest
+from parallel import run_checks
+from tiling import FEATURE_CHECKS, extent_polygon, run_all_checks
+
+
+FINGERPRINT_VERSION = 1
+# Meters in an esriUnits value of a check's ToleranceUnits, 11 being decimal degrees
+ESRI_UNIT_METERS = {1: 0.0254, 3: 0.3048, 4: 0.9144, 5: 1609.344, 6: 1852.0, 7: 0.001, 8: 0.01, 9: 1.0, 10: 1000.0, 11: 111320.0, 12: 0.1}
+
+def fingerprint_file(production_gdb, reviewer_gdb, session, cache_dir=RBJ_CACHE_DIR): # Fingerprint store of a production database validated into a reviewer session
+	digest = hashlib.sha1("|".join(os.path.abspath(path).lower() for path in (production_gdb, reviewer_gdb)).encode("utf-8") + b"|" + session.encode("utf-8")).hexdigest()
+	return os.path.join(cache_dir, "fingerprints_{0}_v{1}.pkl".format(digest, FINGERPRINT_VERSION))
+
+def related_datasets(rbj): # Datasets read by checks that relate features to each other, as primary or secondary resources
+	datasets = set()
+	for check in rbj.checks:
+		if check.check_type not in FEATURE_CHECKS:
+			datasets.add(check.dataset)
+			datasets.update(resource[1] for resource in check.secondary)
+	datasets.discard(None)
+	return datasets
+
+def search_tolerance(rbj): # Largest search tolerance in meters of the checks relating features to each other, 0 without any
+	tolerances = [float(check.params.get("Tolerance") or 0) * ESRI_UNIT_METERS.get(check.params.get("ToleranceUnits"), 1.0) for check in rbj.checks if check.check_type not in FEATURE_CHECKS]
+	return max(tolerances or [0.0])
+
+def fingerprint_fields(rbj, dataset, fc_path, related): # Attribute fields whose edits can change the dataset's check results
+	fields = [f.name for f in ap.ListFields(fc_path) if f.type not in ("OID", "Geometry", "Blob", "Raster")]
+	checks = rbj.for_dataset(dataset)
+	if dataset in related or any(check.check_type != SQL_CHECK for check in checks):
+		return fields
+	# A dataset with nothing but SQL checks only needs the fields its where clauses read
+	read = set()
+	try:
+		for check in checks:
+			node_fields(check_node(check), read)
+	except SQLCompileError:
+		return fields
+	return [name for name in fields if name.upper() in read]
+
+def feature_fingerprints(fc_path, fields, extents=False): # Returns ({oid: fingerprint}, {oid: (xmin, ymin, xmax, ymax)}) for every feature
+	desc = ap.Describe(fc_path)
+	edited_at = getattr(desc, "editedAtFieldName", "") if getattr(desc, "editorTrackingEnabled", False) else ""
+	read = ["OID@", "SHAPE@" if extents else "SHAPE@WKB"] + ([edited_at] if edited_at else fields)
+	prints = {}
+	boxes = {}
+	with ap.da.SearchCursor(fc_path, read) as cursor:
+		for row in cursor:
+			shape = row[1]
+			if extents and shape is not None:
+				boxes[row[0]] = (shape.extent.XMin, shape.extent.YMin, shape.extent.XMax, shape.extent.YMax)
+			if edited_at:
+				prints[row[0]] = row[2]
+			else:
+				wkb = (shape.WKB if extents else shape) if shape is not None else None
+				prints[row[0]] = hashlib.sha1(repr(row[2:]).encode("utf-8") + bytes(wkb or b"")).digest()
+	return prints, boxes
+
+def remove_prior_errors(reviewer_gdb, session, oids): # Deletes the session's errors on {dataset: oids} and their geometry, returns how many were deleted
+	links = set()
+	oids = dict((dataset.upper(), oid_set) for dataset, oid_set in oids.items())
+	where = "SESSIONID = {0}".format(session_id(session))
+	with ap.da.UpdateCursor(os.path.join(reviewer_gdb, "REVTABLEMAIN"), ["ORIGINTABLE", "OBJECTID", "ID"], where) as cursor:
+		for origin, oid, link in cursor:
+			if oid in oids.get((base_dataset_name(origin) or "").upper(), ()):
+				links.add(link)
+				cursor.deleteRow()
+	for table in ("REVTABLEPOINT", "REVTABLELINE", "REVTABLEPOLY"):
+		with ap.da.UpdateCursor(os.path.join(reviewer_gdb, "REVDATASET", table), ["LINKGUID"], where) as cursor:
+			for row in cursor:
+				if row[0] in links:
+					cursor.deleteRow()
+	return len(links)
+
+def delete_batch_runs(reviewer_gdb, batch_ids): # Deletes the REVBATCHRUNTABLE rows of the batch run IDs no check run points to anymore
+	run_table = os.path.join(reviewer_gdb, "REVCHECKRUNTABLE")
+	batch_ids = set(batch_id for batch_id in batch_ids if batch_id)
+	for where in guid_where_clauses(run_table, "BATCHRUNID", list(batch_ids)):
+		with ap.da.SearchCursor(run_table, ["BATCHRUNID"], where) as cursor:
+			batch_ids.difference_update(row[0] for row in cursor)
+	batch_table = os.path.join(reviewer_gdb, "REVBATCHRUNTABLE")
+	for where in guid_where_clauses(batch_table, "ID", batch_ids):
+		with ap.da.UpdateCursor(batch_table, ["ID"], where) as cursor:
+			for row in cursor:
+				cursor.deleteRow()
+
+def clear_session_results(reviewer_gdb, session): # Deletes every result of the session and the batch runs of its check runs, returns the errors deleted
+	where = "SESSIONID = {0}".format(session_id(session))
+	batch_ids = set()
+	deleted = 0
+	for table in REVIEWER_RESULT_TABLES:
+		if table == "REVBATCHRUNTABLE":
+			continue
+		with ap.da.UpdateCursor(os.path.join(reviewer_gdb, table), ["BATCHRUNID" if table == "REVCHECKRUNTABLE" else "SESSIONID"], where) as cursor:
+			for row in cursor:
+				if table == "REVCHECKRUNTABLE":
+					batch_ids.add(row[0])
+				cursor.deleteRow()
+				if table == "REVTABLEMAIN":
+					deleted += 1
+	delete_batch_runs(reviewer_gdb, batch_ids)
+	return deleted
+
+def merge_check_runs(reviewer_gdb, session): # Folds the older check runs of each check in the session into its newest one, returns how many were deleted
+	# Errors an incremental pass didn't revalidate still point to older check runs of their check, they move to the newest one
+	where = "SESSIONID = {0}".format(session_id(session))
+	run_table = os.path.join(reviewer_gdb, "REVCHECKRUNTABLE")
+	with ap.da.SearchCursor(run_table, ["OID@", "CHECKRUNID", "TOTALVALIDATED", "BATCHJOBGROUPNAME", "CHECKNAME", "CHECKTITLE", "RESOURCENAME"], where) as cursor:
+		runs = sorted(tuple(row) for row in cursor)
+	newest = {}
+	for row in runs:
+		newest[check_signature(*row[3:])] = row
+	superseded = {} # older CHECKRUNID -> newest CHECKRUNID of the same check
+	validated = {}  # newest CHECKRUNID -> features validated, the most any of the check's runs covered
+	for row in runs:
+		keep = newest[check_signature(*row[3:])]
+		if row[0] != keep[0]:
+			superseded[row[1]] = keep[1]
+			validated[keep[1]] = max(validated.get(keep[1], keep[2] or 0), row[2] or 0)
+	results = {}
+	with ap.da.UpdateCursor(os.path.join(reviewer_gdb, "REVTABLEMAIN"), ["CHECKRUNID"], where) as cursor:
+		for row in cursor:
+			if row[0] in superseded:
+				row[0] = superseded[row[0]]
+				cursor.updateRow(row)
+			results[row[0]] = results.get(row[0], 0) + 1
+	batch_ids = set()
+	with ap.da.UpdateCursor(run_table, ["CHECKRUNID", "BATCHRUNID", "TOTALVALIDATED", "TOTALRESULTS"], where) as cursor:
+		for run_id, batch_id, total_validated, total_results in cursor:
+			if run_id in superseded:
+				batch_ids.add(batch_id)
+				cursor.deleteRow()
+			else:
+				cursor.updateRow([run_id, batch_id, validated.get(run_id, total_validated), results.get(run_id, 0)])
+	delete_batch_runs(reviewer_gdb, batch_ids)
+	return len(superseded)
+
+def write_dirty_area(boxes, AOI, spatial_reference, out_fc, search_meters=0): # Writes one polygon per (xmin, ymin, xmax, ymax) box, padded by the search tolerance and clipped to the AOI, returns out_fc
+	# Points and straight lines have empty extents, a few tolerances of padding keeps every box a polygon
+	pad = (spatial_reference.XYTolerance or 0.001) * 10
+	search = ToleranceTest(spatial_reference, search_meters) if search_meters else None
+	area = None
+	if AOI:
+		with ap.da.SearchCursor(AOI, ["SHAPE@"], spatial_reference=spatial_reference) as cursor:
+			area = functools.reduce(lambda a, b: a.union(b), [row[0] for row in cursor])
+	ap.CreateFeatureclass_management(os.path.dirname(out_fc), os.path.basename(out_fc), "POLYGON", spatial_reference=spatial_reference)
+	with ap.da.InsertCursor(out_fc, ["SHAPE@"]) as cursor:
+		for xmin, ymin, xmax, ymax in boxes:
+			# Features as far as the widest search tolerance from an edit can have their results change
+			x_pad, y_pad = search.expansion(ap.Extent(xmin, ymin, xmax, ymax)) if search else (0.0, 0.0)
+			polygon = extent_polygon((xmin - pad - x_pad, ymin - pad - y_pad, xmax + pad + x_pad, ymax + pad + y_pad), spatial_reference)
+			if area is not None:
+				if area.disjoint(polygon):
+					continue
+				polygon = polygon.intersect(area, 4)
+			cursor.insertRow([polygon])
+	return out_fc
+
+def run_incremental(engine, rbj, rbj_file, production_gdb, reviewer_gdb, session, AOI="", chunk_size=DEFAULT_CHUNK_SIZE, workers=1, tile_limit=0): # Validates only the features changed since the last run, or everything when there's nothing to compare against
+	scan_start = dt.now()
+	store_file = fingerprint_file(production_gdb, reviewer_gdb, session)
+	store = None
+	if os.path.exists(store_file):
+		try:
+			with open(store_file, 'rb') as f:
+				store = pickle.load(f)
+		except Exception:
+			store = None
+	if store is not None and store["rbj"] != rbj.file_hash:
+		store = None
+	fc_paths = feature_class_paths(production_gdb)
+	related = related_datasets(rbj)
+	datasets = [ds for ds in sorted(set(rbj.datasets()) | related) if ds.upper() in fc_paths]
+	current = {}
+	for dataset in datasets:
+		fc_path = fc_paths[dataset.upper()]
+		current[dataset] = feature_fingerprints(fc_path, fingerprint_fields(rbj, dataset, fc_path, related), dataset in related)
+	write("  .. Fingerprinted {0} features in {1} datasets in {2}".format(sum(len(prints) for prints, boxes in current.values()), len(datasets), runtime(scan_start, dt.now())))
+
+	if store is None:
+		write("  .. No earlier run of this RBJ into this reviewer session, validating everything")
+		cleared = clear_session_results(reviewer_gdb, session)
+		if cleared:
+			write("  .. Cleared {0} errors of earlier runs from the session".format(cleared))
+		run_all_checks(engine, rbj, rbj_file, production_gdb, reviewer_gdb, session, AOI, chunk_size, workers, tile_limit)
+	else:
+		dirty = {}   # dataset -> new or modified OIDs
+		deleted = {} # dataset -> OIDs gone since the last run
+		boxes = []   # Old and new extents around which related features are revalidated
+		for dataset in datasets:
+			prints, extents = current[dataset]
+			old_prints, old_extents = store["datasets"].get(dataset, ({}, {}))
+			changed = set(oid for oid, fingerprint in prints.items() if old_prints.get(oid) != fingerprint)
+			gone = set(old_prints).difference(prints)
+			if changed:
+				dirty[dataset] = changed
+			if gone:
+				deleted[dataset] = gone
+			boxes.extend(old_extents[oid] for oid in changed.union(gone) if oid in old_extents)
+			if changed and not extents:
+				# Only related datasets keep extents, the batch job still has to reach edits elsewhere
+				extents = dict((oid, (shape.extent.XMin, shape.extent.YMin, shape.extent.XMax, shape.extent.YMax)) for oid, shape in fetch_shapes(fc_paths[dataset.upper()], changed).items() if shape is not None)
+			boxes.extend(extents[oid] for oid in changed if oid in extents)
+		write("  .. {0} new or modified and {1} deleted features since the last run".format(sum(len(oids) for oids in dirty.values()), sum(len(oids) for oids in deleted.values())))
+		if dirty or deleted:
+			scratch = tempfile.mkdtemp(prefix="run_rbj_incremental_")
+			try:
+				area = ""
+				revalidate = dict((dataset, set(oids)) for dataset, oids in dirty.items())
+				if boxes:
+					# Every feature near an edit can have its related check results change
+					scratch_gdb = ap.CreateFileGDB_management(scratch, "incremental.gdb").getOutput(0)
+					area = write_dirty_area(boxes, AOI, ap.Describe(fc_paths[datasets[0].upper()]).spatialReference, os.path.join(scratch_gdb, "dirty_area"), search_tolerance(rbj))
+					for dataset in datasets:
+						source = aoi_layer(fc_paths[dataset.upper()], area, "dirty_area_lyr")
+						with ap.da.SearchCursor(source, ["OID@"]) as cursor:
+							revalidate.setdefault(dataset, set()).update(row[0] for row in cursor)
+						ap.Delete_management(source)
+				stale = dict((dataset, revalidate.get(dataset, set()).union(deleted.get(dataset, ()))) for dataset in set(revalidate) | set(deleted))
+				removed = remove_prior_errors(reviewer_gdb, session, stale)
+				write("  .. Removed {0} earlier errors on {1} features being revalidated or deleted".format(removed, sum(len(oids) for oids in stale.values())))
+				if revalidate:
+					revalidate_start = dt.now()
+					checks = [check for check in rbj.checks if check.dataset in revalidate]
+					if engine in ("Native SQL", "Columnar"):
+						run_checks(engine, rbj, rbj_file, production_gdb, reviewer_gdb, session, area, chunk_size, [check.key for check in checks], revalidate)
+					elif area:
+						execute_batch_job(reviewer_gdb, session, rbj_file, production_gdb, area, [check.key for check in checks])
+					write("  .. Revalidated {0} features in {1}".format(sum(len(oids) for oids in revalidate.values()), runtime(revalidate_start, dt.now())))
+				merge_check_runs(reviewer_gdb, session)
+			finally:
+				shutil.rmtree(scratch, ignore_errors=True)
+		else:
+			write("  .. Nothing changed, keeping the errors of the last run")
+
+	store = {"rbj": rbj.file_hash, "datasets": current}
+	try:
+		if not os.path.exists(os.path.dirname(store_file)):
+			os.makedirs(os.path.dirname(store_file))
+		temp_file = store_file + ".{0}.tmp".format(os.getpid())
+		with open(temp_file, 'wb') as f:
+			pickle.dump(store, f, 2)
+		if os.path.exists(store_file):
+			os.remove(store_file)
+		os.rename(temp_file, store_file)
+	except (IOError, OSError):
+		write("  .. Couldn't save the feature fingerprints, the next run will validate everything")
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# =============== #
+#  Multiple RBJs  #
+# =============== #
+
+# Runs the checks several RBJs share once and gives each RBJ the results of its own checks
+
+# ArcPy aliasing
+import arcpy as ap
+from arcpy import AddMessage as write
+# System Modules
+import os
+import shutil
+import tempfile
+
+from rbj_common import session_id
+from native_sql import SQLCompileError, parse_where_clause
+from columnar import DEFAULT_CHUNK_SIZE
+from tiling import run_all_checks
+from incremental import delete_batch_runs
+from error_export import write_reports
+
+
+def split_rbj_files(value): # "a.rbj;'b c.rbj'" -> ["a.rbj", "b c.rbj"], as multivalue file parameters are passed
+	return [path.strip().strip("'\"") for path in value.split(";") if path.strip()]
+
+def normalized_where(where_clause): # Where clause in a form that ignores case, spacing and redundant parentheses
+	if not where_clause:
+		return None
+	try:
+		return repr(parse_where_clause(where_clause))
+	except SQLCompileError:
+		return " ".join(where_clause.split())
+
+def check_fingerprint(check, rbj_name): # Identity of what a check validates and reports, equal for identical checks in different RBJs
+	if any(value is None for value in check.params.values()):
+		# Nested configs (Composite Checks) aren't in the model, so these are never treated as duplicates
+		return (rbj_name, check.key)
+	return (check.check_type, check.dataset, (check.subtype_field or "").upper(), check.subtype, normalized_where(check.where_clause), check.title, check.notes, check.severity,
+		tuple(sorted(check.params.items())), tuple((name, dataset, (field or "").upper(), subtype, normalized_where(where)) for name, dataset, field, subtype, where in check.secondary))
+
+def plan_rbjs(rbjs, names): # Returns ([(RBJ name, names of the RBJs holding the checks, keys of the checks)] to run, checks saved)
+	owners = {} # fingerprint -> RBJ names
+	first = {}  # fingerprint -> (RBJ name, check) that runs it
+	for rbj, name in zip(rbjs, names):
+		for check in rbj.checks:
+			fingerprint = check_fingerprint(check, name)
+			owners.setdefault(fingerprint, set()).add(name)
+			first.setdefault(fingerprint, (name, check))
+	runs = []
+	index = {} # (RBJ name, owners) -> position in runs
+	for rbj, name in zip(rbjs, names):
+		for check in rbj.checks:
+			fingerprint = check_fingerprint(check, name)
+			if first[fingerprint][1] is not check:
+				continue
+			group = (name, frozenset(owners[fingerprint]))
+			if group not in index:
+				index[group] = len(runs)
+				runs.append((name, group[1], []))
+			runs[index[group]][2].append(check.key)
+	return runs, sum(len(rbj) for rbj in rbjs) - len(first)
+
+def session_check_runs(reviewer_gdb, session): # CHECKRUNIDs of the session's REVCHECKRUNTABLE rows
+	with ap.da.SearchCursor(os.path.join(reviewer_gdb, "REVCHECKRUNTABLE"), ["CHECKRUNID"], "SESSIONID = {0}".format(session_id(session))) as cursor:
+		return set(row[0] for row in cursor)
+
+def keep_rbj_results(reviewer_gdb, run_ids): # Deletes every result of a check run that isn't in run_ids from a reviewer workspace
+	batch_ids = set()
+	with ap.da.UpdateCursor(os.path.join(reviewer_gdb, "REVCHECKRUNTABLE"), ["CHECKRUNID", "BATCHRUNID"]) as cursor:
+		for run_id, batch_id in cursor:
+			if run_id not in run_ids:
+				batch_ids.add(batch_id)
+				cursor.deleteRow()
+	links = set()
+	with ap.da.UpdateCursor(os.path.join(reviewer_gdb, "REVTABLEMAIN"), ["CHECKRUNID", "ID"]) as cursor:
+		for run_id, link in cursor:
+			if run_id not in run_ids:
+				links.add(link)
+				cursor.deleteRow()
+	for table in ("REVTABLEPOINT", "REVTABLELINE", "REVTABLEPOLY"):
+		with ap.da.UpdateCursor(os.path.join(reviewer_gdb, "REVDATASET", table), ["LINKGUID"]) as cursor:
+			for row in cursor:
+				if row[0] in links:
+					cursor.deleteRow()
+	delete_batch_runs(reviewer_gdb, batch_ids)
+
+def run_rbjs(engine, rbjs, rbj_files, names, production_gdb, reviewer_gdb, session, AOI="", chunk_size=DEFAULT_CHUNK_SIZE, workers=1, tile_limit=0): # Runs the unique checks of several RBJs once, returns {RBJ name: CHECKRUNIDs of its results}
+	runs, saved = plan_rbjs(rbjs, names)
+	write("  .. {0} of {1} checks are duplicated across the RBJs, saving {0} check executions".format(saved, sum(len(rbj) for rbj in rbjs)))
+	models = dict((name, (rbj, rbj_file)) for rbj, rbj_file, name in zip(rbjs, rbj_files, names))
+	for name in names:
+		if not [run for run in runs if run[0] == name]:
+			write("  .. Every check in '{0}' already runs from an earlier RBJ".format(name))
+	owned = dict((name, set()) for name in names)
+	for name, owners, keys in runs:
+		rbj, rbj_file = models[name]
+		write("  .. Running {0} unique checks from '{1}' for {2}".format(len(keys), name, ", ".join("'{0}'".format(owner) for owner in names if owner in owners)))
+		before = session_check_runs(reviewer_gdb, session)
+		run_all_checks(engine, rbj, rbj_file, production_gdb, reviewer_gdb, session, AOI, chunk_size, workers, tile_limit, keys)
+		added = session_check_runs(reviewer_gdb, session) - before
+		for owner in owners:
+			owned[owner].update(added)
+	return owned
+
+def write_rbj_reports(reviewer_gdb, owned, names, output_folder, export_chunk_size=0, breakdowns=(), session=None, output_format="Shapefile"): # Writes a frequency report and error shapefiles per RBJ into output_folder\<RBJ name>, returns the report paths
+	scratch = tempfile.mkdtemp(prefix="run_rbj_reports_")
+	reports = []
+	try:
+		for name in names:
+			write("\n~~ {0} ~~".format(name))
+			rbj_folder = os.path.join(output_folder, os.path.splitext(name)[0])
+			if not os.path.exists(rbj_folder):
+				os.makedirs(rbj_folder)
+			rbj_gdb = os.path.join(scratch, "{0}.gdb".format(len(reports)))
+			ap.Copy_management(reviewer_gdb, rbj_gdb)
+			keep_rbj_results(rbj_gdb, owned[name])
+			reports.append(write_reports(rbj_gdb, rbj_folder, export_chunk_size, breakdowns, session, output_format=output_format))
+	finally:
+		shutil.rmtree(scratch, ignore_errors=True)
+	return reports
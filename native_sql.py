@@ -0,0 +1,553 @@
+# -*- coding: utf-8 -*-
+# =================== #
+#  Native SQL Engine  #
+# =================== #
+
+# Evaluates every Execute SQL Check of a dataset in one cursor pass, leaving what it can't compile to the batch job
+
+# ArcPy aliasing
+import arcpy as ap
+from arcpy import AddMessage as write
+# STOP! Hammer time
+from datetime import datetime as dt
+# System Modules
+import os
+import re
+import uuid
+import getpass
+import operator
+import tempfile
+
+from rbj_common import runtime, rows_per_second, session_id, feature_class_paths
+from rbj_model import write_rbj_subset
+
+
+SQL_CHECK = "Execute SQL Check"
+# Reviewer geometry table and GEOMETRYTYPE code for each feature class shape type
+REVIEWER_GEOMETRY = {"Point": ("REVTABLEPOINT", 1), "Multipoint": ("REVTABLEPOINT", 2), "Polyline": ("REVTABLELINE", 3), "Polygon": ("REVTABLEPOLY", 4)}
+# RUNCONTEXT and STATUS of the REVBATCHRUNTABLE row of a batch job run from ArcMap that finished
+BATCH_RUN_CONTEXT = 1
+BATCH_RUN_STATUS = 0
+NUMERIC_FIELDS = ("OID", "SmallInteger", "Integer", "Single", "Double")
+TEXT_FIELDS = ("String", "Guid", "GlobalID")
+SQL_TOKENS = re.compile(r"\s*(?:(?P<number>-?(?:\d+\.?\d*|\.\d+))|(?P<string>'(?:[^']|'')*')|(?P<op><>|!=|<=|>=|=|<|>)|(?P<punct>[(),])|(?P<name>[A-Za-z_][A-Za-z0-9_]*))")
+SQL_KEYWORDS = ("AND", "OR", "NOT", "IN", "IS", "NULL", "LIKE", "BETWEEN", "ESCAPE")
+SQL_OPERATORS = {"=": operator.eq, "<>": operator.ne, "!=": operator.ne, "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+_UNSET = object() # Memo slot that hasn't been evaluated for the current row
+
+class SQLCompileError(Exception): # Raised for where clauses outside the subset the native engine understands
+	pass
+
+def tokenize_sql(where_clause): # Splits a where clause into (kind, value) tokens
+	tokens = []
+	pos = 0
+	where_clause = where_clause.strip()
+	while pos < len(where_clause):
+		match = SQL_TOKENS.match(where_clause, pos)
+		if not match or match.end() == pos:
+			raise SQLCompileError("Unsupported SQL near '{0}'".format(where_clause[pos:pos + 20]))
+		pos = match.end()
+		kind = match.lastgroup
+		value = match.group(kind)
+		if kind == "number":
+			value = float(value)
+			if value.is_integer():
+				value = int(value)
+		elif kind == "string":
+			value = value[1:-1].replace("''", "'")
+		elif kind == "name":
+			value = value.upper()
+			if value in SQL_KEYWORDS:
+				kind = "keyword"
+		tokens.append((kind, value))
+	return tokens
+
+class SQLParser(object): # Recursive descent parser for the SQL subset used in RBJ where clauses
+	# Nested tuples that double as keys for shared sub-expressions: ("and", (...)), ("or", (...)), ("not", node), ("cmp", op, left, right), ("in", operand, values),
+	# ("null", operand), ("like", operand, pattern) and ("between", operand, low, high), with ("field", NAME) or ("lit", value) operands
+
+	def __init__(self, where_clause):
+		self.tokens = tokenize_sql(where_clause)
+		self.pos = 0
+
+	def peek(self, kind=None, value=None):
+		if self.pos >= len(self.tokens):
+			return False
+		tkind, tvalue = self.tokens[self.pos]
+		return (kind is None or tkind == kind) and (value is None or tvalue == value)
+
+	def take(self, kind=None, value=None):
+		if not self.peek(kind, value):
+			found = self.tokens[self.pos][1] if self.pos < len(self.tokens) else "end of clause"
+			raise SQLCompileError("Expected {0} but found '{1}'".format(value or kind, found))
+		self.pos += 1
+		return self.tokens[self.pos - 1][1]
+
+	def parse(self):
+		node = self.parse_or()
+		if self.pos != len(self.tokens):
+			raise SQLCompileError("Unexpected '{0}'".format(self.tokens[self.pos][1]))
+		return node
+
+	def parse_or(self):
+		nodes = [self.parse_and()]
+		while self.peek("keyword", "OR"):
+			self.take()
+			nodes.append(self.parse_and())
+		return nodes[0] if len(nodes) == 1 else ("or", tuple(nodes))
+
+	def parse_and(self):
+		nodes = [self.parse_not()]
+		while self.peek("keyword", "AND"):
+			self.take()
+			nodes.append(self.parse_not())
+		return nodes[0] if len(nodes) == 1 else ("and", tuple(nodes))
+
+	def parse_not(self):
+		if self.peek("keyword", "NOT"):
+			self.take()
+			return ("not", self.parse_not())
+		if self.peek("punct", "("):
+			self.take()
+			node = self.parse_or()
+			self.take("punct", ")")
+			return node
+		return self.parse_predicate()
+
+	def parse_operand(self):
+		if self.peek("name"):
+			return ("field", self.take())
+		if self.peek("number") or self.peek("string"):
+			return ("lit", self.take())
+		raise SQLCompileError("Expected a field or value")
+
+	def parse_list_value(self): # An IN list value, NULL is kept as None
+		if self.peek("keyword", "NULL"):
+			self.take()
+			return None
+		return self.take("number") if self.peek("number") else self.take("string")
+
+	def parse_predicate(self):
+		left = self.parse_operand()
+		if self.peek("op"):
+			op = self.take()
+			return ("cmp", "<>" if op == "!=" else op, left, self.parse_operand())
+		if self.peek("keyword", "IS"):
+			self.take()
+			negate = self.peek("keyword", "NOT") and self.take()
+			self.take("keyword", "NULL")
+			node = ("null", left)
+			return ("not", node) if negate else node
+		negate = self.peek("keyword", "NOT") and self.take()
+		if self.peek("keyword", "IN"):
+			self.take()
+			self.take("punct", "(")
+			values = [self.parse_list_value()]
+			while self.peek("punct", ","):
+				self.take()
+				values.append(self.parse_list_value())
+			self.take("punct", ")")
+			node = ("in", left, tuple(sorted(set(values), key=repr)))
+		elif self.peek("keyword", "LIKE"):
+			self.take()
+			node = ("like", left, self.take("string"))
+			if self.peek("keyword", "ESCAPE"):
+				raise SQLCompileError("LIKE ... ESCAPE is not supported")
+		elif self.peek("keyword", "BETWEEN"):
+			self.take()
+			low = self.parse_operand()
+			self.take("keyword", "AND")
+			node = ("between", left, low, self.parse_operand())
+		else:
+			raise SQLCompileError("Expected a comparison")
+		return ("not", node) if negate else node
+
+def parse_where_clause(where_clause): # Returns the parsed node tree of a where clause, raising SQLCompileError for unsupported SQL
+	return SQLParser(where_clause).parse()
+
+def check_node(check): # Returns the full node tree of an Execute SQL Check, subtype filter included
+	nodes = []
+	if check.subtype is not None:
+		nodes.append(("cmp", "=", ("field", (check.subtype_field or "").upper()), ("lit", check.subtype)))
+	if check.where_clause:
+		nodes.append(parse_where_clause(check.where_clause))
+	if not nodes:
+		raise SQLCompileError("Check has no where clause")
+	return nodes[0] if len(nodes) == 1 else ("and", tuple(nodes))
+
+def node_fields(node, fields): # Adds every field name referenced by a node tree to the fields set
+	kind = node[0]
+	if kind == "field":
+		fields.add(node[1])
+	elif kind in ("and", "or"):
+		for child in node[1]:
+			node_fields(child, fields)
+	elif kind in ("not", "in", "null", "like"):
+		node_fields(node[1], fields)
+	elif kind == "cmp":
+		node_fields(node[2], fields)
+		node_fields(node[3], fields)
+	elif kind == "between":
+		for operand in node[1:]:
+			node_fields(operand, fields)
+
+def count_nodes(node, counts): # Counts how often each sub-expression appears so shared ones can be memoized
+	counts[node] = counts.get(node, 0) + 1
+	if node[0] in ("and", "or"):
+		for child in node[1]:
+			count_nodes(child, counts)
+	elif node[0] == "not":
+		count_nodes(node[1], counts)
+
+def coerce_literal(value, field_type): # Returns a literal compared against a field of field_type, or refuses to compile
+	if field_type in NUMERIC_FIELDS:
+		if not isinstance(value, (int, float)):
+			raise SQLCompileError("Text compared to numeric field")
+	elif field_type in TEXT_FIELDS:
+		if isinstance(value, (int, float)):
+			raise SQLCompileError("Number compared to text field")
+	else:
+		raise SQLCompileError("Comparisons on {0} fields are not supported".format(field_type))
+	return value
+
+class SQLProgram(object): # Compiles the node trees of one dataset's checks into predicates over a shared row layout
+	# Predicates follow SQL three-valued logic (True/False/None), a row is an error only when its predicate is True
+
+	def __init__(self, field_types):
+		self.field_types = field_types # {FIELD NAME: arcpy field type} for the dataset
+		self.fields = []               # Upper case field names in cursor order (after OID@)
+		self.counts = {}
+		self.memo_slots = {}
+
+	def prepare(self, nodes): # Registers every node tree before compiling so fields and shared nodes are known
+		fields = set()
+		for node in nodes:
+			node_fields(node, fields)
+			count_nodes(node, self.counts)
+		missing = [f for f in fields if f not in self.field_types]
+		for field in sorted(fields):
+			if field in self.field_types and field not in self.fields:
+				self.fields.append(field)
+		return missing
+
+	def compile(self, node): # Returns predicate(row, memo) for a prepared node tree
+		func = self._compile(node)
+		if self.counts.get(node, 0) > 1:
+			func = self._memoize(node, func)
+		return func
+
+	def new_memo(self):
+		return [_UNSET] * len(self.memo_slots)
+
+	def _memoize(self, node, func):
+		slot = self.memo_slots.setdefault(node, len(self.memo_slots))
+		def memoized(row, memo):
+			value = memo[slot]
+			if value is _UNSET:
+				value = memo[slot] = func(row, memo)
+			return value
+		return memoized
+
+	def _operand(self, operand): # Returns (getter(row), field type or None for literals)
+		if operand[0] == "lit":
+			value = operand[1]
+			return (lambda row: value), None
+		index = self.fields.index(operand[1]) + 1
+		return operator.itemgetter(index), self.field_types[operand[1]]
+
+	def _compile(self, node):
+		kind = node[0]
+		if kind in ("and", "or"):
+			children = [self.compile(child) for child in node[1]]
+			if kind == "and":
+				def predicate(row, memo):
+					unknown = False
+					for child in children:
+						value = child(row, memo)
+						if value is False:
+							return False
+						if value is None:
+							unknown = True
+					return None if unknown else True
+			else:
+				def predicate(row, memo):
+					unknown = False
+					for child in children:
+						value = child(row, memo)
+						if value is True:
+							return True
+						if value is None:
+							unknown = True
+					return None if unknown else False
+			return predicate
+		if kind == "not":
+			child = self.compile(node[1])
+			def predicate(row, memo):
+				value = child(row, memo)
+				return None if value is None else not value
+			return predicate
+		if kind == "cmp":
+			compare = SQL_OPERATORS[node[1]]
+			left, left_type = self._operand(node[2])
+			right, right_type = self._operand(node[3])
+			if left_type is None and right_type is None:
+				raise SQLCompileError("Comparison between two literals")
+			if left_type is None:
+				coerce_literal(node[2][1], right_type)
+			elif right_type is None:
+				coerce_literal(node[3][1], left_type)
+			elif (left_type in NUMERIC_FIELDS) != (right_type in NUMERIC_FIELDS):
+				raise SQLCompileError("Comparison between numeric and text fields")
+			def predicate(row, memo):
+				a = left(row)
+				b = right(row)
+				if a is None or b is None:
+					return None
+				return compare(a, b)
+			return predicate
+		if kind == "in":
+			value, field_type = self._operand(node[1])
+			values = frozenset(coerce_literal(v, field_type) if field_type else v for v in node[2] if v is not None)
+			# x IN (NULL, '') is only ever True or unknown, never False, since x = NULL is unknown
+			miss = None if None in node[2] else False
+			def predicate(row, memo):
+				a = value(row)
+				if a is None:
+					return None
+				return True if a in values else miss
+			return predicate
+		if kind == "null":
+			value, field_type = self._operand(node[1])
+			return lambda row, memo: value(row) is None
+		if kind == "like":
+			value, field_type = self._operand(node[1])
+			if field_type not in ("String", None):
+				raise SQLCompileError("LIKE on a non text field")
+			pattern = re.compile("".join(".*" if c == "%" else "." if c == "_" else re.escape(c) for c in node[2]) + r"\Z", re.S)
+			def predicate(row, memo):
+				a = value(row)
+				if a is None:
+					return None
+				return pattern.match(a) is not None
+			return predicate
+		if kind == "between":
+			value, field_type = self._operand(node[1])
+			low, low_type = self._operand(node[2])
+			high, high_type = self._operand(node[3])
+			for bound, bound_type in ((node[2], low_type), (node[3], high_type)):
+				if bound_type is None and field_type is not None:
+					coerce_literal(bound[1], field_type)
+			def predicate(row, memo):
+				a = value(row)
+				lo = low(row)
+				hi = high(row)
+				if a is None or lo is None or hi is None:
+					return None
+				return lo <= a <= hi
+			return predicate
+		raise SQLCompileError("Unsupported expression {0}".format(kind))
+
+class ReviewerWriter(object): # Writes check results into a reviewer workspace the same way the batch job records them
+	main_fields = ["OBJECTID", "SUBTYPE", "SESSIONID", "CHECKTITLE", "ORIGINTABLE", "ORIGINCHECK", "NOTES", "SEVERITY", "REVIEWSTATUS", "REVIEWTECHNICIAN", "REVIEWDATE", "REVIEWDATEUTC", "CHECKRUNID", "GEOMETRYTYPE", "LIFECYCLESTATUS", "LIFECYCLEPHASE", "ID"]
+	run_fields = ["SESSIONID", "BATCHRUNID", "CHECKRUNID", "BATCHJOBNAME", "BATCHJOBDATETIME", "BATCHJOBGROUPNAME", "CHECKNAME", "CHECKTITLE", "RESOURCENAME", "TOTALVALIDATED", "TOTALRESULTS"]
+	batch_fields = ["ID", "BATCHJOBFILE", "RUNCONTEXT", "STATUS", "STARTTIME", "ENDTIME"]
+
+	def __init__(self, reviewer_gdb, session, batch_job_name, batch_job_file=None):
+		self.reviewer_gdb = reviewer_gdb
+		self.session_id = session_id(session)
+		self.batch_job_name = batch_job_name
+		self.batch_job_file = batch_job_file or batch_job_name
+		self.check_runs = 0
+		self.batch_run_id = "{" + str(uuid.uuid4()).upper() + "}"
+		self.started = dt.now()
+		self.technician = getpass.getuser()
+		self.errors = 0
+		self.main_cursor = ap.da.InsertCursor(os.path.join(reviewer_gdb, "REVTABLEMAIN"), self.main_fields)
+		self.run_cursor = ap.da.InsertCursor(os.path.join(reviewer_gdb, "REVCHECKRUNTABLE"), self.run_fields)
+		self.geometry_cursors = {}
+
+	def geometry_cursor(self, table):
+		if table not in self.geometry_cursors:
+			self.geometry_cursors[table] = ap.da.InsertCursor(os.path.join(self.reviewer_gdb, "REVDATASET", table), ["SHAPE@", "LINKGUID", "SESSIONID"])
+		return self.geometry_cursors[table]
+
+	def new_check_run(self): # Returns a CHECKRUNID for one check's results
+		return "{" + str(uuid.uuid4()).upper() + "}"
+
+	def add_error(self, check, check_run_id, dataset, oid, subtype_name, shape_type, shape):
+		link_guid = "{" + str(uuid.uuid4()).upper() + "}"
+		now = dt.now()
+		table, geometry_type = REVIEWER_GEOMETRY.get(shape_type, (None, None))
+		if shape is None:
+			geometry_type = None
+		self.main_cursor.insertRow((oid, subtype_name, self.session_id, check.title, dataset, check.check_type, check.notes, check.severity, check.params.get("RevStatus") or check.title, self.technician, now.strftime("%m/%d/%Y %I:%M:%S %p"), dt.utcnow(), check_run_id, geometry_type, 1, 2, link_guid))
+		if shape is not None and table:
+			self.geometry_cursor(table).insertRow((shape, link_guid, self.session_id))
+		self.errors += 1
+
+	def add_check_run(self, check, check_run_id, validated, results): # Records the REVCHECKRUNTABLE row the batch job writes for each check
+		self.run_cursor.insertRow((self.session_id, self.batch_run_id, check_run_id, self.batch_job_name, self.started, check.group, check.check_type, check.title, check.dataset, validated, results))
+		self.check_runs += 1
+
+	def close(self):
+		if self.check_runs:
+			# The REVBATCHRUNTABLE row the check runs' BATCHRUNID points to
+			with ap.da.InsertCursor(os.path.join(self.reviewer_gdb, "REVBATCHRUNTABLE"), self.batch_fields) as cursor:
+				cursor.insertRow((self.batch_run_id, self.batch_job_file, BATCH_RUN_CONTEXT, BATCH_RUN_STATUS, self.started, dt.now()))
+		del self.main_cursor
+		del self.run_cursor
+		for table in list(self.geometry_cursors):
+			del self.geometry_cursors[table]
+
+def feature_subtypes(fc_path): # Returns (subtype field, {code: subtype name}) of a feature class
+	subtypes = {}
+	subtype_field = None
+	for code, info in ap.da.ListSubtypes(fc_path).items():
+		if info.get("SubtypeField"):
+			subtype_field = info["SubtypeField"].upper()
+			subtypes[code] = info["Name"]
+	return subtype_field, subtypes
+
+def oid_where_clauses(fc_path, oids, chunk=1000): # Yields "OID IN (...)" where clauses covering the OIDs, chunk at a time
+	oids = sorted(oids)
+	oid_field = ap.AddFieldDelimiters(fc_path, ap.Describe(fc_path).OIDFieldName)
+	for i in range(0, len(oids), chunk):
+		yield "{0} IN ({1})".format(oid_field, ",".join(str(oid) for oid in oids[i:i + chunk]))
+
+def fetch_shapes(fc_path, oids, chunk=1000): # Returns {oid: geometry} for the given OIDs, queried in where clause sized chunks
+	shapes = {}
+	for where in oid_where_clauses(fc_path, oids, chunk):
+		with ap.da.SearchCursor(fc_path, ["OID@", "SHAPE@"], where) as cursor:
+			for oid, shape in cursor:
+				shapes[oid] = shape
+	return shapes
+
+def subtype_bucketed(check, subtype_field): # True when a check's subtype filter is on the dataset's subtype field
+	return check.subtype is not None and bool(subtype_field) and (check.subtype_field or "").upper() == subtype_field
+
+def compile_dataset_checks(checks, field_types, subtype_field): # Returns (SQLProgram, [(check, predicate)], [unsupported checks])
+	program = SQLProgram(field_types)
+	nodes = []
+	unsupported = []
+	for check in checks:
+		try:
+			if subtype_bucketed(check, subtype_field):
+				# Rows are bucketed on their subtype before any predicate runs, so only the where clause is left to test
+				node = parse_where_clause(check.where_clause) if check.where_clause else None
+			else:
+				node = check_node(check)
+		except SQLCompileError:
+			unsupported.append(check)
+			continue
+		nodes.append((check, node))
+	missing = program.prepare([node for check, node in nodes if node is not None])
+	compiled = []
+	for check, node in nodes:
+		if node is None:
+			compiled.append((check, lambda row, memo: True))
+			continue
+		fields = set()
+		node_fields(node, fields)
+		if fields.intersection(missing):
+			unsupported.append(check)
+			continue
+		try:
+			compiled.append((check, program.compile(node)))
+		except SQLCompileError:
+			unsupported.append(check)
+	return program, compiled, unsupported
+
+def run_native_sql(rbj, production_gdb, reviewer_gdb, session, AOI="", runner=None, oids=None, rbj_file=None): # Evaluates the RBJ's SQL checks natively, returning the checks left for the batch job
+	runner = runner or run_native_dataset
+	fallback = [check for check in rbj.checks if check.check_type != SQL_CHECK]
+	fc_paths = feature_class_paths(production_gdb)
+	writer = ReviewerWriter(reviewer_gdb, session, rbj.name, rbj_file)
+	try:
+		for dataset in rbj.datasets():
+			checks = [check for check in rbj.for_dataset(dataset) if check.check_type == SQL_CHECK]
+			if not checks:
+				continue
+			fc_path = fc_paths.get(dataset.upper())
+			if not fc_path:
+				write("  .. {0} not found in the production database, skipping {1} checks".format(dataset, len(checks)))
+				continue
+			if oids is not None:
+				# Only the given features are validated, datasets without any are left alone
+				if oids.get(dataset):
+					fallback.extend(runner(writer, dataset, fc_path, checks, AOI, oids[dataset]))
+				continue
+			fallback.extend(runner(writer, dataset, fc_path, checks, AOI))
+	finally:
+		writer.close()
+	return fallback
+
+def run_native_dataset(writer, dataset, fc_path, checks, AOI="", oids=None): # One cursor pass over a feature class for all of its SQL checks, or over only the features in oids
+	ds_start = dt.now()
+	field_types = dict((f.name.upper(), f.type) for f in ap.ListFields(fc_path))
+	subtype_field, subtypes = feature_subtypes(fc_path)
+	program, compiled, unsupported = compile_dataset_checks(checks, field_types, subtype_field)
+	if not compiled:
+		return unsupported
+	# Bucket the checks by the subtype they are filtered to so a row only meets its own subtype's checks
+	unfiltered = [(check, predicate) for check, predicate in compiled if not subtype_bucketed(check, subtype_field)]
+	by_subtype = {}
+	for check, predicate in compiled:
+		if subtype_bucketed(check, subtype_field):
+			by_subtype.setdefault(check.subtype, list(unfiltered)).append((check, predicate))
+	cursor_fields = ["OID@"] + program.fields
+	subtype_index = cursor_fields.index(subtype_field) if subtype_field in cursor_fields else None
+	if subtype_field and subtype_index is None:
+		cursor_fields.append(subtype_field)
+		subtype_index = len(cursor_fields) - 1
+	source = aoi_layer(fc_path, AOI, "native_aoi_lyr")
+	matches = {} # check key -> [(oid, subtype code)]
+	validated = 0
+	try:
+		for where in (oid_where_clauses(fc_path, oids) if oids is not None else [None]):
+			with ap.da.SearchCursor(source, cursor_fields, where) as cursor:
+				for row in cursor:
+					validated += 1
+					memo = program.new_memo()
+					bucket = by_subtype.get(row[subtype_index], unfiltered) if subtype_index is not None else unfiltered
+					for check, predicate in bucket:
+						if predicate(row, memo) is True:
+							matches.setdefault(check.key, []).append((row[0], row[subtype_index] if subtype_index is not None else None))
+	finally:
+		if AOI and ap.Exists(source):
+			ap.Delete_management(source)
+	errors = write_dataset_results(writer, dataset, fc_path, [check for check, predicate in compiled], matches, validated, subtypes)
+	write("  .. {0}: {1} checks over {2} features, {3} errors in {4} ({5})".format(dataset, len(compiled), validated, errors, runtime(ds_start, dt.now()), rows_per_second(validated, ds_start, dt.now())))
+	return unsupported
+
+def write_dataset_results(writer, dataset, fc_path, checks, matches, validated, subtypes): # Writes {check key: [(oid, subtype code)]} for a dataset's checks, returns the error count
+	# Only the features that failed a check need their geometry read
+	shape_type = ap.Describe(fc_path).shapeType
+	shapes = fetch_shapes(fc_path, set(oid for found in matches.values() for oid, code in found)) if matches else {}
+	errors = 0
+	for check in checks:
+		found = matches.get(check.key, [])
+		check_run_id = writer.new_check_run()
+		for oid, code in found:
+			writer.add_error(check, check_run_id, dataset, oid, subtypes.get(code), shape_type, shapes.get(oid))
+		writer.add_check_run(check, check_run_id, validated, len(found))
+		errors += len(found)
+	return errors
+
+def aoi_layer(fc_path, AOI, name): # Returns a layer of the features intersecting the AOI, or the feature class itself without an AOI
+	if not AOI:
+		return fc_path
+	ap.MakeFeatureLayer_management(fc_path, name)
+	ap.SelectLayerByLocation_management(name, "INTERSECT", AOI)
+	return name
+
+def execute_batch_job(reviewer_gdb, session, rbj_file, production_gdb, AOI="", keys=None): # Runs the batch job, optionally on only the checks in keys
+	if keys is None:
+		ap.ExecuteReviewerBatchJob_Reviewer(reviewer_gdb, session, rbj_file, production_gdb, AOI)
+		return
+	handle, subset_rbj = tempfile.mkstemp(suffix=".rbj")
+	os.close(handle)
+	try:
+		write_rbj_subset(rbj_file, keys, subset_rbj)
+		ap.ExecuteReviewerBatchJob_Reviewer(reviewer_gdb, session, subset_rbj, production_gdb, AOI)
+	finally:
+		os.remove(subset_rbj)
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+# ========================== #
+#  Parallel Shard Execution  #
+# ========================== #
+
+# Runs the RBJ's check groups as balanced shards in worker processes, each into its own reviewer workspace copy
+
+# ArcPy aliasing
+import arcpy as ap
+from arcpy import AddMessage as write
+# STOP! Hammer time
+from datetime import datetime as dt
+# System Modules
+import os
+import shutil
+import functools
+import tempfile
+import json
+import heapq
+import traceback
+
+from rbj_common import runtime, REVIEWER_RESULT_TABLES, ShardError, result_fields, worker_pool
+from rbj_model import RBJ_CACHE_DIR, RBJModel, load_rbj
+from native_sql import run_native_sql, run_native_dataset, execute_batch_job
+from columnar import DEFAULT_CHUNK_SIZE, run_columnar_dataset
+from geo_on_geo import run_geo_checks
+
+
+SHARD_HISTORY_FILE = os.path.join(RBJ_CACHE_DIR, "shard_runtimes.json")
+
+def run_checks(engine, rbj, rbj_file, production_gdb, reviewer_gdb, session, AOI="", chunk_size=DEFAULT_CHUNK_SIZE, keys=None, oids=None): # Runs the RBJ, or only the checks in keys, with the chosen execution engine
+	if engine not in ("Native SQL", "Columnar"):
+		execute_batch_job(reviewer_gdb, session, rbj_file, production_gdb, AOI, keys)
+		return
+	if keys is not None:
+		keys = set(keys)
+		rbj = RBJModel(rbj.name, rbj.file_hash, [check for check in rbj.checks if check.key in keys])
+	# SQL checks are evaluated in one pass per dataset, the rest go through the batch job
+	runner = run_native_dataset
+	if engine == "Columnar":
+		runner = functools.partial(run_columnar_dataset, chunk_size=chunk_size)
+	# With {dataset: oids} the native engines validate exactly those features, the AOI only limits the batch job
+	fallback = run_native_sql(rbj, production_gdb, reviewer_gdb, session, AOI if oids is None else "", runner, oids, rbj_file)
+	if fallback and oids is None:
+		# Geometry on Geometry checks relate whole datasets, so they're only run natively on full runs
+		fallback = run_geo_checks(rbj, rbj_file, fallback, production_gdb, reviewer_gdb, session, AOI)
+	if fallback and oids is not None and not AOI:
+		# Without an area the batch job would revalidate everything, not just the given features
+		write("  .. Skipping {0} checks the native engine can't evaluate, none of the features to revalidate have geometry".format(len(fallback)))
+	elif fallback:
+		write("  .. Running the {0} checks the native engine can't evaluate with the batch job".format(len(fallback)))
+		execute_batch_job(reviewer_gdb, session, rbj_file, production_gdb, AOI, [check.key for check in fallback])
+
+def load_shard_history(rbj_name, history_file=SHARD_HISTORY_FILE): # Returns {group name: seconds} recorded for an RBJ on earlier parallel runs
+	try:
+		with open(history_file) as f:
+			return json.load(f).get(rbj_name, {})
+	except (IOError, OSError, ValueError):
+		return {}
+
+def save_shard_history(rbj_name, runtimes, history_file=SHARD_HISTORY_FILE): # Records {group name: seconds} for an RBJ, replacing older timings of the same groups
+	try:
+		history = {}
+		if os.path.exists(history_file):
+			with open(history_file) as f:
+				history = json.load(f)
+		history.setdefault(rbj_name, {}).update(runtimes)
+		if not os.path.exists(os.path.dirname(history_file)):
+			os.makedirs(os.path.dirname(history_file))
+		temp_file = history_file + ".{0}.tmp".format(os.getpid())
+		with open(temp_file, 'w') as f:
+			json.dump(history, f, indent=1, sort_keys=True)
+		if os.path.exists(history_file):
+			os.remove(history_file)
+		os.rename(temp_file, history_file)
+	except (IOError, OSError, ValueError):
+		pass # Timings only improve the balance, losing them shouldn't stop the run
+
+def plan_shards(rbj, workers, history=None): # Splits the checks into at most workers shards of (group, dataset, checks, weight) units with balanced total weights
+	history = history or {}
+	groups = {}
+	for check in rbj.checks:
+		groups.setdefault(check.group, []).append(check)
+	# Seconds per check of the groups with history, used to weigh the groups without it
+	known = [(history[group], len(checks)) for group, checks in groups.items() if history.get(group)]
+	per_check = sum(seconds for seconds, count in known) / float(sum(count for seconds, count in known)) if known else 1.0
+	weights = dict((group, float(history.get(group) or len(checks) * per_check)) for group, checks in groups.items())
+	target = sum(weights.values()) / workers
+	units = []
+	for group in rbj.groups:
+		checks = groups[group]
+		by_dataset = {}
+		for check in checks:
+			by_dataset.setdefault(check.dataset, []).append(check)
+		if weights[group] > target and len(by_dataset) > 1:
+			# Too heavy for one shard, split it along its datasets in proportion to their check counts
+			for dataset in sorted(by_dataset, key=str):
+				units.append((group, dataset, by_dataset[dataset], weights[group] * len(by_dataset[dataset]) / len(checks)))
+		else:
+			units.append((group, None, checks, weights[group]))
+	# Longest processing time first - the heaviest remaining unit always goes to the lightest shard
+	shards = [(0.0, i, []) for i in range(min(workers, len(units)))]
+	for unit in sorted(units, key=lambda unit: -unit[3]):
+		load, i, shard = heapq.heappop(shards)
+		shard.append(unit)
+		heapq.heappush(shards, (load + unit[3], i, shard))
+	return [shard for load, i, shard in sorted(shards, key=lambda s: s[1]) if shard]
+
+def shard_runtimes(shards, seconds): # Spreads each shard's runtime over its units by weight, returns {group name: seconds}
+	runtimes = {}
+	for units, elapsed in zip(shards, seconds):
+		total = sum(unit[3] for unit in units) or 1.0
+		for group, dataset, checks, weight in units:
+			runtimes[group] = runtimes.get(group, 0.0) + elapsed * weight / total
+	return runtimes
+
+def clear_reviewer_results(reviewer_gdb): # Empties the result tables of a reviewer workspace, keeping its sessions
+	for table in REVIEWER_RESULT_TABLES:
+		ap.TruncateTable_management(os.path.join(reviewer_gdb, table))
+
+def merge_reviewer_results(shard_gdb, reviewer_gdb): # Appends a shard's results to the reviewer workspace, returns the REVTABLEMAIN rows merged
+	# RECORDIDs are handed out again by the target, the ID/LINKGUID, CHECKRUNID and BATCHRUNID GUIDs are copied unchanged
+	merged = 0
+	for table in REVIEWER_RESULT_TABLES:
+		source = os.path.join(shard_gdb, table)
+		fields = result_fields(source)
+		with ap.da.SearchCursor(source, fields) as rows:
+			with ap.da.InsertCursor(os.path.join(reviewer_gdb, table), fields) as cursor:
+				for row in rows:
+					cursor.insertRow(row)
+					if table == "REVTABLEMAIN":
+						merged += 1
+	return merged
+
+def run_shard(job): # Worker process entry point, runs one shard's checks into its private reviewer geodatabase
+	index, engine, rbj_file, keys, production_gdb, shard_gdb, session, AOI, chunk_size = job
+	start = dt.now()
+	try:
+		ap.env.overwriteOutput = True
+		ap.CheckOutExtension('datareviewer')
+		clear_reviewer_results(shard_gdb)
+		run_checks(engine, load_rbj(rbj_file), rbj_file, production_gdb, shard_gdb, session, AOI, chunk_size, keys)
+		error = None
+	except Exception:
+		# arcpy errors don't always survive pickling back to the main process, send the traceback instead
+		error = traceback.format_exc()
+	finally:
+		ap.CheckInExtension('datareviewer')
+	return index, start, dt.now(), error
+
+def run_pool(jobs, shard_dir, engine, rbj_file, production_gdb, reviewer_gdb, session, chunk_size=DEFAULT_CHUNK_SIZE, workers=2): # Runs [(label, keys, AOI)] jobs in a pool of worker processes, returns (shard gdbs, seconds) in job order
+	shard_gdbs = []
+	for index, (label, keys, AOI) in enumerate(jobs):
+		shard_gdbs.append(os.path.join(shard_dir, "shard_{0}.gdb".format(index)))
+		ap.Copy_management(reviewer_gdb, shard_gdbs[-1])
+	seconds = [0.0] * len(jobs)
+	pool = worker_pool(min(workers, len(jobs)))
+	try:
+		tasks = [(index, engine, rbj_file, keys, production_gdb, shard_gdbs[index], session, AOI, chunk_size) for index, (label, keys, AOI) in enumerate(jobs)]
+		for index, start, finish, error in pool.imap_unordered(run_shard, tasks):
+			if error:
+				raise ShardError("{0} failed:\n{1}".format(jobs[index][0], error))
+			seconds[index] = (finish - start).total_seconds()
+			write("  .. {0} ({1} checks) finished in {2}".format(jobs[index][0], len(jobs[index][1]), runtime(start, finish)))
+	except Exception:
+		pool.terminate()
+		raise
+	else:
+		pool.close()
+	finally:
+		pool.join()
+	return shard_gdbs, seconds
+
+def run_parallel(engine, rbj, rbj_file, production_gdb, reviewer_gdb, session, AOI="", chunk_size=DEFAULT_CHUNK_SIZE, workers=2): # Runs the RBJ as balanced shards in a pool of worker processes and merges their results
+	history = load_shard_history(rbj.name)
+	shards = plan_shards(rbj, workers, history)
+	write("  .. Split into {0} shards of {1} checks ({2} timings from earlier runs)".format(len(shards), ", ".join(str(sum(len(unit[2]) for unit in units)) for units in shards), "balanced on" if history else "no"))
+	if AOI:
+		# Workers can't see layers in the ArcMap table of contents
+		AOI = ap.Describe(AOI).catalogPath
+	jobs = [("Shard {0}".format(index), [check.key for unit in units for check in unit[2]], AOI) for index, units in enumerate(shards)]
+	shard_dir = tempfile.mkdtemp(prefix="run_rbj_shards_")
+	try:
+		shard_gdbs, seconds = run_pool(jobs, shard_dir, engine, rbj_file, production_gdb, reviewer_gdb, session, chunk_size, workers)
+		# Merged in shard order so RECORDIDs follow the RBJ's group order on every run
+		merge_start = dt.now()
+		merged = sum(merge_reviewer_results(shard_gdb, reviewer_gdb) for shard_gdb in shard_gdbs)
+		write("  .. Merged {0} results from {1} shards in {2}".format(merged, len(shard_gdbs), runtime(merge_start, dt.now())))
+		save_shard_history(rbj.name, shard_runtimes(shards, seconds))
+	finally:
+		shutil.rmtree(shard_dir, ignore_errors=True)
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# ============================= #
+#  RBJ Checks common functions  #
+# ============================= #
+
+# Timing, counting, license, parameter and workspace helpers shared by every module
+
+# ArcPy aliasing
+import arcpy as ap
+from arcpy import AddMessage as write
+# System Modules
+import os
+import sys
+import io
+import csv
+import multiprocessing
+
+
+def runtime(start, finish): # Time a process or code block
+	# Add a start and finish variable markers surrounding the code to be timed
+	#from datetime import datetime as dt
+	#start/finish = dt.now()
+	# Returns string of formatted elapsed time between start and finish markers
+	time_delta = (finish - start).total_seconds()
+	h = int(time_delta/(60*60))
+	m = int((time_delta%(60*60))/60)
+	s = time_delta%60.
+	#time_elapsed = "{}:{:>02}:{:>05.4f}".format(h, m, s) # 00:00:00.0000
+	if h == 1:
+		hour_grammar = "hour"
+	else:
+		hour_grammar = "hours"
+	if m == 1:
+		minute_grammar = "minute"
+	else:
+		minute_grammar = "minutes"
+	if h and m and s:
+			time_elapsed = "{} {} {} {} and {} seconds".format(h, hour_grammar, m, minute_grammar, round(s))
+	elif not h and m and s:
+		time_elapsed = "{} {} and {:.1f} seconds".format(m, minute_grammar, s)
+	elif not h and not m and s:
+		time_elapsed = "{:.3f} seconds".format(s)
+	else:
+		time_elapsed = 0
+	return time_elapsed
+
+def rows_per_second(rows, start, finish): # Returns formatted throughput between start and finish markers
+	seconds = (finish - start).total_seconds()
+	if not seconds:
+		return "{0} rows".format(rows)
+	return "{0:,.0f} rows/sec".format(rows / seconds)
+
+def get_count(fc): # Returns feature count
+    results = int(ap.GetCount_management(fc).getOutput(0))
+    return results
+
+def check_data_reviewer(in_out): # If any of the tools that require the Data Reviewer license are selected, check out the Data Reviewer license
+	class LicenseError(Exception):
+		pass
+	try:
+		if ap.CheckExtension('datareviewer') == 'Available' and in_out == 'out':
+			write("\n~~ Checking out Data Reviwer Extension ~~\n")
+			ap.CheckOutExtension('datareviewer')
+		elif in_out == 'in':
+			write("\n~~ Checking Data Reviwer Extension back in ~~\n")
+			ap.CheckInExtension('datareviewer')
+		else:
+			raise LicenseError
+	except LicenseError:
+		ap.AddError("Data Reviwer license is unavailable")
+
+def optional_arg(argv, index, default): # Returns an optional toolbox parameter, or the default when it wasn't passed or was left blank
+	if len(argv) > index and argv[index] not in (None, "", "#"):
+		return argv[index]
+	return default
+
+def session_id(session): # "Session 1 : Session 1" -> 1
+	return int(session.split(":")[0].split()[-1])
+
+def write_csv(out_path, fields, records): # Writes the records' fields as a UTF-8 CSV with a header row
+	if bytes is str:
+		# Python 2 csv only takes byte strings
+		f = open(out_path, 'wb')
+		encode = lambda value: value.encode("utf-8") if isinstance(value, type(u"")) else value
+	else:
+		f = io.open(out_path, 'w', newline='', encoding='utf-8')
+		encode = lambda value: value
+	with f:
+		writer = csv.writer(f)
+		writer.writerow(fields)
+		for record in records:
+			writer.writerow([encode(record[field]) for field in fields])
+	return out_path
+
+_workspace_paths = None # gdb -> feature_class_paths, kept by batch manifest runs where the schemas don't change between jobs
+
+def feature_class_paths(gdb): # Returns {FEATURE CLASS NAME: path} for every feature class in a geodatabase, including those in feature datasets
+	if _workspace_paths is not None and gdb in _workspace_paths:
+		return dict(_workspace_paths[gdb])
+	paths = {}
+	for dirpath, dirnames, filenames in ap.da.Walk(gdb, datatype="FeatureClass"):
+		for filename in filenames:
+			paths[filename.split(".")[-1].upper()] = os.path.join(dirpath, filename)
+	if _workspace_paths is not None:
+		_workspace_paths[gdb] = dict(paths)
+	return paths
+
+def combine_where(*clauses): # ANDs the where clauses that aren't empty
+	clauses = [clause for clause in clauses if clause]
+	return " AND ".join("({0})".format(clause) for clause in clauses) if clauses else None
+
+# Every table a batch job or the native engines write results to, relative to the reviewer workspace
+REVIEWER_RESULT_TABLES = ("REVTABLEMAIN", "REVCHECKRUNTABLE", "REVBATCHRUNTABLE", os.path.join("REVDATASET", "REVTABLEPOINT"), os.path.join("REVDATASET", "REVTABLELINE"), os.path.join("REVDATASET", "REVTABLEPOLY"))
+
+class ShardError(Exception): # Raised in the main process when a worker's shard failed
+	pass
+
+def result_fields(table): # Fields of a reviewer table that can be copied to another workspace, geometry as SHAPE@
+	fields = [f.name for f in ap.ListFields(table) if f.editable and f.type not in ("OID", "Geometry", "GlobalID", "Raster")]
+	if hasattr(ap.Describe(table), "shapeType"):
+		fields.append("SHAPE@")
+	return fields
+
+def worker_pool(workers, initializer=None, initargs=()): # Returns a multiprocessing pool of worker processes, started with python rather than ArcMap
+	if not os.path.basename(sys.executable).lower().startswith("python"):
+		multiprocessing.set_executable(os.path.join(sys.exec_prefix, "pythonw.exe"))
+	return multiprocessing.Pool(workers, initializer, initargs)
+
+def guid_where_clauses(table, field, guids, chunk=1000): # Yields "FIELD IN ('{...}', ...)" where clauses covering the GUIDs, chunk at a time
+	guids = sorted(guids)
+	field = ap.AddFieldDelimiters(table, field)
+	for i in range(0, len(guids), chunk):
+		yield "{0} IN ({1})".format(field, ",".join("'{0}'".format(guid) for guid in guids[i:i + chunk]))
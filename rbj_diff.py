@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+# ========== #
+#  RBJ Diff  #
+# ========== #
+
+# Diffs two versions of an RBJ and reruns only the checks that changed, carrying the rest forward
+
+# ArcPy aliasing
+import arcpy as ap
+from arcpy import AddMessage as write
+# STOP! Hammer time
+from datetime import datetime as dt
+# System Modules
+import os
+import re
+import hashlib
+import json
+
+from rbj_common import runtime, session_id, write_csv
+from rbj_model import RBJ_CACHE_DIR, load_rbj, check_signature
+from columnar import DEFAULT_CHUNK_SIZE
+from tiling import run_all_checks
+from multiple_rbjs import normalized_where, session_check_runs
+from result_cache import session_results, restore_results
+
+
+DIFF_FIELDS = ("status", "key", "old_key", "check_type", "group", "title", "dataset", "changes")
+DIFF_STATUSES = ("added", "modified", "removed", "unchanged")
+
+def rbj_config_hashes(rbj_file): # {ResourceToValidateKey: hash of the check's RevCheckConfig XML}, ignoring whitespace
+	with open(rbj_file, 'rb') as f:
+		xml = f.read()
+	hashes = {}
+	for match in re.finditer(br"<RevCheckConfig\b.*?</RevCheckConfig>", xml, flags=re.S):
+		key = re.search(br"<ResourceToValidateKey>(.*?)</ResourceToValidateKey>", match.group(0)).group(1).decode("ascii")
+		# ResourceStringCache is display text the batch job editor doesn't always refresh, the resources are compared from the model
+		config = re.sub(br"<ResourceStringCache>.*?</ResourceStringCache>", b"", match.group(0), flags=re.S)
+		hashes[key] = hashlib.sha1(b" ".join(config.split())).hexdigest()
+	return hashes
+
+def check_parts(check, config_hash=None): # [(part, value)] of a check, compared between two versions of it
+	parts = [("check_type", check.check_type), ("group", check.group), ("dataset", check.dataset), ("subtype", ((check.subtype_field or "").upper(), check.subtype)),
+		("where_clause", normalized_where(check.where_clause)), ("title", check.title), ("notes", check.notes), ("severity", check.severity),
+		("secondary", tuple((name, dataset, (field or "").upper(), subtype, normalized_where(where)) for name, dataset, field, subtype, where in check.secondary))]
+	if any(value is None for value in check.params.values()):
+		# Nested configs (Composite Checks) aren't in the model, their XML stands in for the config
+		parts.append(("config", config_hash))
+	else:
+		parts.extend(("config " + name, value) for name, value in sorted(check.params.items()))
+	return parts
+
+def changed_parts(old_parts, new_parts): # Names of the parts that differ between two versions of a check
+	old_parts, new_parts = dict(old_parts), dict(new_parts)
+	return sorted(name for name in set(old_parts) | set(new_parts) if name not in old_parts or name not in new_parts or old_parts[name] != new_parts[name])
+
+def diff_rbjs(old, new, old_hashes=None, new_hashes=None): # Returns [(status, old check, new check, changed parts)], the new RBJ's checks in order, then the removed ones
+	old_hashes, new_hashes = old_hashes or {}, new_hashes or {}
+	old_parts = dict((check.key, check_parts(check, old_hashes.get(check.key))) for check in old.checks)
+	new_parts = dict((check.key, check_parts(check, new_hashes.get(check.key))) for check in new.checks)
+	old_checks = dict((check.key, check) for check in old.checks)
+	diff = [None] * len(new.checks)
+	matched = set()
+	for i, check in enumerate(new.checks):
+		if check.key in old_checks:
+			matched.add(check.key)
+			changes = changed_parts(old_parts[check.key], new_parts[check.key])
+			diff[i] = ("modified" if changes else "unchanged", old_checks[check.key], check, changes)
+	# Checks deleted and recreated get a new key, but are still the same check
+	recreated = {}
+	for check in old.checks:
+		if check.key not in matched:
+			recreated.setdefault(repr(old_parts[check.key]), []).append(check)
+	for i, check in enumerate(new.checks):
+		if diff[i] is None:
+			candidates = recreated.get(repr(new_parts[check.key]))
+			if candidates:
+				matched.add(candidates[0].key)
+				diff[i] = ("unchanged", candidates.pop(0), check, [])
+			else:
+				diff[i] = ("added", None, check, [])
+	diff.extend(("removed", check, None, []) for check in old.checks if check.key not in matched)
+	return diff
+
+def diff_records(diff): # DIFF_FIELDS records of a diff, for the diff CSV
+	records = []
+	for status, before, after, changes in diff:
+		check = after or before
+		records.append({"status": status, "key": check.key, "old_key": before.key if before is not None and before.key != check.key else "", "check_type": check.check_type,
+			"group": check.group, "title": check.title, "dataset": check.dataset, "changes": "; ".join(changes)})
+	return records
+
+def diff_rbj_files(old_file, new_file): # Loads and diffs two versions of an RBJ, returns the diff
+	old, new = load_rbj(old_file), load_rbj(new_file)
+	diff = diff_rbjs(old, new, rbj_config_hashes(old_file), rbj_config_hashes(new_file))
+	counts = dict((status, 0) for status in DIFF_STATUSES)
+	for entry in diff:
+		counts[entry[0]] += 1
+	write("\n'{0}' against '{1}': {2} added, {3} modified, {4} removed and {5} unchanged checks".format(os.path.split(new_file)[-1], os.path.split(old_file)[-1], *[counts[status] for status in DIFF_STATUSES]))
+	return diff
+
+def baseline_session(reviewer_gdb, baseline_name, session=None): # The newest session, other than the run's own, a single RBJ run of the baseline RBJ wrote into, or None
+	newest = None
+	with ap.da.SearchCursor(os.path.join(reviewer_gdb, "REVSESSIONTABLE"), ["SESSIONID", "SESSIONNAME"]) as cursor:
+		for sid, sname in cursor:
+			if session and sid == session_id(session):
+				continue # A revised RBJ keeping its file name names its sessions like the baseline's
+			# "<RBJ> <start time>" of a run, or the session incremental runs of it keep
+			if sname == "Incremental " + baseline_name or (sname.startswith(baseline_name + " ") and re.match(r"\d{4}-\d\d-\d\d \d\d:\d\d:\d\d$", sname[len(baseline_name) + 1:])):
+				if newest is None or sid > newest[0]:
+					newest = (sid, sname)
+	return None if newest is None else "Session {0} : {1}".format(*newest)
+
+def check_identity(check, config_hash=None): # Hash of the parts a diff compares, equal for a check unchanged between two versions of an RBJ
+	return hashlib.sha1(json.dumps(check_parts(check, config_hash)).encode("utf-8")).hexdigest()
+
+def check_run_ledger(reviewer_gdb, cache_dir=RBJ_CACHE_DIR): # Ledger of the checks each check run of a reviewer workspace holds the results of
+	digest = hashlib.sha1(os.path.abspath(reviewer_gdb).lower().encode("utf-8")).hexdigest()
+	return os.path.join(cache_dir, "check_runs_{0}.json".format(digest))
+
+def load_check_runs(reviewer_gdb, ledger_file=None): # Returns {CHECKRUNID: identities of the checks whose results it holds} recorded for a reviewer workspace
+	try:
+		with open(ledger_file or check_run_ledger(reviewer_gdb)) as f:
+			return json.load(f)
+	except (IOError, OSError, ValueError):
+		return {}
+
+def record_check_runs(rbj, rbj_file, reviewer_gdb, session, before=()): # Records which of the RBJ's checks each check run the session got since before holds the results of
+	hashes = rbj_config_hashes(rbj_file)
+	checks = {} # signature -> identities of the checks with it
+	for check in rbj.checks:
+		checks.setdefault(check_signature(check.group, check.check_type, check.title, check.dataset), set()).add(check_identity(check, hashes.get(check.key)))
+	ledger_file = check_run_ledger(reviewer_gdb)
+	ledger = load_check_runs(reviewer_gdb, ledger_file)
+	existing = set()
+	with ap.da.SearchCursor(os.path.join(reviewer_gdb, "REVCHECKRUNTABLE"), ["SESSIONID", "CHECKRUNID", "BATCHJOBGROUPNAME", "CHECKNAME", "CHECKTITLE", "RESOURCENAME"]) as cursor:
+		for sid, run_id, group, check_type, title, resource in cursor:
+			existing.add(run_id)
+			identities = checks.get(check_signature(group, check_type, title, resource))
+			if sid == session_id(session) and run_id not in before and identities:
+				# The batch job doesn't say which check a run is of, a run of checks sharing a signature is recorded as holding all of them
+				ledger[run_id] = sorted(identities)
+	ledger = dict((run_id, identities) for run_id, identities in ledger.items() if run_id in existing)
+	try:
+		if not os.path.exists(os.path.dirname(ledger_file)):
+			os.makedirs(os.path.dirname(ledger_file))
+		temp_file = ledger_file + ".{0}.tmp".format(os.getpid())
+		with open(temp_file, 'w') as f:
+			json.dump(ledger, f)
+		if os.path.exists(ledger_file):
+			os.remove(ledger_file)
+		os.rename(temp_file, ledger_file)
+	except (IOError, OSError):
+		write("  .. Couldn't save the check run ledger, a run revalidating against this one will validate everything")
+
+def carry_forward_results(reviewer_gdb, source, session, run_ids): # Copies the results of the source session's check runs in run_ids into the session, returns the errors copied
+	return restore_results({"tables": session_results(reviewer_gdb, source, lambda row: row["CHECKRUNID"] in run_ids)}, reviewer_gdb, session)
+
+def run_revalidation(engine, rbj, rbj_file, diff, baseline_name, production_gdb, reviewer_gdb, session, AOI="", chunk_size=DEFAULT_CHUNK_SIZE, workers=1, tile_limit=0): # Validates the checks added or modified since the baseline RBJ, carrying the rest forward from its newest session
+	source = baseline_session(reviewer_gdb, baseline_name, session)
+	if source is None:
+		write("  .. No session of '{0}' in the reviewer workspace to carry results forward from, validating everything".format(baseline_name))
+		run_all_checks(engine, rbj, rbj_file, production_gdb, reviewer_gdb, session, AOI, chunk_size, workers, tile_limit)
+		return
+	hashes = rbj_config_hashes(rbj_file)
+	unchanged = dict((after.key, check_identity(after, hashes.get(after.key))) for status, before, after, changes in diff if status == "unchanged")
+	# Only check runs the ledger holds nothing but unchanged checks in are carried, the checks without one are validated again
+	ledger = load_check_runs(reviewer_gdb)
+	carried = set(run_id for run_id in session_check_runs(reviewer_gdb, source) if ledger.get(run_id) and set(ledger[run_id]).issubset(unchanged.values()))
+	covered = set(identity for run_id in carried for identity in ledger[run_id])
+	rerun = set(after.key for status, before, after, changes in diff if status in ("added", "modified"))
+	rerun.update(key for key, identity in unchanged.items() if identity not in covered)
+	carry_start = dt.now()
+	errors = carry_forward_results(reviewer_gdb, source, session, carried)
+	write("  .. Carried {0} errors of {1} unchanged checks forward from '{2}' in {3}".format(errors, len(unchanged) - len(rerun.intersection(unchanged)), source, runtime(carry_start, dt.now())))
+	if rerun:
+		write("  .. Validating {0} added, modified and uncarried checks".format(len(rerun)))
+		run_all_checks(engine, rbj, rbj_file, production_gdb, reviewer_gdb, session, AOI, chunk_size, workers, tile_limit, rerun)
+
+def diff_main(args): # Command line entry point for RBJ diffs, returns the exit code
+	import argparse
+	parser = argparse.ArgumentParser(prog="run_rbj.py", description="Lists the checks added, removed and modified between two versions of an RBJ")
+	parser.add_argument("--diff", nargs=2, required=True, metavar=("OLD_RBJ", "NEW_RBJ"))
+	parser.add_argument("--out", help="CSV of every check's status to write")
+	parser.add_argument("--all", action="store_true", help="List the unchanged checks too")
+	options = parser.parse_args(args)
+	diff = diff_rbj_files(*options.diff)
+	for status, before, after, changes in diff:
+		check = after or before
+		if status != "unchanged" or options.all:
+			write(u"  {0:<9} [{1}] {2} ({3}){4}".format(status, check.group, check.title, check.dataset, ": " + ", ".join(changes) if changes else ""))
+	if options.out:
+		write("Diff written to {0}".format(write_csv(options.out, DIFF_FIELDS, diff_records(diff))))
+	return 0
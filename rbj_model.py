@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+# ================= #
+#  RBJ Check Model  #
+# ================= #
+
+# Streams RBJs into a check model indexed by dataset and check type, cached on disk by file hash
+
+# System Modules
+import os
+import re
+import hashlib
+import tempfile
+try:
+	import cPickle as pickle
+except ImportError:
+	import pickle
+try:
+	from xml.etree import cElementTree as ET
+except ImportError:
+	from xml.etree import ElementTree as ET
+
+
+RBJ_CACHE_VERSION = 1
+RBJ_CACHE_DIR = os.path.join(tempfile.gettempdir(), "run_rbj_cache")
+XSI_TYPE = "{http://www.w3.org/2001/XMLSchema-instance}type"
+# Check config properties that are promoted to RBJCheck attributes instead of params
+CHECK_PROPERTIES = ("Reviewer Check GUID", "Reviewer Check Name", "Reviewer Check Notes", "Reviewer Check Severity", "Reviewer Check Title", "Check Configuration Version")
+
+class RBJCheck(object): # A single RevCheckConfig from an RBJ
+	__slots__ = ("key", "guid", "check_type", "title", "notes", "severity", "group", "dataset", "subtype_field", "subtype", "where_clause", "secondary", "params", "index")
+
+	def __init__(self, key, guid, check_type, title, notes, severity, group, index):
+		self.key = key                # ResourceToValidateKey - unique per check in the RBJ
+		self.guid = guid              # Reviewer Check GUID - identifies the Data Reviewer check type
+		self.check_type = check_type  # Reviewer Check Name, ie "Execute SQL Check"
+		self.title = title
+		self.notes = notes
+		self.severity = severity
+		self.group = group            # BatchJobGroup name
+		self.dataset = None           # Unqualified feature class name, ie "UtilityInfrastructureCrv"
+		self.subtype_field = None     # Subtype field of the subtype filter, ie "FCSubtype"
+		self.subtype = None           # Subtype code of the subtype filter, ie 100179
+		self.where_clause = None      # Where clause of the SQL query filter
+		self.secondary = ()           # ((parameter name, dataset, subtype field, subtype, where clause), ...)
+		self.params = {}              # Remaining check specific config properties
+		self.index = index            # Position of the check in the RBJ
+
+	def __repr__(self):
+		return "<RBJCheck {0} '{1}' on {2}>".format(self.check_type, self.title, self.dataset)
+
+class RBJModel(object): # Parsed RBJ with its checks indexed by dataset and check type
+	__slots__ = ("name", "file_hash", "checks", "groups", "by_dataset", "by_type")
+
+	def __init__(self, name, file_hash, checks):
+		self.name = name
+		self.file_hash = file_hash
+		self.checks = checks
+		self.groups = []
+		self.by_dataset = {}
+		self.by_type = {}
+		for check in checks:
+			if check.group not in self.groups:
+				self.groups.append(check.group)
+			self.by_dataset.setdefault(check.dataset, []).append(check)
+			self.by_type.setdefault(check.check_type, []).append(check)
+
+	def __len__(self):
+		return len(self.checks)
+
+	def datasets(self): # Sorted names of every dataset the RBJ validates
+		return sorted(ds for ds in self.by_dataset if ds)
+
+	def for_dataset(self, dataset): # Checks whose primary resource is the dataset
+		return self.by_dataset.get(dataset, [])
+
+	def of_type(self, check_type): # Checks of a Data Reviewer check type, ie "Execute SQL Check"
+		return self.by_type.get(check_type, [])
+
+def file_hash(path): # Returns the SHA-1 hex digest of a file, read in 1 MB blocks
+	sha = hashlib.sha1()
+	with open(path, 'rb') as f:
+		block = f.read(1048576)
+		while block:
+			sha.update(block)
+			block = f.read(1048576)
+	return sha.hexdigest()
+
+def base_dataset_name(resource_name): # "e08b_wk.janus_tds.AeronauticCrv DATABASE=..., Type: 2" -> "AeronauticCrv"
+	if not resource_name:
+		return None
+	return resource_name.strip().split(" ")[0].split(".")[-1]
+
+def property_value(value): # Converts a PropertySetProperty <Value> to a Python value based on its xsi:type
+	xtype = value.get(XSI_TYPE, "")
+	text = value.text
+	if xtype == "xs:int":
+		return int(text)
+	if xtype == "xs:double":
+		return float(text)
+	if xtype == "xs:boolean":
+		return text == "true"
+	if len(value):
+		return None # Nested property sets (Composite Check configs) aren't modelled
+	return text if text is not None else ""
+
+def parse_filter_set(value): # Returns (subtype field, subtype code, where clause) of a RevResourceFilterSet
+	subtype_field = subtype = where_clause = None
+	for rfilter in value.iter("Filter"):
+		ftype = rfilter.get(XSI_TYPE)
+		if ftype == "esri:RevSQLQueryFilter":
+			where_clause = (rfilter.findtext("InternalQuery/WhereClause") or "").strip() or None
+		elif ftype == "esri:RevSubtypeFilter":
+			subtype = int(rfilter.findtext("SubtypeCode"))
+			subtype_field = (rfilter.findtext("SubtypeWhereClause") or "").split("=")[0].strip() or None
+	return subtype_field, subtype, where_clause
+
+def parse_check_config(config, group, index): # Returns an RBJCheck and its resource keys from a <RevCheckConfig>
+	props = {}
+	for prop in config.iterfind("ConfigProperties/PropertyArray/PropertySetProperty"):
+		props[prop.findtext("Key")] = property_value(prop.find("Value"))
+	check = RBJCheck(
+		config.findtext("Resources/ResourceToValidateKey"),
+		props.get("Reviewer Check GUID"),
+		props.get("Reviewer Check Name") or config.findtext("CheckNameStringCache"),
+		props.get("Reviewer Check Title") or "",
+		props.get("Reviewer Check Notes") or "",
+		props.get("Reviewer Check Severity"),
+		group,
+		index)
+	check.params = dict((k, v) for k, v in props.items() if k not in CHECK_PROPERTIES)
+	secondary_keys = [(prop.findtext("Key"), prop.findtext("Value")) for prop in config.iterfind("Resources/SecondaryResourceKeys/PropertyArray/PropertySetProperty")]
+	return check, secondary_keys
+
+def parse_rbj(rbj_file): # Streams an RBJ into a list of RBJChecks without holding the XML tree in memory
+	filters = {}   # Resource key -> (subtype field, subtype code, where clause)
+	resources = {} # Resource key -> dataset name
+	pending = []   # (RBJCheck, secondary resource keys)
+	section = None
+	group = None
+	stack = []
+	for event, elem in ET.iterparse(rbj_file, events=("start", "end")):
+		if event == "start":
+			stack.append(elem)
+			continue
+		stack.pop()
+		tag = elem.tag
+		depth = len(stack)
+		done = False
+		# Registry sections are BatchJobs/RevBatchJob/ResourceRegistry/RegistryStorage/PropertyArray/PropertySetProperty
+		if depth >= 6 and stack[2].tag == "ResourceRegistry":
+			if tag == "Key" and depth == 6:
+				section = elem.text
+			elif tag == "PropertySetProperty" and depth == 8:
+				key = elem.findtext("Key")
+				if section == "Filters":
+					filters[key] = parse_filter_set(elem.find("Value"))
+				elif section == "KeyHash":
+					resources[key] = base_dataset_name(elem.findtext("Value"))
+				done = True
+		elif tag == "GroupName" and depth == 3:
+			group = elem.text
+		elif tag == "RevCheckConfig":
+			pending.append(parse_check_config(elem, group, len(pending)))
+			done = True
+		if done:
+			# Drop the parsed element from its parent so the tree never grows
+			stack[-1].remove(elem)
+	checks = []
+	for check, secondary_keys in pending:
+		check.dataset = resources.get(check.key)
+		check.subtype_field, check.subtype, check.where_clause = filters.get(check.key, (None, None, None))
+		check.secondary = tuple((name, resources.get(key)) + filters.get(key, (None, None, None)) for name, key in secondary_keys)
+		checks.append(check)
+	return checks
+
+_rbj_models = {} # file hash -> RBJModel, so an RBJ is only unpickled once per process
+_rbj_digests = {} # RBJ path -> (modified time, size, file hash), so an unchanged RBJ isn't rehashed by later jobs
+
+def rbj_digest(rbj_file): # Returns the file hash of an RBJ, hashing it again only when it has changed since the last call
+	path = os.path.normcase(os.path.abspath(rbj_file))
+	stat = os.stat(path)
+	known = _rbj_digests.get(path)
+	if known and known[:2] == (stat.st_mtime, stat.st_size):
+		return known[2]
+	digest = file_hash(path)
+	_rbj_digests[path] = (stat.st_mtime, stat.st_size, digest)
+	return digest
+
+def load_rbj(rbj_file, cache_dir=RBJ_CACHE_DIR): # Returns the RBJModel for an RBJ, parsing it only when the file hash isn't cached
+	digest = rbj_digest(rbj_file)
+	if digest in _rbj_models:
+		return _rbj_models[digest]
+	cache_file = os.path.join(cache_dir, "{0}_v{1}.pkl".format(digest, RBJ_CACHE_VERSION))
+	model = None
+	if os.path.exists(cache_file):
+		try:
+			with open(cache_file, 'rb') as f:
+				model = pickle.load(f)
+		except Exception:
+			model = None # Corrupt or incompatible cache file, fall through and reparse
+	if model is None:
+		model = RBJModel(os.path.split(rbj_file)[-1], digest, parse_rbj(rbj_file))
+		try:
+			if not os.path.exists(cache_dir):
+				os.makedirs(cache_dir)
+			temp_file = cache_file + ".{0}.tmp".format(os.getpid())
+			with open(temp_file, 'wb') as f:
+				pickle.dump(model, f, 2)
+			if os.path.exists(cache_file):
+				os.remove(cache_file)
+			os.rename(temp_file, cache_file)
+		except (IOError, OSError):
+			pass # The cache is an optimisation, an unwritable temp folder shouldn't stop the run
+	model.name = os.path.split(rbj_file)[-1]
+	_rbj_models[digest] = model
+	return model
+
+def write_rbj_subset(rbj_file, keys, out_file): # Writes a copy of an RBJ keeping only the checks whose ResourceToValidateKey is in keys
+	# Filtered as text so the esri/xs prefixes inside xsi:type values survive for the batch job
+	keys = set(keys)
+	with open(rbj_file, 'rb') as f:
+		xml = f.read()
+	def keep_config(match):
+		key = re.search(br"<ResourceToValidateKey>(.*?)</ResourceToValidateKey>", match.group(0)).group(1).decode("ascii")
+		return match.group(0) if key in keys else b""
+	def keep_group(match):
+		return match.group(0) if b"<RevCheckConfig" in match.group(0) else b""
+	xml = re.sub(br"<RevCheckConfig\b.*?</RevCheckConfig>", keep_config, xml, flags=re.S)
+	xml = re.sub(br"<CheckGroup\b.*?</CheckGroup>", keep_group, xml, flags=re.S)
+	with open(out_file, 'wb') as f:
+		f.write(xml)
+	return out_file
+
+def check_signature(group, check_type, title, resource): # How a check's REVCHECKRUNTABLE rows are matched back to the check
+	return (group or "", check_type or "", title or "", (base_dataset_name(resource) or "").upper())
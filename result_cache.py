@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# ============== #
+#  Result Cache  #
+# ============== #
+
+# Restores the results of an earlier run of the same RBJs on unchanged data instead of validating again
+
+# ArcPy aliasing
+import arcpy as ap
+from arcpy import AddMessage as write
+# STOP! Hammer time
+from datetime import datetime as dt
+# System Modules
+import os
+import uuid
+import hashlib
+import json
+try:
+	import cPickle as pickle
+except ImportError:
+	import pickle
+
+from rbj_common import runtime, session_id, feature_class_paths, REVIEWER_RESULT_TABLES, result_fields, guid_where_clauses
+from rbj_model import RBJ_CACHE_DIR
+from incremental import related_datasets
+
+
+RESULT_CACHE_VERSION = 3
+RESULT_CACHE_DIR = os.path.join(RBJ_CACHE_DIR, "results")
+# GUIDs tying the result tables together, the ID of REVBATCHRUNTABLE being the BATCHRUNID of REVCHECKRUNTABLE.
+# CHECKRUNID is a String field, so they're found by name rather than by field type
+RESULT_ID_FIELDS = ("ID", "LINKGUID", "CHECKRUNID", "BATCHRUNID")
+
+def database_fingerprint(production_gdb, datasets): # Hash of the feature count, highest OID and newest edit of each dataset, and of the table files of a file geodatabase
+	digest = hashlib.sha1()
+	fc_paths = feature_class_paths(production_gdb)
+	for dataset in sorted(set(ds.upper() for ds in datasets)):
+		fc_path = fc_paths.get(dataset)
+		if not fc_path:
+			digest.update("{0}:missing;".format(dataset).encode("utf-8"))
+			continue
+		desc = ap.Describe(fc_path)
+		edited_at = getattr(desc, "editedAtFieldName", "") if getattr(desc, "editorTrackingEnabled", False) else ""
+		count, max_oid, last_edit = 0, None, None
+		with ap.da.SearchCursor(fc_path, ["OID@"] + ([edited_at] if edited_at else [])) as cursor:
+			for row in cursor:
+				count += 1
+				max_oid = row[0] if max_oid is None else max(max_oid, row[0])
+				if edited_at and row[1] is not None:
+					last_edit = row[1] if last_edit is None else max(last_edit, row[1])
+		digest.update("{0}:{1}:{2}:{3};".format(dataset, count, max_oid, last_edit).encode("utf-8"))
+	if os.path.isdir(production_gdb):
+		# Attribute edits keep the counts and OIDs, but rewrite the file geodatabase's table files
+		for name in sorted(os.listdir(production_gdb)):
+			if name.lower().endswith(".lock"):
+				continue
+			stat = os.stat(os.path.join(production_gdb, name))
+			digest.update("{0}:{1}:{2:.6f};".format(name, stat.st_size, stat.st_mtime).encode("utf-8"))
+	return digest.hexdigest()
+
+def aoi_fingerprint(AOI): # Hash of the AOI polygons and their spatial reference, empty without an AOI
+	if not AOI:
+		return ""
+	digest = hashlib.sha1(ap.Describe(AOI).spatialReference.name.encode("utf-8"))
+	with ap.da.SearchCursor(AOI, ["SHAPE@WKB"]) as cursor:
+		for row in cursor:
+			digest.update(bytes(row[0] or b""))
+	return digest.hexdigest()
+
+def result_key(rbjs, names, production_gdb, AOI=""): # Cache key of validating the RBJs on the database within the AOI
+	datasets = set()
+	for rbj in rbjs:
+		datasets.update(rbj.datasets())
+		datasets.update(related_datasets(rbj))
+	parts = [str(RESULT_CACHE_VERSION)] + ["{0}={1}".format(name, rbj.file_hash) for rbj, name in zip(rbjs, names)]
+	parts += [database_fingerprint(production_gdb, datasets), aoi_fingerprint(AOI)]
+	return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+def cache_fields(table): # Fields of a reviewer table as they're cached, geometry as SHAPE@JSON so it pickles
+	return ["SHAPE@JSON" if name == "SHAPE@" else name for name in result_fields(table)]
+
+def cache_value(value): # A cursor value as it pickles, Blob fields come back as memoryview or bytearray
+	if isinstance(value, memoryview):
+		return value.tobytes()
+	if isinstance(value, bytearray):
+		return bytes(value)
+	return value
+
+def session_results(reviewer_gdb, session, keep=None): # {table: (cache fields, rows)} of the session's results, only those of the REVCHECKRUNTABLE rows keep accepts when given
+	# REVBATCHRUNTABLE has no SESSIONID, its rows are the ones the session's check runs point to
+	tables = {}
+	where = "SESSIONID = {0}".format(session_id(session))
+	def read(table, where_clauses, accept=None): # Reads the rows accept takes, returns them as {FIELD: value} lookups
+		path = os.path.join(reviewer_gdb, table)
+		fields = cache_fields(path)
+		names = [name.upper() for name in fields]
+		rows, records = [], []
+		for clause in where_clauses:
+			with ap.da.SearchCursor(path, fields, clause) as cursor:
+				for row in cursor:
+					row = tuple(cache_value(value) for value in row)
+					record = dict(zip(names, row))
+					if accept is None or accept(record):
+						rows.append(row)
+						records.append(record)
+		tables[table] = (fields, rows)
+		return records
+	runs = read("REVCHECKRUNTABLE", [where], keep)
+	read("REVBATCHRUNTABLE", guid_where_clauses(os.path.join(reviewer_gdb, "REVBATCHRUNTABLE"), "ID", set(row["BATCHRUNID"] for row in runs if row["BATCHRUNID"])))
+	run_ids = set(row["CHECKRUNID"] for row in runs)
+	links = set(row["ID"] for row in read("REVTABLEMAIN", [where], None if keep is None else lambda row: row["CHECKRUNID"] in run_ids))
+	for table in REVIEWER_RESULT_TABLES[3:]:
+		read(table, [where], None if keep is None else lambda row: row["LINKGUID"] in links)
+	return tables
+
+def lookup_results(rbjs, names, production_gdb, AOI="", cache_dir=RESULT_CACHE_DIR): # Returns (cache key, cached entry or None)
+	start = dt.now()
+	key = result_key(rbjs, names, production_gdb, AOI)
+	entry_file = os.path.join(cache_dir, key + ".pkl")
+	entry = None
+	if os.path.exists(entry_file):
+		try:
+			with open(entry_file, 'rb') as f:
+				entry = pickle.load(f)
+		except Exception as e:
+			ap.AddWarning("Couldn't read cached results {0}, validating again: {1}".format(entry_file, e))
+		if entry is not None and entry.get("version") != RESULT_CACHE_VERSION:
+			entry = None
+	if entry is not None:
+		# Recently used entries are the last to be evicted
+		os.utime(entry_file, None)
+	write("\nFingerprinted '{0}' in {1}, {2}".format(os.path.split(production_gdb)[-1], runtime(start, dt.now()), "cached results found" if entry is not None else "no cached results"))
+	return key, entry
+
+def store_results(key, reviewer_gdb, session, owned=None, size_mb=0, cache_dir=RESULT_CACHE_DIR): # Caches the session's results under the key, then evicts the least recently used entries past size_mb
+	tables = session_results(reviewer_gdb, session)
+	if not os.path.exists(cache_dir):
+		os.makedirs(cache_dir)
+	entry_file = os.path.join(cache_dir, key + ".pkl")
+	temp_file = entry_file + ".{0}.tmp".format(os.getpid())
+	with open(temp_file, 'wb') as f:
+		pickle.dump({"version": RESULT_CACHE_VERSION, "owned": owned, "tables": tables}, f, 2)
+	if os.path.exists(entry_file):
+		os.remove(entry_file)
+	os.rename(temp_file, entry_file)
+	evicted = evict_results(size_mb, cache_dir)
+	write("  .. Cached {0} errors ({1:.1f} MB){2}".format(len(tables["REVTABLEMAIN"][1]), os.path.getsize(entry_file) / 1048576.0 if os.path.exists(entry_file) else 0, ", evicted {0} older results".format(evicted) if evicted else ""))
+
+def evict_results(size_mb, cache_dir=RESULT_CACHE_DIR): # Deletes the least recently used entries until the cache fits in size_mb, returns how many were deleted
+	entries = []
+	for name in os.listdir(cache_dir):
+		if name.endswith(".pkl"):
+			stat = os.stat(os.path.join(cache_dir, name))
+			entries.append((stat.st_mtime, stat.st_size, os.path.join(cache_dir, name)))
+	total = sum(size for mtime, size, path in entries)
+	evicted = 0
+	for mtime, size, path in sorted(entries):
+		if total <= size_mb * 1048576:
+			break
+		try:
+			os.remove(path)
+		except OSError:
+			continue # Being read by another run, it goes next time
+		total -= size
+		evicted += 1
+	return evicted
+
+def restore_results(entry, reviewer_gdb, session, guids=None): # Inserts cached results into the session with new GUIDs, filling guids with {old GUID: new GUID}, returns the REVTABLEMAIN rows restored
+	guids = {} if guids is None else guids
+	restored = 0
+	for table in REVIEWER_RESULT_TABLES:
+		fields, rows = entry["tables"][table]
+		path = os.path.join(reviewer_gdb, table)
+		# The same GUID ties REVTABLEMAIN ID to LINKGUID and the check and batch run tables together, so each maps to one new one
+		remap = [i for i, name in enumerate(fields) if name.upper() in RESULT_ID_FIELDS]
+		sessions = [i for i, name in enumerate(fields) if name.upper() == "SESSIONID"]
+		shapes = [i for i, name in enumerate(fields) if name == "SHAPE@JSON"]
+		with ap.da.InsertCursor(path, ["SHAPE@" if name == "SHAPE@JSON" else name for name in fields]) as cursor:
+			for row in rows:
+				row = list(row)
+				for i in remap:
+					if row[i]:
+						row[i] = guids.setdefault(row[i].upper(), "{" + str(uuid.uuid4()).upper() + "}")
+				for i in sessions:
+					row[i] = session_id(session)
+				for i in shapes:
+					if row[i]:
+						row[i] = ap.AsShape(json.loads(row[i]), True)
+				cursor.insertRow(row)
+				if table == "REVTABLEMAIN":
+					restored += 1
+	return restored
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# =================== #
+#  Reviewer Sessions  #
+# =================== #
+
+# Gives every run a reviewer session of its own and purges the old ones
+
+# ArcPy aliasing
+import arcpy as ap
+from arcpy import AddMessage as write
+# STOP! Hammer time
+from datetime import datetime as dt
+# System Modules
+import os
+
+from rbj_common import REVIEWER_RESULT_TABLES
+
+
+def find_session(reviewer_gdb, name): # Returns the newest session with the name as "Session <id> : <name>", or None
+	newest = None
+	with ap.da.SearchCursor(os.path.join(reviewer_gdb, "REVSESSIONTABLE"), ["SESSIONID", "SESSIONNAME"]) as cursor:
+		for sid, sname in cursor:
+			if sname == name and (newest is None or sid > newest):
+				newest = sid
+	return None if newest is None else "Session {0} : {1}".format(newest, name)
+
+def create_session(reviewer_gdb, name): # Creates a reviewer session, returns it as "Session <id> : <name>"
+	ap.CreateReviewerSession_Reviewer(reviewer_gdb, name)
+	return find_session(reviewer_gdb, name)
+
+def run_session(reviewer_gdb, rbj_name, incremental=False): # The session a run writes its results into
+	if incremental:
+		# Incremental runs revalidate into the session holding the errors they carry forward
+		name = "Incremental {0}".format(rbj_name)
+		return find_session(reviewer_gdb, name) or create_session(reviewer_gdb, name)
+	return create_session(reviewer_gdb, "{0} {1}".format(rbj_name, dt.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+def session_where(workspace, session_ids): # Where clause selecting the session IDs, as ranges of consecutive IDs so it stays short however many are selected
+	field = ap.AddFieldDelimiters(workspace, "SESSIONID")
+	ranges = []
+	for sid in sorted(set(session_ids)):
+		if ranges and sid == ranges[-1][1] + 1:
+			ranges[-1][1] = sid
+		else:
+			ranges.append([sid, sid])
+	clauses = ["{0} = {1}".format(field, low) if low == high else "({0} >= {1} AND {0} <= {2})".format(field, low, high) for low, high in ranges]
+	return " OR ".join(clauses) if clauses else "1 = 0"
+
+def purge_sessions(reviewer_gdb, keep, protect=()): # Deletes all but the newest keep sessions and their results, then compacts the workspace, returns the sessions deleted
+	session_table = os.path.join(reviewer_gdb, "REVSESSIONTABLE")
+	with ap.da.SearchCursor(session_table, ["SESSIONID"]) as cursor:
+		sessions = sorted(row[0] for row in cursor)
+	old = [sid for sid in sessions[:-keep] if sid not in protect] if keep else []
+	if not old:
+		return 0
+	where = session_where(reviewer_gdb, old)
+	deleted = 0
+	for table in REVIEWER_RESULT_TABLES + ("REVSESSIONTABLE",):
+		path = os.path.join(reviewer_gdb, table)
+		if not [f for f in ap.ListFields(path) if f.name.upper() == "SESSIONID"]:
+			continue
+		with ap.da.UpdateCursor(path, ["SESSIONID"], where) as cursor:
+			for row in cursor:
+				cursor.deleteRow()
+				if table == "REVTABLEMAIN":
+					deleted += 1
+	# Deleted rows leave their space in the file geodatabase until it's compacted
+	ap.Compact_management(reviewer_gdb)
+	write("  .. Deleted {0} old sessions holding {1} errors and compacted the reviewer workspace".format(len(old), deleted))
+	return len(old)
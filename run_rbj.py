@@ -15,6 +15,19 @@ from datetime import datetime as dt
 import os
 import sys
 import shutil
+# RBJ Checks modules
+from rbj_common import runtime, rows_per_second, get_count, check_data_reviewer, optional_arg, session_id, write_csv, feature_class_paths
+from rbj_model import load_rbj
+from columnar import DEFAULT_CHUNK_SIZE
+from tiling import run_all_checks
+from incremental import run_incremental
+from reviewer_sessions import run_session, purge_sessions
+from error_export import write_reports
+from multiple_rbjs import split_rbj_files, session_check_runs, run_rbjs, write_rbj_reports
+from result_cache import lookup_results, store_results, restore_results
+from check_profiling import run_profiled
+from check_pruning import prune_rbjs
+from rbj_diff import DIFF_FIELDS, diff_records, diff_rbj_files, record_check_runs, run_revalidation, diff_main
 
 
 
@@ -48,6 +61,47 @@ import shutil
 ## Recent Changes
   - Something that has recently been updated. A dynamic list that is preserved/reset
 	in each new version
+  - RBJ files are streamed into a compact check model (load_rbj) that is indexed by
+	dataset and check type and cached on disk by file hash
+  - "Native SQL" execution engine evaluates every Execute SQL Check for a dataset in a
+	single cursor pass and falls back to the batch job for anything it can't compile
+  - "Columnar" execution engine evaluates the same checks as NumPy masks over fixed size
+	OID chunks read with FeatureClassToNumPyArray, with rows/sec reported per dataset
+  - Parallel Workers option splits the RBJ into check group shards balanced on earlier
+	runtimes, runs them in a process pool on private reviewer gdb copies and merges them
+  - Tile Feature Limit option splits the AOI into feature density tiles that run in
+	parallel, keeping one error per feature and check where tiles overlap
+  - Incremental option fingerprints every validated feature and on later runs into the
+	same session only revalidates edits (and features near them), carrying the rest forward
+  - RBJ File takes several RBJs, runs the checks they share once and writes a frequency
+	report and error shapefiles per RBJ, reporting the check executions saved
+  - export_dr_to_shp streams the reviewer tables through cursors and hash joins them on
+	LINKGUID instead of building layers, joins and dissolves
+  - Export Chunk Size option exports the errors in RECORDID chunks with flat memory use and
+	resumes an export that died from the last finished chunk
+  - Frequency report is counted during the export's pass over the session's errors and
+	streamed into an .xlsx, with optional severity, check group and dataset breakdowns,
+	replacing Frequency_analysis and TableToExcel
+  - Every run writes into a reviewer session of its own instead of "Session 1", and the
+	Session Retention option deletes older sessions and compacts the reviewer workspace
+  - Profile Checks option runs and times the RBJ a check group or check at a time, writes a
+	JSON/CSV trace, lists the slowest checks and flags the ones slower than on earlier runs
+  - "python run_rbj.py --manifest jobs.csv" runs a manifest of jobs in one process with the
+	license checked out once and RBJs kept loaded, logging failed jobs and carrying on
+  - "python run_rbj.py --fleet" runs one RBJ over a folder of databases in a worker pool,
+	largest first, each worker on its own reviewer gdb copy, with a fleet frequency report
+  - Prune Checks option counts the features per dataset and subtype first and runs a slimmed
+	RBJ without the checks on datasets or subtypes the database has no features in
+  - Native engines evaluate Geometry on Geometry checks themselves, testing each primary
+	feature only against the secondary features a spatial grid finds near it, in parallel
+  - Result Cache Size option caches each run's results by RBJ, database fingerprint and AOI,
+	so re-runs on unchanged data skip validation and only rewrite the reports
+  - fgdb_reader.py reads reviewer workspace tables and geometry straight from the .gdbtable
+	files without arcpy, listing, counting by field or exporting them to CSV/GeoJSON
+  - Output Format option writes the errors and the frequency report into one GeoPackage,
+	with full length field names, batched inserts and R-tree spatial indexes built after loading
+  - Baseline RBJ option diffs the RBJ against an earlier version of it, validates only the checks
+	added or modified since and copies the errors of the unchanged ones from its newest session
 
 #### Update Plans
   - Option to provide name that is prepended to output files.
@@ -58,406 +112,6 @@ import shutil
 
 
 
-'''
-╔═══════════════════╗
-║ General Functions ║
-╚═══════════════════╝
-'''
-#-----------------------------------
-def runtime(start, finish): # Time a process or code block
-	# Add a start and finish variable markers surrounding the code to be timed
-	#from datetime import datetime as dt
-	#start/finish = dt.now()
-	# Returns string of formatted elapsed time between start and finish markers
-	time_delta = (finish - start).total_seconds()
-	h = int(time_delta/(60*60))
-	m = int((time_delta%(60*60))/60)
-	s = time_delta%60.
-	#time_elapsed = "{}:{:>02}:{:>05.4f}".format(h, m, s) # 00:00:00.0000
-	if h == 1:
-		hour_grammar = "hour"
-	else:
-		hour_grammar = "hours"
-	if m == 1:
-		minute_grammar = "minute"
-	else:
-		minute_grammar = "minutes"
-	if h and m and s:
-			time_elapsed = "{} {} {} {} and {} seconds".format(h, hour_grammar, m, minute_grammar, round(s))
-	elif not h and m and s:
-		time_elapsed = "{} {} and {:.1f} seconds".format(m, minute_grammar, s)
-	elif not h and not m and s:
-		time_elapsed = "{:.3f} seconds".format(s)
-	else:
-		time_elapsed = 0
-	return time_elapsed
-
-def get_count(fc): # Returns feature count
-    results = int(ap.GetCount_management(fc).getOutput(0))
-    return results
-
-def check_data_reviewer(in_out): # If any of the tools that require the Data Reviewer license are selected, check out the Data Reviewer license
-	class LicenseError(Exception):
-		pass
-	try:
-		if ap.CheckExtension('datareviewer') == 'Available' and in_out == 'out':
-			write("\n~~ Checking out Data Reviwer Extension ~~\n")
-			ap.CheckOutExtension('datareviewer')
-		elif in_out == 'in':
-			write("\n~~ Checking Data Reviwer Extension back in ~~\n")
-			ap.CheckInExtension('datareviewer')
-		else:
-			raise LicenseError
-	except LicenseError:
-		ap.AddError("Data Reviwer license is unavailable")
-
-def export_dr_to_shp(reviewer_workspace, fields, output_path):
-	# Importing license level
-	try:
-		import arcinfo
-	except:
-		arcpy.AddError("This tool requires an ArcInfo license.")
-		sys.exit("ArcInfo license not available")
-
-	session = 'Session 1'
-	field_list = fields.split(";")
-
-	# Check if shapefiles created by script exists. If so error and do not process.
-	ShapeName = 'RBJ_error.shp'
-	FileName = ShapeName[:-4] + "_Table.dbf"
-	FinalPointShape = output_path + "\\" + ShapeName[:-4] + '_pnt.shp'
-	FinalLineShape = output_path + "\\" + ShapeName[:-4] + '_crv.shp'
-	FinalPolygonShape = output_path + "\\" + ShapeName[:-4] + '_srf.shp'
-	Table = output_path + "\\" + FileName
-
-	# Create a temporary database for processing errors
-	TempWksp = "in_memory"
-	arcpy.AddMessage("Temporary in_memory workspace created")
-
-	LineShape = TempWksp + "\\RevLine"
-	PolyShape = TempWksp + "\\RevPoly"
-	LineShapeSingle = TempWksp + "\\RevLine_single"
-	LineShapeDissolve = TempWksp + "\\RevLine_dissolve"
-	PolyShapeSingle = TempWksp + "\\RevPoly_single"
-	PolyShapeDissolve = TempWksp + "\\RevPoly_dissolve"
-	temp_fc_pnt = TempWksp + "\\TempPoint"
-	temp_fc_crv = TempWksp + "\\TempLine"
-	temp_fc_srf = TempWksp + "\\TempPoly"
-
-	# Paths to tables in Reviewer workspace
-	SessionsTable = reviewer_workspace + "\\REVSESSIONTABLE"
-	REVTABLEMAIN = reviewer_workspace + "\\REVTABLEMAIN"
-	REVTABLEPOINT = reviewer_workspace + "\\REVDATASET\\REVTABLEPOINT"
-	REVTABLELINE = reviewer_workspace + "\\REVDATASET\\REVTABLELINE"
-	REVTABLEPOLY = reviewer_workspace + "\\REVDATASET\\REVTABLEPOLY"
-
-	# Check to see if output shapefile already exists. If exists do not process.
-	Exists = False
-	if arcpy.Exists(FinalPointShape):
-		arcpy.AddError("Point shapefile already exists in output workspace " + FinalPointShape)
-		Exists = True
-	if arcpy.Exists(FinalLineShape):
-		arcpy.AddError("Point shapefile already exists in output workspace " + FinalLineShape)
-		Exists = True
-	if arcpy.Exists(FinalPolygonShape):
-		arcpy.AddError("Point shapefile already exists in output workspace " + FinalPolygonShape)
-		Exists = True
-	if arcpy.Exists(Table):
-		arcpy.AddError("Table for non geometry errors already exists in output workspace " + Table)
-		Exists = True
-
-	if not Exists:
-		# Local variables:
-		TableFields = fields
-
-		RenameFields = ["ORIGINTABLE", "ORIGINCHECK", "REVIEWSTATUS", "CORRECTIONSTATUS", "VERIFICATIONSTATUS", "REVIEWTECHNICIAN", "REVIEWDATE", "CORRECTIONTECHNICIAN", "CORRECTIONDATE", "VERIFICATIONTECHNICIAN", "VERIFICATIONDATE", "LIFECYCLESTATUS", "LIFECYCLEPHASE"]
-
-		NewNames = ["ORIG_TABLE", "ORIG_CHECK", "ERROR_DESC", "COR_STATUS", "VER_STATUS", "REV_TECH", "REV_DATE", "COR_TECH", "COR_DATE", "VER_TECH", "VER_DATE", "STATUS", "PHASE"]
-
-		PointFieldInfo = "REVTABLEPOINT.SHAPE SHAPE VISIBLE NONE; " + "REVTABLEPOINT.OID REVTABLEPOINT.OID HIDDEN NONE; " + "REVTABLEPOINT.LINKGUID REVTABLEPOINT.LINKGUID HIDDEN NONE; " + "REVTABLEPOINT.SESSIONID SESSIONID HIDDEN NONE; "
-		LineFieldInfo = "REVTABLELINE.SHAPE SHAPE VISIBLE NONE; " + "REVTABLELINE.OID REVTABLELINE.OID HIDDEN NONE; " + "REVTABLELINE.LINKGUID REVTABLELINE.LINKGUID HIDDEN NONE; " + "REVTABLELINE.SESSIONID SESSIONID HIDDEN NONE; "
-		PolyFieldInfo = "REVTABLEPOly.SHAPE SHAPE VISIBLE NONE; " + "REVTABLEPOly.OID REVTABLEPOly.OID HIDDEN NONE; " + "REVTABLEPOly.LINKGUID REVTABLEPOly.LINKGUID HIDDEN NONE; " + "REVTABLEPOly.SESSIONID SESSIONID HIDDEN NONE; "
-		TableFieldInfo = "; "
-
-		try:
-			sessionIDs = []
-			WhereClause = ""
-			TotalErrors = 0
-
-			# -------------------------------------------------------
-			# Determine what fields will be in output shapefile\table
-			# -------------------------------------------------------
-
-			# Get RevTableMain and RevTablePoint fully qualified names
-			arcpy.env.workspace = reviewer_workspace
-			RevMainFullName = "REVTABLEMAIN."
-			RevPointFullName = "REVTABLEPOINT."
-			RevLineFullName = "REVTABLELINE."
-			RevPolyFullName = "REVTABLEPOLY."
-
-			PointFieldInfo = "SHAPE SHAPE VISIBLE NONE; " + RevPointFullName + "OBJECTID OID HIDDEN NONE; TempPoint.LINKGUID TempPoint.LINKGUID HIDDEN " + "NONE; TempPoint.SESSIONID TempPoint.SESSIONID HIDDEN NONE; "
-			LineFieldInfo = "SHAPE SHAPE VISIBLE NONE; " + RevLineFullName + "OBJECTID OID HIDDEN NONE; TempLine.LINKGUID TempLine.LINKGUID HIDDEN " + "NONE; TempLine.SESSIONID TempLine.SESSIONID HIDDEN NONE; "
-			PolyFieldInfo = "SHAPE SHAPE VISIBLE NONE; " + RevPolyFullName + "OBJECTID OID HIDDEN NONE; TempPoly.LINKGUID TempPoly.LINKGUID HIDDEN " + "NONE; TempPoly.SESSIONID TempPoly.SESSIONID HIDDEN NONE; "
-			TableFieldInfo = "; "
-
-			# Get the fields in RevTableMain
-			for field in arcpy.Describe(REVTABLEMAIN).fields:
-				name = field.name
-
-				# For each field determine if it will be visible in output based on
-				# fields input value
-				view = "HIDDEN"
-				if name in field_list:
-					view = "VISIBLE"
-
-				# If the field is over 10 characters (in RenameFields array) replace with new name (from NewNames array).
-				outname = name
-				if name in RenameFields:
-					i = RenameFields.index(name)
-					outname = NewNames[i]
-
-				# Update the information of the shapefile and table outputs
-				PointFieldInfo = PointFieldInfo + RevMainFullName + name + " " + outname + " " + view + " NONE; "
-				LineFieldInfo = LineFieldInfo + RevMainFullName + name + " " + outname + " " + view + " NONE; "
-				PolyFieldInfo = PolyFieldInfo + RevMainFullName + name + " " + outname + " " + view + " NONE; "
-				TableFieldInfo = TableFieldInfo + name + " " + outname + " " + view + " NONE; "
-
-			PointFieldInfo = PointFieldInfo[:-2]
-			LineFieldInfo = LineFieldInfo[:-2]
-			PolyFieldInfo = PolyFieldInfo[:-2]
-			TableFieldInfo = TableFieldInfo[:-2]
-
-			# ---------------------------------------------------------
-			# Build the whereclause to select the input session records
-			# ---------------------------------------------------------
-
-			# Get the Session ID(s)
-			RowCount = get_count(SessionsTable)
-			with ap.da.SearchCursor(SessionsTable, ["SESSIONNAME"]) as scursor:
-				for srow in scursor:
-					if srow[0] in session:
-						sessionIDs.append(str(srow[0]))
-
-			# If you did not select all the session, make a whereclause to select only features from the desired sessions
-			if len(sessionIDs) != RowCount:
-				SessionFieldName = arcpy.AddFieldDelimiters(reviewer_workspace, "SessionID")
-				WhereClause = "({0} = {1})".format(SessionFieldName, sessionIDs[0])
-
-			# Expression parameter of make layer and create table view only allows 247 characters.
-			# If the number of sessions selected is more than 13 this limit will be reached.
-			if len(WhereClause) > 222:
-				# Return error and do not process records
-				arcpy.AddMessage(WhereClause)
-				arcpy.AddMessage("Whereclause length {0}".format(len(WhereClause)))
-				arcpy.AddError("Too many sessions were selected. The whereclause for selecting only records from the chosen session will be too long. You must select less than 12 sessions or you must select all.")
-
-			else:
-				# ----------------------
-				# Add XY to Point Errors
-				# ----------------------
-
-				# Make a point layer and join to RevTableMain to get error information
-				arcpy.AddMessage("\nProcessing Point Errors...")
-				arcpy.MakeFeatureLayer_management(REVTABLEPOINT, "TempPoint", WhereClause, "", "")
-
-				count = 0
-				count = get_count("TempPoint")
-				if count >= 1:
-					TotalErrors = TotalErrors + count
-					arcpy.AddMessage("  .. {0} point features will be processed.".format(count))
-					arcpy.AddMessage("  .. Converting reviewer point geometries.")
-
-					arcpy.FeatureClassToFeatureClass_conversion("TempPoint", TempWksp, "TempPoint")
-
-					arcpy.MakeFeatureLayer_management(temp_fc_pnt, "Final_pnt", "", "", "")
-					arcpy.AddMessage("\nJoining points to RevTableMain for error information.")
-					arcpy.AddJoin_management("Final_pnt", "LINKGUID", REVTABLEMAIN, "ID", "KEEP_COMMON")
-
-					# Make new layer with appropriate output field names
-					shape_pnt = ShapeName[:-4] + '_pnt'
-					arcpy.MakeFeatureLayer_management("Final_pnt", shape_pnt, "", "", PointFieldInfo)
-
-					# Save the layers as a shapefile
-					arcpy.AddMessage("Creating shapefiles.")
-					arcpy.FeatureClassToShapefile_conversion(shape_pnt, output_path)
-
-				else:
-					arcpy.AddMessage("  .. No point errors exist in selected session.")
-
-				# -------------------------------
-				# Add Line Errors to XY Shapefile
-				# -------------------------------
-
-				# Make Line Layer with only records from selected sessions
-				arcpy.AddMessage("\nProcessing Line Errors...")
-				arcpy.MakeFeatureLayer_management(REVTABLELINE, "TempLine", WhereClause, "", "")
-
-				count = 0
-				count = get_count("TempLine")
-				if count >= 1:
-					TotalErrors = TotalErrors + count
-					arcpy.AddMessage("  .. {0} line features will be processed.".format(count))
-					arcpy.AddMessage("  .. Converting reviewer line geometries.")
-
-					# Explode into single part features
-					arcpy.MultipartToSinglepart_management("TempLine", LineShapeSingle)
-					# Run repair geometry incase any bad geometry created.
-					arcpy.RepairGeometry_management(LineShapeSingle)
-					# Dissolve the points into a multi-part point using the LinkGUID field
-					arcpy.Dissolve_management(LineShapeSingle, LineShapeDissolve, "LINKGUID", "", "MULTI_PART", "DISSOLVE_LINES")
-
-					arcpy.FeatureClassToFeatureClass_conversion(LineShapeDissolve, TempWksp, "TempLine")
-
-					arcpy.MakeFeatureLayer_management(temp_fc_crv, "Final_crv", "", "", "")
-					arcpy.AddMessage("Joining lines to RevTableMain for error information.")
-					arcpy.AddJoin_management("Final_crv", "LINKGUID", REVTABLEMAIN, "ID", "KEEP_COMMON")
-
-					# Make new layer with appropriate output field names
-					shape_crv = ShapeName[:-4] + '_crv'
-					arcpy.MakeFeatureLayer_management("Final_crv", shape_crv, "", "", LineFieldInfo)
-
-					# Save the layers as a shapefile
-					arcpy.AddMessage("Creating shapefiles.")
-					arcpy.FeatureClassToShapefile_conversion(shape_crv, output_path)
-
-				else:
-					arcpy.AddMessage("  .. No line errors exist in selected session.")
-
-				# ----------------------------------
-				# Add Polygon Errors to XY Shapefile
-				# ----------------------------------
-
-				# Make Polygon Layer with only records from selected sessions
-				arcpy.AddMessage("\nProcessing Polygon Errors...")
-				arcpy.MakeFeatureLayer_management(REVTABLEPOLY, "TempPoly", WhereClause, "", PolyFieldInfo)
-
-				count = 0
-				count = get_count("TempPoly")
-				if count >= 1:
-					TotalErrors = TotalErrors + count
-					arcpy.AddMessage("  .. {0} polygon features will be exported to shapefile.".format(count))
-					arcpy.AddMessage("  .. Converting reviewer polygon geometries.")
-
-					# Explode into single part features
-					arcpy.MultipartToSinglepart_management("TempPoly", PolyShapeSingle)
-					# Run repair geometry incase any bad geometry created.
-					arcpy.RepairGeometry_management(PolyShapeSingle)
-					# Dissolve the points into a multi-part point using the LinkGUID field
-					arcpy.Dissolve_management(PolyShapeSingle, PolyShapeDissolve, "LINKGUID", "", "MULTI_PART", "DISSOLVE_LINES")
-
-					arcpy.FeatureClassToFeatureClass_conversion(PolyShapeDissolve, TempWksp, "TempPoly")
-
-					arcpy.MakeFeatureLayer_management(temp_fc_srf, "Final_srf", "", "", "")
-					arcpy.AddMessage("Joining polygons to RevTableMain for error information.")
-					arcpy.AddJoin_management("Final_srf", "LINKGUID", REVTABLEMAIN, "ID", "KEEP_COMMON")
-
-					# Make new layer with appropriate output field names
-					shape_srf = ShapeName[:-4] + '_srf'
-					arcpy.MakeFeatureLayer_management("Final_srf", shape_srf, "", "", PolyFieldInfo)
-
-					# Save the layers as a shapefile
-					arcpy.AddMessage("Creating shapefiles.")
-					arcpy.FeatureClassToShapefile_conversion(shape_srf, output_path)
-
-				else:
-					arcpy.AddMessage("  .. No polygon errors exist in selected session.")
-
-				# -------------------------------
-				# Process Errors with no geometry
-				# -------------------------------
-
-				arcpy.AddMessage("\nProcessing errors with no geometry...")
-				count = 0
-
-				# To find only table records, add the GeometryType field records that are null to the list
-				GeoFieldName = arcpy.AddFieldDelimiters(reviewer_workspace, "GEOMETRYTYPE")
-				if len(sessionIDs) != RowCount:
-					WhereClause = WhereClause + " AND " + GeoFieldName + " IS NULL"
-				else:
-					WhereClause = GeoFieldName + " IS NULL"
-
-				# Create a table view of records that meet query
-				arcpy.MakeTableView_management(REVTABLEMAIN, "RevTable", WhereClause, "#", TableFieldInfo)
-				count = get_count("RevTable")
-
-				# If errors with no geometry exist
-				if count >= 1:
-					TotalErrors = TotalErrors + count
-					arcpy.AddMessage("  .. {0} errors exist with no geometry and will be exported to a table.".format(count))
-
-					# Create the .dbf table of errors
-					arcpy.TableToTable_conversion("RevTable", output_path, FileName)
-
-				else:
-					arcpy.AddMessage("No errors exist with no geometry in selected session.  No table will be created.")
-
-				# Provide summary information about processing
-				arcpy.AddMessage("\nTotal Errors Exported: " + str(TotalErrors))
-				if arcpy.Exists(FinalPointShape):
-					arcpy.AddMessage("Output point shapefile path " + FinalPointShape)
-				if arcpy.Exists(FinalLineShape):
-					arcpy.AddMessage("Output line shapefile path " + FinalLineShape)
-				if arcpy.Exists(FinalPolygonShape):
-					arcpy.AddMessage("Output polygon shapefile path " + FinalPolygonShape)
-				if count >= 1:
-					arcpy.AddMessage("Output Table path " + Table)
-
-				if arcpy.Exists("RevTable"):
-					arcpy.Delete_management("RevTable")
-
-			del REVTABLEMAIN,  REVTABLEPOINT, REVTABLELINE, REVTABLEPOLY
-
-		except SystemExit:
-			# If the script fails...
-			arcpy.AddMessage("Exiting the script")
-			tb = sys.exc_info()[2]
-			arcpy.AddMessage("Failed at step 3 \n" "Line %i" % tb.tb_lineno)
-			arcpy.AddMessage(e.message)
-
-			# Delete the output shapefile and table if created (likely created incorrectly)
-			if arcpy.Exists(FinalPointShape):
-				arcpy.Delete_management(FinalPointShape)
-			if arcpy.Exists(FinalLineShape):
-				arcpy.Delete_management(FinalLineShape)
-			if arcpy.Exists(FinalPolygonShape):
-				arcpy.Delete_management(FinalPolygonShape)
-			if arcpy.Exists(Table):
-				arcpy.Delete_management(Table)
-
-		finally:
-			# Delete temporary layers\shapefiles
-			arcpy.AddMessage("Deleting temporary files.")
-			if arcpy.Exists("RevLine"):
-				arcpy.Delete_management("RevLine")
-			if arcpy.Exists("RevPoly"):
-				arcpy.Delete_management("RevPoly")
-			if arcpy.Exists("Final_pnt"):
-				arcpy.Delete_management("Final_pnt")
-			if arcpy.Exists("TempPoint"):
-				arcpy.Delete_management("TempPoint")
-			if arcpy.Exists(LineShapeSingle):
-				arcpy.Delete_management(LineShapeSingle)
-			if arcpy.Exists(LineShapeDissolve):
-				arcpy.Delete_management(LineShapeDissolve)
-			if arcpy.Exists(PolyShapeSingle):
-				arcpy.Delete_management(PolyShapeSingle)
-			if arcpy.Exists(PolyShapeDissolve):
-				arcpy.Delete_management(PolyShapeDissolve)
-			if arcpy.Exists(temp_fc_pnt):
-				arcpy.Delete_management(temp_fc_pnt)
-			if arcpy.Exists(temp_fc_crv):
-				arcpy.Delete_management(temp_fc_crv)
-			if arcpy.Exists(temp_fc_srf):
-				arcpy.Delete_management(temp_fc_srf)
-			arcpy.RefreshCatalog(output_path)
-
-	else:
-		arcpy.AddError("Please choose new output directory or delete existing files")
-
-
-#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
-
-
 '''
 ╔═══════════════╗
 ║ Main Function ║
@@ -467,55 +121,146 @@ def export_dr_to_shp(reviewer_workspace, fields, output_path):
 def main(*argv):
 	### [0] Geodatabase for RBJ checks - Workspace
 	production_gdb = argv[0]
-	### [1] RBJ File - File
-	rbj_file = argv[1]
+	### [1] RBJ File - File - Multiple values run every RBJ, sharing the checks they have in common
+	rbj_files = split_rbj_files(argv[1])
+	rbj_file = rbj_files[0]
 	### [2] RBJ Reviewer Geodatabase - Workspace
 	reviewer_gdb = argv[2]
 	### [3] - Output Folder - Folder
 	output_folder = argv[3]
 	### [4] AOI polygon of review area - Feature Class - {Optional}
 	AOI = argv[4]
+	### [5] Execution Engine - String - {Optional} - "Batch Job" (default), "Native SQL" or "Columnar"
+	engine = optional_arg(argv, 5, "Batch Job")
+	### [6] Chunk Size - Long - {Optional} - Rows per OID chunk for the Columnar engine
+	chunk_size = int(optional_arg(argv, 6, DEFAULT_CHUNK_SIZE))
+	### [7] Parallel Workers - Long - {Optional} - Worker processes for sharded execution, 1 (default) runs in this process
+	workers = int(optional_arg(argv, 7, 1))
+	### [8] Tile Feature Limit - Long - {Optional} - Splits the AOI into tiles of at most this many features, run in parallel
+	tile_limit = int(optional_arg(argv, 8, 0))
+	### [9] Incremental - Boolean - {Optional} - Only revalidate features changed since the last run into the session
+	incremental = str(optional_arg(argv, 9, "false")).lower() == "true"
+	### [10] Export Chunk Size - Long - {Optional} - Exports the errors in RECORDID chunks of this size, resuming after the last finished chunk
+	export_chunk_size = int(optional_arg(argv, 10, 0))
+	### [11] Frequency Breakdowns - Multiple Value String - {Optional} - "Severity;Check Group;Dataset" extra sheets in the frequency report
+	breakdowns = [name.strip().strip("'\"") for name in optional_arg(argv, 11, "").split(";") if name.strip()]
+	### [12] Session Retention - Long - {Optional} - Keeps the results of this many of the newest reviewer sessions, 0 (default) keeps all
+	session_retention = int(optional_arg(argv, 12, 0))
+	### [13] Profile Checks - String - {Optional} - "None" (default), "Check Group" or "Check", runs and times the RBJ at that granularity
+	profile = optional_arg(argv, 13, "None")
+	profile = profile if profile in ("Check Group", "Check") else None
+	### [14] Prune Checks - Boolean - {Optional} - Leaves out the checks of datasets and subtypes without features
+	prune = str(optional_arg(argv, 14, "false")).lower() == "true"
+	### [15] Result Cache Size MB - Long - {Optional} - Reuses the results of an earlier run of the RBJs on unchanged data, caching at most this many MB of them, 0 (default) doesn't cache
+	cache_size = int(optional_arg(argv, 15, 0))
+	### [16] Output Format - String - {Optional} - "Shapefile" (default) writes shapefiles and an .xlsx report, "GeoPackage" writes the errors and report into one RBJ_errors.gpkg
+	output_format = optional_arg(argv, 16, "Shapefile")
+	### [17] Baseline RBJ - File - {Optional} - Earlier version of the RBJ, only the checks added or modified since it are validated and the errors of the rest are copied from its newest session
+	baseline_file = optional_arg(argv, 17, "")
 	#write("AOI: {}".format(AOI))
 	#write("Type: {}".format(type(AOI)))
 	#if not AOI:
 	#	AOI = ""
-	# Reviewer Session - must exist before executing this script.
-	session =  "Session 1 : Session 1"
-	rbj_name = os.path.split(rbj_file)[-1]
+	rbj_names = []
+	for path in rbj_files:
+		# Output folders are named after the RBJs, so same named RBJs from different folders are numbered
+		name = os.path.split(path)[-1]
+		while name in rbj_names:
+			name = "{0}_{1}{2}".format(os.path.splitext(name)[0], len(rbj_names), os.path.splitext(name)[1])
+		rbj_names.append(name)
+	rbj_name = ", ".join(rbj_names)
 	gdb_name = os.path.split(production_gdb)[-1]
 
-
-	# Execute Reviewer Batch Job function
-	rbj_start = dt.now()
-	write("\nRunning '{0}' RBJ checks on\n'{1}'...".format(rbj_name, gdb_name))
-	ap.ExecuteReviewerBatchJob_Reviewer(reviewer_gdb, session, rbj_file, production_gdb, AOI)
-	rbj_finish = dt.now()
-	write("Ran RBJ checks in {0}".format(runtime(rbj_start, rbj_finish)))
-
-	# Create Frequency table of RBJ errors
-	freq_start = dt.now()
-	write("\nExporting Frequency Report as Excel file...")
-	rev_table = reviewer_gdb + '\REVTABLEMAIN'
-	freq_table = reviewer_gdb + '\REVTABLEMAIN_FREQUENCY'
-	freq_fields = ["SUBTYPE", "CHECKTITLE", "ORIGINTABLE", "REVIEWSTATUS"]
-	ap.Frequency_analysis(rev_table, freq_table, freq_fields)
-
-	# Export the Frequency table as Excel doc to the output folder
-	out_xls = output_folder + "\RBJ_error_frequency_report.xls"
-	ap.TableToExcel_conversion(freq_table, out_xls)
-	freq_finish = dt.now()
-	write("Created Frequency Report in {0}".format(runtime(freq_start, freq_finish)))
-
-	# Export RBJ errors to shapefiles in the output folder
-	shp_start = dt.now()
-	write("\nConverting Data Reviewer validation outputs to shapefiles...")
-	rev_fields = 'RECORDID;OBJECTID;SUBTYPE;CHECKTITLE;ORIGINTABLE;ORIGINCHECK;REVIEWSTATUS;REVIEWTECHNICIAN;REVIEWDATE'
-	export_dr_to_shp(reviewer_gdb, rev_fields, output_folder)
-	shp_finish = dt.now()
-	write("Exported error shapefiles in {0}".format(runtime(shp_start, shp_finish)))
+	# Load the RBJ check models (parsed once, then served from the cache)
+	rbjs = []
+	for path, name in zip(rbj_files, rbj_names):
+		load_start = dt.now()
+		rbjs.append(load_rbj(path))
+		write("\nLoaded {0} checks in {1} check groups targeting {2} datasets from '{3}' in {4}".format(len(rbjs[-1]), len(rbjs[-1].groups), len(rbjs[-1].datasets()), name, runtime(load_start, dt.now())))
+	rbj = rbjs[0]
+
+	# Result cache - an earlier run of the same RBJs on the same data and AOI stands in for validating
+	cache_key = cached = None
+	if cache_size and (incremental or profile):
+		ap.AddWarning("Incremental and profiled runs always validate, the result cache isn't used")
+	elif cache_size:
+		cache_key, cached = lookup_results(rbjs, rbj_names, production_gdb, AOI)
+
+	# Revalidation - diffed against the baseline before pruning, so pruned checks don't show up as removed
+	diff = None
+	if baseline_file and (len(rbjs) > 1 or profile):
+		ap.AddWarning("Multiple RBJ and profiled runs validate every check, the baseline RBJ isn't used")
+	elif baseline_file and cached is None:
+		diff = diff_rbj_files(baseline_file, rbj_files[0])
+		write("  .. Check differences written to {0}".format(write_csv(os.path.join(output_folder, "RBJ_diff.csv"), DIFF_FIELDS, diff_records(diff))))
+
+	# Pre-flight - leave out the checks that have no features to validate
+	if prune and incremental and len(rbjs) == 1 and not profile:
+		ap.AddWarning("Incremental runs aren't pruned, a change in the checks pruned would revalidate everything")
+	elif prune and cached is None:
+		rbjs, rbj_files = prune_rbjs(rbjs, rbj_files, production_gdb)
+		rbj, rbj_file = rbjs[0], rbj_files[0]
+
+	# Reviewer Session - a new one for every run, incremental runs keep writing into their own
+	session = run_session(reviewer_gdb, rbj_name, incremental and len(rbjs) == 1 and not profile and diff is None)
+	write("\nWriting results to reviewer session '{0}'".format(session))
+	if session_retention:
+		purge_sessions(reviewer_gdb, session_retention, [session_id(session)])
+
+	# Execute Reviewer Batch Job function, or restore the cached results
+	before = session_check_runs(reviewer_gdb, session)
+	if cached is not None:
+		restore_start = dt.now()
+		guids = {}
+		restored = restore_results(cached, reviewer_gdb, session, guids)
+		# The check runs of each RBJ got new CHECKRUNIDs with the rest
+		owned = dict((name, set(guids.get(run_id.upper(), run_id) for run_id in run_ids)) for name, run_ids in (cached["owned"] or {}).items())
+		write("\nSkipped validation, restored {0} errors of an earlier run of '{1}' on unchanged data from the result cache in {2}".format(restored, rbj_name, runtime(restore_start, dt.now())))
+	else:
+		rbj_start = dt.now()
+		write("\nRunning '{0}' RBJ checks on\n'{1}'...".format(rbj_name, gdb_name))
+		if len(rbjs) > 1:
+			if incremental or profile:
+				ap.AddWarning("Incremental and profiled runs take a single RBJ, validating everything")
+			owned = run_rbjs(engine, rbjs, rbj_files, rbj_names, production_gdb, reviewer_gdb, session, AOI, chunk_size, workers, tile_limit)
+		elif profile:
+			if incremental or workers > 1 or tile_limit:
+				ap.AddWarning("Profiled runs validate everything one {0} at a time in this process".format(profile.lower()))
+			run_profiled(engine, rbj, rbj_file, production_gdb, reviewer_gdb, session, AOI, chunk_size, profile, output_folder)
+		elif diff is not None:
+			if incremental:
+				ap.AddWarning("Revalidated runs validate every feature for the checks they run, incremental is ignored")
+			run_revalidation(engine, rbj, rbj_file, diff, os.path.split(baseline_file)[-1], production_gdb, reviewer_gdb, session, AOI, chunk_size, workers, tile_limit)
+		elif incremental:
+			run_incremental(engine, rbj, rbj_file, production_gdb, reviewer_gdb, session, AOI, chunk_size, workers, tile_limit)
+		else:
+			run_all_checks(engine, rbj, rbj_file, production_gdb, reviewer_gdb, session, AOI, chunk_size, workers, tile_limit)
+		rbj_finish = dt.now()
+		write("Ran RBJ checks in {0}".format(runtime(rbj_start, rbj_finish)))
+		if engine not in ("Native SQL", "Columnar") and not incremental:
+			# Baseline throughput to compare the native engines against
+			fc_paths = feature_class_paths(production_gdb)
+			rows = sum(get_count(fc_paths[ds.upper()]) for ds in set(ds for model in rbjs for ds in model.datasets()) if ds.upper() in fc_paths)
+			write("  .. {0} features in the RBJ's datasets ({1})".format(rows, rows_per_second(rows, rbj_start, rbj_finish)))
+		if cache_key:
+			store_results(cache_key, reviewer_gdb, session, owned if len(rbjs) > 1 else None, cache_size)
+
+	if len(rbjs) == 1:
+		# Later runs of revisions of the RBJ carry these results forward by check run
+		record_check_runs(rbj, rbj_file, reviewer_gdb, session, before)
+
+	# Frequency report and error shapefiles, one set per RBJ when there are several
+	if len(rbjs) > 1:
+		out_xls = "\n".join(write_rbj_reports(reviewer_gdb, owned, rbj_names, output_folder, export_chunk_size, breakdowns, session, output_format))
+	else:
+		out_xls = write_reports(reviewer_gdb, output_folder, export_chunk_size, breakdowns, session, output_format=output_format)
 
 	ap.AddWarning("\n\nFrequency Report is located here:\n{}\n".format(out_xls))
-	ap.AddWarning("RBJ_error shapefiles are located here:\n{}\n".format(output_folder))
+	if output_format == "GeoPackage":
+		ap.AddWarning("RBJ_error layers are in the same GeoPackage\n")
+	else:
+		ap.AddWarning("RBJ_error shapefiles are located here:\n{}\n".format(output_folder))
+	return out_xls
 
 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
@@ -523,6 +268,17 @@ def main(*argv):
 
 if __name__=='__main__':
 	ap.env.overwriteOutput = True
+	if len(sys.argv) > 1 and sys.argv[1].startswith("--manifest"):
+		# Command line batch of jobs, see Batch Manifest
+		from batch_manifest import batch_main
+		sys.exit(batch_main(sys.argv[1:]))
+	if len(sys.argv) > 1 and sys.argv[1].startswith("--fleet"):
+		# Command line run of one RBJ over many databases, see Fleet
+		from fleet import fleet_main
+		sys.exit(fleet_main(sys.argv[1:]))
+	if len(sys.argv) > 1 and sys.argv[1].startswith("--diff"):
+		# Command line diff of two RBJ versions, see RBJ Diff
+		sys.exit(diff_main(sys.argv[1:]))
 	argv = tuple(ap.GetParameterAsText(i) for i in range(ap.GetArgumentCount()))
 	check_data_reviewer('out')
 	main(*argv)
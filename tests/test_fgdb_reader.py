@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# ==================================== #
+#  fgdb_reader against the shipped gdb #
+# ==================================== #
+
+# Checks every table of the shipped reviewer geodatabase against the fields, shape type and row count Data Reviewer creates
+
+import os
+import sys
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+	sys.path.insert(0, REPO_DIR)
+
+import fgdb_reader
+
+REVIEWER_GDB = os.path.join(REPO_DIR, "RBJ_Reviewer_Geodatabase_TDSv7_1.gdb")
+
+# Table -> (shape type, row count, [(field, type)])
+REVIEWER_TABLES = {
+	"REVADMINCUSTOMFIELDS": (None, 0, [("OID", "OID"), ("CUSTOMFIELDXML", "Blob"), ("CURRENTLYINUSE", "Integer"), ("NAME", "String")]),
+	"REVADMINDESCRIPTIONS": (None, 30, [("OID", "OID"), ("DESCRIPTIONSTRING", "String"), ("DESCRIPTIONTYPE", "String"), ("DESCRIPTIONTYPECODE", "Integer"), ("DESCRIPTIONCODE", "Integer")]),
+	"REVBATCHRUNTABLE": (None, 0, [("RECORDID", "OID"), ("ID", "Guid"), ("BATCHJOBFILE", "String"), ("RUNCONTEXT", "Integer"), ("STATUS", "Integer"), ("STARTTIME", "Date"), ("ENDTIME", "Date")]),
+	"REVCHECKRUNTABLE": (None, 0, [("RECORDID", "OID"), ("SESSIONID", "Integer"), ("BATCHRUNID", "Guid"), ("CHECKRUNID", "String"), ("BATCHJOBNAME", "String"), ("BATCHJOBDATETIME", "Date"),
+		("BATCHJOBGROUPNAME", "String"), ("CHECKNAME", "String"), ("CHECKTITLE", "String"), ("CHECKRUNCONTEXT", "Integer"), ("RESOURCENAME", "String"), ("PARAMETERS", "String"),
+		("TOTALVALIDATED", "Integer"), ("TOTALRESULTS", "Integer"), ("CHECKRUNPROPERTIES", "Blob")]),
+	"REVSESSIONTABLE": (None, 1, [("SESSIONID", "OID"), ("USERNAME", "String"), ("SESSIONNAME", "String"), ("SESSIONXML", "Blob")]),
+	"REVTABLECONFIG": (None, 0, [("OID", "OID"), ("LINKGUID", "Guid"), ("REVRESOURCE", "Blob"), ("RESOURCETYPE", "String"), ("SESSIONID", "Integer")]),
+	"REVTABLEGUIPROPERTIES": (None, 1, [("OID", "OID"), ("NAME", "String"), ("PROPERTIES", "Blob")]),
+	"REVTABLELINE": ("Polyline", 0, [("SHAPE", "Geometry"), ("OID", "OID"), ("LINKGUID", "Guid"), ("SESSIONID", "Integer"), ("SHAPE_Length", "Double")]),
+	"REVTABLELOCATION": (None, 0, [("OID", "OID"), ("LINKGUID", "Guid"), ("BITMAP", "Blob"), ("SESSIONID", "Integer")]),
+	"REVTABLEMAIN": (None, 0, [("RECORDID", "OID"), ("OBJECTID", "Integer"), ("SUBTYPE", "String"), ("REVIEWERCATEGORY", "Integer"), ("CATEGORY", "String"), ("REVIEWERCODE", "Integer"),
+		("SESSIONID", "Integer"), ("CHECKTITLE", "String"), ("ORIGINTABLE", "String"), ("ORIGINCHECK", "String"), ("NOTES", "String"), ("PARAMETERS", "String"), ("SEVERITY", "Integer"),
+		("REVIEWSTATUS", "String"), ("IDENTIFIER", "String"), ("REVIEWTECHNICIAN", "String"), ("REVIEWDATE", "String"), ("CORRECTIONTECHNICIAN", "String"), ("CORRECTIONDATE", "String"),
+		("CORRECTIONSTATUS", "String"), ("VERIFICATIONTECHNICIAN", "String"), ("VERIFICATIONDATE", "String"), ("VERIFICATIONSTATUS", "String"), ("QC_GRID", "String"), ("CHECKRUNID", "String"),
+		("GEOMETRYTYPE", "Integer"), ("REVIEWDATEUTC", "Date"), ("CORRECTIONDATEUTC", "Date"), ("VERIFICATIONDATEUTC", "Date"), ("LIFECYCLESTATUS", "Integer"), ("LIFECYCLEPHASE", "Integer"), ("ID", "Guid")]),
+	"REVTABLEPOINT": ("Multipoint", 0, [("SHAPE", "Geometry"), ("OID", "OID"), ("LINKGUID", "Guid"), ("SESSIONID", "Integer")]),
+	"REVTABLEPOLY": ("Polygon", 0, [("SHAPE", "Geometry"), ("OID", "OID"), ("LINKGUID", "Guid"), ("SESSIONID", "Integer"), ("SHAPE_Length", "Double"), ("SHAPE_Area", "Double")]),
+	"REVWORKSPACEVERSION": (None, 3, [("OBJECITID", "OID"), ("MAJORVERSION", "Integer"), ("MINORVERSION", "Integer"), ("MAINTENANCEVERSION", "Integer"), ("BUILDNUMBER", "Integer"),
+		("CONTEXT", "Integer"), ("SCHEMAHASH", "String")])}
+
+class ReviewerGeodatabaseTest(unittest.TestCase):
+	def setUp(self):
+		self.gdb = fgdb_reader.FileGDB(REVIEWER_GDB)
+
+	def test_tables(self):
+		self.assertEqual(self.gdb.tables(), sorted(REVIEWER_TABLES))
+
+	def test_schemas(self):
+		for name, (shape_type, count, fields) in sorted(REVIEWER_TABLES.items()):
+			with self.gdb.table(name) as table:
+				self.assertEqual([(f.name, f.type) for f in table.fields], fields, name)
+				self.assertEqual(table.shape_type, shape_type, name)
+
+	def test_row_counts(self):
+		for name, (shape_type, count, fields) in sorted(REVIEWER_TABLES.items()):
+			with self.gdb.table(name) as table:
+				self.assertEqual(len(table), count, name)
+				self.assertEqual(len(list(table.rows())), count, name)
+
+	def test_feature_dataset_paths(self):
+		with self.gdb.table(os.path.join("REVDATASET", "REVTABLEPOINT")) as table:
+			self.assertEqual(table.shape_type, "Multipoint")
+		with self.gdb.table("REVDATASET\\REVTABLEPOLY") as table:
+			self.assertEqual(table.shape_type, "Polygon")
+
+	def test_rows(self):
+		with self.gdb.table("REVSESSIONTABLE") as table:
+			sessions = list(table.rows(["OID@", "SESSIONNAME"]))
+		self.assertEqual(len(sessions), 1)
+		self.assertEqual(sessions[0][0], 1)
+		with self.gdb.table("REVWORKSPACEVERSION") as table:
+			versions = list(table.rows(["MAJORVERSION", "MINORVERSION"]))
+		self.assertTrue(all(isinstance(value, int) for row in versions for value in row))
+		with self.gdb.table("REVADMINDESCRIPTIONS") as table:
+			descriptions = list(table.rows(["DESCRIPTIONSTRING", "DESCRIPTIONTYPE"]))
+		self.assertTrue(all(description and kind for description, kind in descriptions))
+
+	def test_missing_table(self):
+		self.assertRaises(fgdb_reader.FGDBError, self.gdb.table, "REVNOSUCHTABLE")
+
+	def test_not_a_geodatabase(self):
+		self.assertRaises(fgdb_reader.FGDBError, fgdb_reader.FileGDB, REPO_DIR)
+
+if __name__ == "__main__":
+	unittest.main()
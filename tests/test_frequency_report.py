@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# ================== #
+#  Frequency report  #
+# ================== #
+
+# Counts errors into the frequency report and its breakdowns and reads the .xlsx it streams back with zipfile
+
+import os
+import sys
+import shutil
+import zipfile
+import tempfile
+import unittest
+from xml.etree import ElementTree as ET
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "benchmarks"))
+import generate_tds
+generate_tds.use_standin()
+
+import frequency_report
+from frequency_report import xlsx_cell, XlsxWriter, FrequencyReport
+
+MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+def column_index(ref): # "AB12" -> 27
+	index = 0
+	for letter in ref.rstrip("0123456789"):
+		index = index * 26 + ord(letter) - 64
+	return index - 1
+
+def read_xlsx(path): # [(sheet name, [[cell values]])] of a workbook written by XlsxWriter, None for empty cells
+	with zipfile.ZipFile(path) as workbook:
+		names = [sheet.get("name") for sheet in ET.fromstring(workbook.read("xl/workbook.xml")).iter(MAIN + "sheet")]
+		sheets = []
+		for i, name in enumerate(names):
+			rows = []
+			for row in ET.fromstring(workbook.read("xl/worksheets/sheet{0}.xml".format(i + 1))).iter(MAIN + "row"):
+				values = []
+				for cell in row:
+					values.extend([None] * (column_index(cell.get("r")) - len(values)))
+					text = cell.find(MAIN + "is/" + MAIN + "t")
+					values.append(text.text or u"" if text is not None else float(cell.find(MAIN + "v").text))
+				rows.append(values)
+			sheets.append((name, rows))
+	return sheets
+
+class XlsxTest(unittest.TestCase):
+	def setUp(self):
+		self.folder = tempfile.mkdtemp(prefix="test_frequency_report_")
+
+	def tearDown(self):
+		shutil.rmtree(self.folder, ignore_errors=True)
+
+	def test_cell_refs(self):
+		self.assertEqual([xlsx_cell(column, 3, 1)[:12] for column in (0, 25, 26, 701, 702)], ['<c r="A3"><v', '<c r="Z3"><v', '<c r="AA3"><', '<c r="ZZ3"><', '<c r="AAA3">'])
+
+	def test_cell_values(self):
+		self.assertEqual(xlsx_cell(0, 1, None), u"")
+		self.assertEqual(xlsx_cell(0, 1, 5), u'<c r="A1"><v>5</v></c>')
+		self.assertEqual(xlsx_cell(0, 1, 2.5), u'<c r="A1"><v>2.5</v></c>')
+		# Booleans are text, markup is escaped and characters XML can't hold are dropped
+		self.assertIn(u"<t xml:space=\"preserve\">True</t>", xlsx_cell(0, 1, True))
+		self.assertIn(u"<t xml:space=\"preserve\">a &lt;b&gt; &amp; c</t>", xlsx_cell(0, 1, u"a <b> & c\x01"))
+
+	def test_workbook(self):
+		path = os.path.join(self.folder, "out.xlsx")
+		writer = XlsxWriter(path)
+		writer.add_sheet("First")
+		writer.write_row(["NAME", "COUNT"])
+		writer.write_row([u"Ünïcode", 3])
+		writer.write_row([None, 1.5])
+		writer.add_sheet('A "quoted" sheet name that is longer than Excel allows')
+		writer.write_row(["x"])
+		writer.close()
+		self.assertFalse(os.path.exists(writer.temp_dir))
+		self.assertEqual(read_xlsx(path), [("First", [["NAME", "COUNT"], [u"Ünïcode", 3.0], [None, 1.5]]), ('A "quoted" sheet name that is l', [["x"]])])
+
+class FrequencyReportTest(unittest.TestCase):
+	def setUp(self):
+		self.folder = tempfile.mkdtemp(prefix="test_frequency_report_")
+
+	def tearDown(self):
+		shutil.rmtree(self.folder, ignore_errors=True)
+
+	def test_fields(self):
+		report = FrequencyReport(None, ["Dataset", "Severity", "Unknown"])
+		self.assertEqual(report.breakdowns, ["Dataset", "Severity"])
+		# ORIGINTABLE is already counted, only SEVERITY is added to the fields read
+		self.assertEqual(report.fields, list(frequency_report.FREQUENCY_FIELDS) + ["SEVERITY"])
+
+	def test_counts_and_sheets(self):
+		report = FrequencyReport(None, ["Severity", "Dataset", "Check Group"])
+		report.groups = {"run1": "Group A", "run2": "Group B"}
+		for subtype, title, table, severity, run_id in [(1, "T1", "RoadCrv", 1, "run1"), (1, "T1", "RoadCrv", 1, "run1"), (2, "T2", "RiverCrv", 3, "run2"), (None, "T1", "RoadCrv", None, "run1")]:
+			report.add([subtype, title, table, "Unreviewed", severity, run_id])
+		out_path = report.write(os.path.join(self.folder, "report.xlsx"))
+		sheets = dict(read_xlsx(out_path))
+		self.assertEqual(sheets["Frequency"], [["FREQUENCY", "SUBTYPE", "CHECKTITLE", "ORIGINTABLE", "REVIEWSTATUS"],
+			[2.0, 1.0, "T1", "RoadCrv", "Unreviewed"], [1.0, 2.0, "T2", "RiverCrv", "Unreviewed"], [1.0, None, "T1", "RoadCrv", "Unreviewed"]])
+		# Breakdowns are sorted by count, NULLs last among equal counts
+		self.assertEqual(sheets["Severity"], [["SEVERITY", "FREQUENCY"], [1.0, 2.0], [3.0, 1.0], [None, 1.0]])
+		self.assertEqual(sheets["Dataset"], [["DATASET", "FREQUENCY"], ["RoadCrv", 3.0], ["RiverCrv", 1.0]])
+		self.assertEqual(sheets["Check Group"], [["CHECK GROUP", "FREQUENCY"], ["Group A", 3.0], ["Group B", 1.0]])
+
+	def test_merge(self):
+		report = FrequencyReport(None)
+		report.add([1, "T1", "RoadCrv", "Unreviewed"])
+		other = FrequencyReport(None, ["Dataset"])
+		other.add([1, "T1", "RoadCrv", "Unreviewed"])
+		other.add([2, "T2", "RiverCrv", "Unreviewed"])
+		report.merge(other.counts, other.breakdown_counts)
+		self.assertEqual(report.counts, {(1, "T1", "RoadCrv", "Unreviewed"): 2, (2, "T2", "RiverCrv", "Unreviewed"): 1})
+		self.assertEqual(report.breakdowns, ["Dataset"])
+		self.assertEqual(report.breakdown_counts, {"Dataset": {"RoadCrv": 1, "RiverCrv": 1}})
+
+if __name__ == "__main__":
+	unittest.main()
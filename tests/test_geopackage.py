@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# =================== #
+#  GeoPackage output  #
+# =================== #
+
+# Writes error layers and frequency tables into a GeoPackage and reads them back with sqlite3
+
+import os
+import sys
+import shutil
+import struct
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "benchmarks"))
+import generate_tds
+generate_tds.use_standin()
+
+import arcpy
+import geopackage
+from frequency_report import FrequencyReport
+
+def shape(geometry): # arcpy geometry of an Esri JSON geometry in WGS 84
+	geometry["spatialReference"] = {"wkid": 4326}
+	return arcpy.AsShape(geometry, True)
+
+class CustomReference(object): # A spatial reference without a factory code
+	name = "Custom"
+	factoryCode = 0
+
+	def exportToString(self):
+		return 'PROJCS["Custom"];0 0 1'
+
+class GeometryTest(unittest.TestCase):
+	def test_point_promoted_to_multipoint(self):
+		blob = bytes(geopackage.gpkg_geometry(shape({"x": 1.5, "y": 2.5}), 4326))
+		self.assertEqual(blob[:8], b"GP" + struct.pack("<BBi", 0, 0x03, 4326))
+		self.assertEqual(geopackage.gpkg_envelope(blob), (1.5, 1.5, 2.5, 2.5))
+		self.assertEqual(geopackage.gpkg_is_empty(blob), 0)
+		# A MultiPoint of one part wrapping the point's WKB
+		self.assertEqual(struct.unpack_from("<BII", blob, 40), (1, 4, 1))
+		self.assertEqual(blob[49:], bytes(shape({"x": 1.5, "y": 2.5}).WKB))
+
+	def test_line_envelope(self):
+		blob = bytes(geopackage.gpkg_geometry(shape({"paths": [[[0, 0], [3, 4]]]}), 4326))
+		self.assertEqual(geopackage.gpkg_envelope(blob), (0.0, 3.0, 0.0, 4.0))
+		self.assertEqual(struct.unpack_from("<BI", blob, 40), (1, 5))
+
+	def test_empty_and_null(self):
+		class Extent(object):
+			XMin = XMax = YMin = YMax = None
+		class Empty(object):
+			WKB = struct.pack("<BII", 1, 4, 0)
+			extent = Extent()
+		blob = bytes(geopackage.gpkg_geometry(Empty(), 4326))
+		self.assertEqual(geopackage.gpkg_is_empty(blob), 1)
+		self.assertIsNone(geopackage.gpkg_envelope(blob))
+		self.assertIsNone(geopackage.gpkg_geometry(None, 4326))
+		self.assertIsNone(geopackage.gpkg_is_empty(None))
+
+	def test_values(self):
+		self.assertEqual(geopackage.gpkg_value(datetime(2024, 5, 6, 7, 8, 9, 123456)), "2024-05-06T07:08:09.123Z")
+		self.assertEqual(geopackage.gpkg_value(u"text"), u"text")
+		self.assertEqual(geopackage.gpkg_column_type([1, None, 2]), "INTEGER")
+		self.assertEqual(geopackage.gpkg_column_type([1, 2.5]), "DOUBLE")
+		self.assertEqual(geopackage.gpkg_column_type([1, "a"]), "TEXT")
+		self.assertEqual(geopackage.gpkg_column_type([True]), "TEXT")
+		self.assertEqual(geopackage.gpkg_column_type([None]), "TEXT")
+
+class GeoPackageTest(unittest.TestCase):
+	def setUp(self):
+		self.folder = tempfile.mkdtemp(prefix="test_geopackage_")
+		self.path = os.path.join(self.folder, geopackage.GEOPACKAGE_NAME)
+		self.geopackage = geopackage.GeoPackage(self.path)
+
+	def tearDown(self):
+		self.geopackage.close()
+		shutil.rmtree(self.folder, ignore_errors=True)
+
+	def query(self, sql, *args):
+		return self.geopackage.connection.execute(sql, args).fetchall()
+
+	def layer(self, rows=3, table="RBJ_error_line"):
+		writer = geopackage.GeoPackageLayerWriter(self.geopackage, table, [("CHECKTITLE_LONG_NAME", "TEXT", None), ("SEVERITY", "INTEGER", None)], "POLYLINE", arcpy.SpatialReference(4326))
+		for i in range(rows):
+			writer.insert([u"Check {0}".format(i), i], shape({"paths": [[[i, i], [i + 1, i + 2]]]}))
+		writer.close()
+		return writer
+
+	def test_new_file(self):
+		self.assertEqual(self.query("PRAGMA application_id"), [(1196444487,)])
+		self.assertEqual(self.query("PRAGMA user_version"), [(10200,)])
+		self.assertEqual(self.geopackage.tables(), set())
+
+	def test_srs_ids(self):
+		self.assertEqual(self.geopackage.srs_id(None), -1)
+		self.assertEqual(self.geopackage.srs_id(arcpy.SpatialReference(4326)), 4326)
+		self.assertEqual(self.geopackage.srs_id(CustomReference()), 1000000)
+		self.assertEqual(self.geopackage.srs_id(CustomReference()), 1000000)
+		self.assertEqual(self.query("SELECT organization, organization_coordsys_id FROM gpkg_spatial_ref_sys WHERE srs_id = 1000000"), [("NONE", 1000000)])
+
+	def test_layer(self):
+		writer = self.layer()
+		self.assertEqual(writer.count, 3)
+		self.assertEqual(self.query("SELECT data_type, srs_id FROM gpkg_contents WHERE table_name = 'RBJ_error_line'"), [("features", 4326)])
+		self.assertEqual(self.query("SELECT column_name, geometry_type_name FROM gpkg_geometry_columns"), [("geom", "MULTILINESTRING")])
+		self.assertEqual(self.query('SELECT fid, "CHECKTITLE_LONG_NAME", SEVERITY FROM RBJ_error_line'), [(1, "Check 0", 0), (2, "Check 1", 1), (3, "Check 2", 2)])
+
+	def test_batches_and_truncate(self):
+		batch_rows = geopackage.GPKG_BATCH_ROWS
+		geopackage.GPKG_BATCH_ROWS = 2
+		try:
+			writer = geopackage.GeoPackageLayerWriter(self.geopackage, "RBJ_error_table", [("CHECKTITLE", "TEXT", None)])
+			for i in range(5):
+				writer.insert([u"Check {0}".format(i)])
+				if i == 2:
+					# Two full batches are inserted, the third row waits for the next
+					self.assertEqual(self.query("SELECT COUNT(*) FROM RBJ_error_table"), [(2,)])
+			writer.close()
+		finally:
+			geopackage.GPKG_BATCH_ROWS = batch_rows
+		self.assertEqual(self.query("SELECT data_type FROM gpkg_contents"), [("attributes",)])
+		resumed = geopackage.GeoPackageLayerWriter(self.geopackage, "RBJ_error_table", [("CHECKTITLE", "TEXT", None)])
+		resumed.truncate(3)
+		resumed.insert([u"Check 3 again"])
+		resumed.close()
+		self.assertEqual(self.query("SELECT fid, CHECKTITLE FROM RBJ_error_table"), [(1, "Check 0"), (2, "Check 1"), (3, "Check 2"), (4, "Check 3 again")])
+
+	def test_delete(self):
+		self.layer().delete()
+		self.assertEqual(self.geopackage.tables(), set())
+		self.assertEqual(self.query("SELECT COUNT(*) FROM gpkg_geometry_columns"), [(0,)])
+		self.assertEqual(self.query("SELECT name FROM sqlite_master WHERE name = 'RBJ_error_line'"), [])
+
+	def test_index(self):
+		self.layer()
+		self.geopackage.index()
+		self.assertEqual(self.query("SELECT min_x, min_y, max_x, max_y FROM gpkg_contents"), [(0.0, 0.0, 3.0, 4.0)])
+		if not self.query("SELECT 1 FROM gpkg_extensions WHERE extension_name = 'gpkg_rtree_index'"):
+			self.skipTest("This SQLite can't build R-tree indexes")
+		self.assertEqual(self.query("SELECT id, minx, maxx, miny, maxy FROM rtree_RBJ_error_line_geom WHERE id = 2"), [(2, 1.0, 2.0, 1.0, 3.0)])
+		# The triggers keep the index current through later edits
+		self.query('DELETE FROM RBJ_error_line WHERE fid = 1')
+		self.assertEqual([row[0] for row in self.query("SELECT id FROM rtree_RBJ_error_line_geom")], [2, 3])
+
+class FrequencyTablesTest(unittest.TestCase):
+	def test_frequency_tables(self):
+		folder = tempfile.mkdtemp(prefix="test_geopackage_")
+		try:
+			path = os.path.join(folder, geopackage.GEOPACKAGE_NAME)
+			for errors in (2, 3):
+				report = FrequencyReport(None, ["Severity", "Check Group"])
+				report.groups = {"run1": "Group A"}
+				for i in range(errors):
+					report.add([100, u"Check", "RoadCrv", "Unreviewed", i % 2 + 1, "run1"])
+				# Writing again replaces the tables
+				report.write(path, geopackage.GeoPackageTables(path))
+			connection = sqlite3.connect(path)
+			try:
+				self.assertEqual(sorted(row[0] for row in connection.execute("SELECT table_name FROM gpkg_contents WHERE data_type = 'attributes'")), ["RBJ_frequency", "RBJ_frequency_check_group", "RBJ_frequency_severity"])
+				self.assertEqual(connection.execute("SELECT FREQUENCY, SUBTYPE, CHECKTITLE FROM RBJ_frequency").fetchall(), [(3, 100, "Check")])
+				self.assertEqual(connection.execute("SELECT SEVERITY, FREQUENCY FROM RBJ_frequency_severity").fetchall(), [(1, 2), (2, 1)])
+				self.assertEqual(connection.execute("SELECT CHECK_GROUP, FREQUENCY FROM RBJ_frequency_check_group").fetchall(), [("Group A", 3)])
+				self.assertEqual([row[2] for row in connection.execute("PRAGMA table_info(RBJ_frequency)")], ["INTEGER", "INTEGER", "INTEGER", "TEXT", "TEXT", "TEXT"])
+			finally:
+				connection.close()
+		finally:
+			shutil.rmtree(folder, ignore_errors=True)
+
+if __name__ == "__main__":
+	unittest.main()
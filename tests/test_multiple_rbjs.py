@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# ==================================== #
+#  Checks shared by several RBJs       #
+# ==================================== #
+
+# Plans the checks several RBJs share, then runs two RBJs told apart by one where clause through the arcpy stand-in, each keeping the results a run of it alone gives
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "benchmarks"))
+import generate_tds
+generate_tds.use_standin()
+
+import arcpy
+import rbj_model
+import tiling
+import reviewer_sessions
+import multiple_rbjs
+
+SOURCE_RBJ = os.path.join(REPO_DIR, "RBJs", "Baby_GATE_RBJs", "RBJ_50K_simplified.rbj")
+# AeronauticSrf SQL checks, the last one's where clause is changed in the second RBJ
+KEYS = ["{361E3D59-00A7-45D4-A6F7-88F74BAAA72C}", "{FE4DA875-7723-4A72-A1E4-BB31171AA7FF}", "{A82E7B2E-A16D-4672-A59C-7C6B0F13BBEC}", "{B769399E-354A-4788-AC86-FEF7FC97CB4A}"]
+WHERE_CLAUSE = b"APT = 1 AND FPT NOT IN (1)"
+CHANGED_WHERE_CLAUSE = b"APT = 2 AND FPT NOT IN (1)"
+
+def sql_check(key, where_clause, title="Bad APT", group="Group"): # An Execute SQL Check on AeronauticSrf with its own key
+	check = rbj_model.RBJCheck(key, None, "Execute SQL Check", title, "", "High", group, 0)
+	check.dataset = "AeronauticSrf"
+	check.where_clause = where_clause
+	check.params = {"Reviewer Check Mode": 0}
+	return check
+
+class MultipleRBJTest(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls.folder = tempfile.mkdtemp(prefix="test_multiple_rbjs_")
+		cls.rbj_files = [os.path.join(cls.folder, "a.rbj"), os.path.join(cls.folder, "b.rbj")]
+		rbj_model.write_rbj_subset(SOURCE_RBJ, KEYS, cls.rbj_files[0])
+		with open(cls.rbj_files[0], 'rb') as f:
+			xml = f.read()
+		assert xml.count(WHERE_CLAUSE) == 1
+		with open(cls.rbj_files[1], 'wb') as f:
+			f.write(xml.replace(WHERE_CLAUSE, CHANGED_WHERE_CLAUSE))
+		cache_dir = os.path.join(cls.folder, "cache")
+		cls.rbjs = [rbj_model.load_rbj(path, cache_dir) for path in cls.rbj_files]
+		cls.names = ["a.rbj", "b.rbj"]
+		cls.production_gdb = os.path.join(cls.folder, "db.gdb")
+		generate_tds.generate(cls.production_gdb, generate_tds.rbj_schema(cls.rbj_files), 300, 2)
+		arcpy.BATCH_JOB = None
+
+	@classmethod
+	def tearDownClass(cls):
+		shutil.rmtree(cls.folder, ignore_errors=True)
+
+	def reviewer_gdb(self, name):
+		arcpy.CreateFileGDB_management(self.folder, name)
+		reviewer_gdb = os.path.join(self.folder, name)
+		arcpy.CreateReviewerWorkspace_Reviewer(reviewer_gdb)
+		return reviewer_gdb
+
+	def errors(self, reviewer_gdb):
+		with arcpy.da.SearchCursor(os.path.join(reviewer_gdb, "REVTABLEMAIN"), ["ORIGINTABLE", "OBJECTID", "CHECKTITLE"]) as cursor:
+			return sorted(tuple(row) for row in cursor)
+
+	def test_plan(self):
+		runs, saved = multiple_rbjs.plan_rbjs(self.rbjs, self.names)
+		self.assertEqual(saved, 3)
+		self.assertEqual([(name, sorted(owners), len(keys)) for name, owners, keys in runs], [("a.rbj", ["a.rbj", "b.rbj"], 3), ("a.rbj", ["a.rbj"], 1), ("b.rbj", ["b.rbj"], 1)])
+		changed = [check for check in self.rbjs[0].checks if check.key == KEYS[-1]][0]
+		self.assertEqual(rbj_model.check_signature(changed.group, changed.check_type, changed.title, changed.dataset),
+			rbj_model.check_signature(*[(check.group, check.check_type, check.title, check.dataset) for check in self.rbjs[1].checks if check.key == KEYS[-1]][0]))
+
+	def test_each_rbj_keeps_its_own_results(self):
+		reviewer_gdb = self.reviewer_gdb("combined.gdb")
+		session = reviewer_sessions.run_session(reviewer_gdb, ", ".join(self.names))
+		owned = multiple_rbjs.run_rbjs("Native SQL", self.rbjs, self.rbj_files, self.names, self.production_gdb, reviewer_gdb, session)
+		alone = []
+		for index, (rbj, rbj_file, name) in enumerate(zip(self.rbjs, self.rbj_files, self.names)):
+			solo_gdb = self.reviewer_gdb("solo{0}.gdb".format(index))
+			tiling.run_all_checks("Native SQL", rbj, rbj_file, self.production_gdb, solo_gdb, reviewer_sessions.run_session(solo_gdb, name))
+			kept_gdb = os.path.join(self.folder, "kept{0}.gdb".format(index))
+			arcpy.Copy_management(reviewer_gdb, kept_gdb)
+			multiple_rbjs.keep_rbj_results(kept_gdb, owned[name])
+			self.assertEqual(self.errors(kept_gdb), self.errors(solo_gdb), name)
+			alone.append(self.errors(solo_gdb))
+		# The changed where clause has to make a difference for the test to mean anything
+		self.assertNotEqual(alone[0], alone[1])
+
+class CheckPlanTest(unittest.TestCase):
+	def test_split_rbj_files(self):
+		self.assertEqual(multiple_rbjs.split_rbj_files("a.rbj;'b c.rbj'; ;\"d.rbj\""), ["a.rbj", "b c.rbj", "d.rbj"])
+
+	def test_normalized_where(self):
+		self.assertEqual(multiple_rbjs.normalized_where("((apt = 1)  AND fpt<>2)"), multiple_rbjs.normalized_where("APT = 1 AND FPT <> 2"))
+		self.assertNotEqual(multiple_rbjs.normalized_where("APT = 1"), multiple_rbjs.normalized_where("APT = 2"))
+		# Clauses the parser doesn't take are only compared with their spacing collapsed
+		self.assertEqual(multiple_rbjs.normalized_where("UPPER(A)  =  'X'"), "UPPER(A) = 'X'")
+		self.assertIsNone(multiple_rbjs.normalized_where(""))
+
+	def test_check_fingerprint(self):
+		fingerprint = multiple_rbjs.check_fingerprint(sql_check("k1", "APT = 1"), "a.rbj")
+		# The key, group and position in the RBJ don't change what a check validates
+		self.assertEqual(multiple_rbjs.check_fingerprint(sql_check("k2", "apt=1", group="Other"), "b.rbj"), fingerprint)
+		self.assertNotEqual(multiple_rbjs.check_fingerprint(sql_check("k1", "APT = 2"), "a.rbj"), fingerprint)
+		self.assertNotEqual(multiple_rbjs.check_fingerprint(sql_check("k1", "APT = 1", "Other title"), "a.rbj"), fingerprint)
+		composite = sql_check("k1", "APT = 1")
+		composite.params["Checks"] = None
+		self.assertEqual(multiple_rbjs.check_fingerprint(composite, "a.rbj"), ("a.rbj", "k1"))
+		self.assertNotEqual(multiple_rbjs.check_fingerprint(composite, "a.rbj"), multiple_rbjs.check_fingerprint(composite, "b.rbj"))
+
+	def test_fan_out(self):
+		# c.rbj only holds a check a.rbj runs, so it gets the results of a run it never started
+		rbjs = [rbj_model.RBJModel("a.rbj", "a", [sql_check("a1", "APT = 1"), sql_check("a2", "APT = 2")]),
+			rbj_model.RBJModel("b.rbj", "b", [sql_check("b1", "APT = 1"), sql_check("b2", "APT = 3")]),
+			rbj_model.RBJModel("c.rbj", "c", [sql_check("c1", "(APT = 1)")])]
+		names = [rbj.name for rbj in rbjs]
+		runs, saved = multiple_rbjs.plan_rbjs(rbjs, names)
+		self.assertEqual(saved, 2)
+		self.assertEqual([(name, sorted(owners), keys) for name, owners, keys in runs], [("a.rbj", names, ["a1"]), ("a.rbj", ["a.rbj"], ["a2"]), ("b.rbj", ["b.rbj"], ["b2"])])
+		check_runs = set()
+		def run_all_checks(engine, rbj, rbj_file, production_gdb, reviewer_gdb, session, AOI, chunk_size, workers, tile_limit, keys):
+			check_runs.update("{0}:{1}".format(rbj.name, key) for key in keys)
+		originals = multiple_rbjs.run_all_checks, multiple_rbjs.session_check_runs
+		multiple_rbjs.run_all_checks = run_all_checks
+		multiple_rbjs.session_check_runs = lambda reviewer_gdb, session: set(check_runs)
+		try:
+			owned = multiple_rbjs.run_rbjs("Native SQL", rbjs, names, names, "db.gdb", "rev.gdb", "Session 1 : run")
+		finally:
+			multiple_rbjs.run_all_checks, multiple_rbjs.session_check_runs = originals
+		self.assertEqual(owned, {"a.rbj": set(["a.rbj:a1", "a.rbj:a2"]), "b.rbj": set(["a.rbj:a1", "b.rbj:b2"]), "c.rbj": set(["a.rbj:a1"])})
+
+if __name__ == "__main__":
+	unittest.main()
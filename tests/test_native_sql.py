@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# ======================== #
+#  Native SQL where logic  #
+# ======================== #
+
+# Parses where clauses and evaluates them the way the native engine does, with SQL's three-valued NULL logic and LIKE patterns
+
+import os
+import sys
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "benchmarks"))
+import generate_tds
+generate_tds.use_standin()
+
+import rbj_model
+import native_sql
+from native_sql import SQLCompileError, SQLProgram, parse_where_clause, compile_dataset_checks
+
+FIELD_TYPES = {"APT": "Integer", "FPT": "Integer", "ZVA": "Double", "ZI005_FNA": "String", "FCSUBTYPE": "Integer"}
+
+def evaluate(where_clause, **values): # Result of a where clause on one row, True, False or None for unknown
+	program = SQLProgram(FIELD_TYPES)
+	node = parse_where_clause(where_clause)
+	program.prepare([node])
+	predicate = program.compile(node)
+	row = (1,) + tuple(values.get(field) for field in program.fields)
+	return predicate(row, program.new_memo())
+
+def sql_check(key, where_clause, subtype=None): # An Execute SQL Check on AeronauticSrf
+	check = rbj_model.RBJCheck(key, None, native_sql.SQL_CHECK, key, "", None, "Group", 0)
+	check.dataset = "AeronauticSrf"
+	check.where_clause = where_clause
+	if subtype is not None:
+		check.subtype_field, check.subtype = "FCSubtype", subtype
+	return check
+
+class ParseTest(unittest.TestCase):
+	def test_tree(self):
+		self.assertEqual(parse_where_clause("APT = 1 AND FPT NOT IN (1)"),
+			("and", (("cmp", "=", ("field", "APT"), ("lit", 1)), ("not", ("in", ("field", "FPT"), (1,))))))
+
+	def test_normalizes(self):
+		# Field names are upper cased, != is <> and IN lists are deduplicated, so equal clauses share a node
+		self.assertEqual(parse_where_clause("apt != 1"), parse_where_clause("APT <> 1"))
+		self.assertEqual(parse_where_clause("APT IN (2, 1, 2)"), parse_where_clause("APT IN (1, 2)"))
+
+	def test_null_and_quotes(self):
+		self.assertEqual(parse_where_clause("ZI005_FNA IS NOT NULL"), ("not", ("null", ("field", "ZI005_FNA"))))
+		self.assertEqual(parse_where_clause("ZI005_FNA = 'O''Hare'"), ("cmp", "=", ("field", "ZI005_FNA"), ("lit", "O'Hare")))
+		self.assertEqual(parse_where_clause("APT IN (1, NULL)"), ("in", ("field", "APT"), (1, None)))
+
+	def test_unsupported(self):
+		for where_clause in ("ZI005_FNA LIKE 'a!%' ESCAPE '!'", "APT = 1 AND", "UPPER(ZI005_FNA) = 'A'", "APT = 1)", "APT ~ 1"):
+			self.assertRaises(SQLCompileError, parse_where_clause, where_clause)
+
+class NullTest(unittest.TestCase):
+	def test_comparisons_are_unknown(self):
+		self.assertIsNone(evaluate("APT = 1"))
+		self.assertIsNone(evaluate("APT <> 1"))
+		self.assertIsNone(evaluate("NOT APT = 1"))
+		self.assertIsNone(evaluate("APT BETWEEN 1 AND 5"))
+		self.assertIsNone(evaluate("APT = FPT", APT=1))
+
+	def test_is_null(self):
+		self.assertIs(evaluate("APT IS NULL"), True)
+		self.assertIs(evaluate("APT IS NOT NULL"), False)
+		self.assertIs(evaluate("APT IS NULL", APT=0), False)
+
+	def test_and_or(self):
+		# Unknown AND False is False, unknown OR True is True, otherwise unknown stays unknown
+		self.assertIs(evaluate("APT = 1 AND FPT = 2", FPT=3), False)
+		self.assertIsNone(evaluate("APT = 1 AND FPT = 2", FPT=2))
+		self.assertIs(evaluate("APT = 1 OR FPT = 2", FPT=2), True)
+		self.assertIsNone(evaluate("APT = 1 OR FPT = 2", FPT=3))
+		self.assertIs(evaluate("APT = 1 OR APT IS NULL"), True)
+
+	def test_in_lists(self):
+		self.assertIsNone(evaluate("APT IN (1, 2)"))
+		self.assertIs(evaluate("APT IN (1, 2)", APT=2), True)
+		self.assertIs(evaluate("APT NOT IN (1, 2)", APT=3), True)
+		# A NULL in the list makes a miss unknown, so NOT IN (..., NULL) is never True
+		self.assertIs(evaluate("APT IN (1, NULL)", APT=1), True)
+		self.assertIsNone(evaluate("APT IN (1, NULL)", APT=3))
+		self.assertIsNone(evaluate("APT NOT IN (1, NULL)", APT=3))
+
+	def test_sentinels_are_values(self):
+		self.assertIs(evaluate("APT = -999999", APT=-999999), True)
+		self.assertIs(evaluate("ZI005_FNA = 'noInformation'", ZI005_FNA="noInformation"), True)
+		self.assertIs(evaluate("ZI005_FNA = ''", ZI005_FNA=""), True)
+
+class LikeTest(unittest.TestCase):
+	def test_wildcards(self):
+		self.assertIs(evaluate("ZI005_FNA LIKE 'Run%'", ZI005_FNA="Runway 9"), True)
+		self.assertIs(evaluate("ZI005_FNA LIKE 'Run%'", ZI005_FNA="A Runway"), False)
+		self.assertIs(evaluate("ZI005_FNA LIKE '%way%'", ZI005_FNA="Runway 9"), True)
+		self.assertIs(evaluate("ZI005_FNA LIKE 'R_n'", ZI005_FNA="Run"), True)
+		self.assertIs(evaluate("ZI005_FNA LIKE 'R_n'", ZI005_FNA="Ruin"), False)
+		self.assertIs(evaluate("ZI005_FNA LIKE '%'", ZI005_FNA=""), True)
+
+	def test_whole_value(self):
+		# The pattern has to match the whole value, newlines included, and regex characters are literal
+		self.assertIs(evaluate("ZI005_FNA LIKE 'Run'", ZI005_FNA="Runway"), False)
+		self.assertIs(evaluate("ZI005_FNA LIKE 'Run%'", ZI005_FNA="Run\nway"), True)
+		self.assertIs(evaluate("ZI005_FNA LIKE 'R.n'", ZI005_FNA="Run"), False)
+		self.assertIs(evaluate("ZI005_FNA LIKE 'R.n*'", ZI005_FNA="R.n*"), True)
+
+	def test_null(self):
+		self.assertIsNone(evaluate("ZI005_FNA LIKE 'Run%'"))
+		self.assertIsNone(evaluate("ZI005_FNA NOT LIKE 'Run%'"))
+
+	def test_text_fields_only(self):
+		self.assertRaises(SQLCompileError, evaluate, "APT LIKE '1%'", APT=1)
+
+class CompileTest(unittest.TestCase):
+	def test_type_mismatches_refuse_to_compile(self):
+		for where_clause in ("APT = '1'", "ZI005_FNA = 1", "APT = ZI005_FNA", "1 = 1", "ZVA BETWEEN 'a' AND 'b'"):
+			self.assertRaises(SQLCompileError, evaluate, where_clause)
+
+	def test_shared_nodes_are_memoized(self):
+		checks = [sql_check("a", "APT = 1 AND FPT = 2"), sql_check("b", "APT = 1 AND FPT = 2 OR ZVA > 0")]
+		program, compiled, unsupported = compile_dataset_checks(checks, FIELD_TYPES, "FCSUBTYPE")
+		self.assertEqual(unsupported, [])
+		self.assertIn(parse_where_clause("APT = 1 AND FPT = 2"), program.memo_slots)
+		self.assertNotIn(parse_where_clause("ZVA > 0"), program.memo_slots)
+		row = (1,) + tuple({"APT": 1, "FPT": 2, "ZVA": None}[field] for field in program.fields)
+		memo = program.new_memo()
+		self.assertEqual([predicate(row, memo) for check, predicate in compiled], [True, True])
+
+	def test_fallbacks(self):
+		# Missing fields and unsupported SQL are left to the batch job, subtype only checks match every row of their bucket
+		checks = [sql_check("missing", "NOPE = 1"), sql_check("escape", "ZI005_FNA LIKE 'a' ESCAPE '!'"), sql_check("subtype", None, 100687), sql_check("other", "APT = 1")]
+		program, compiled, unsupported = compile_dataset_checks(checks, FIELD_TYPES, "FCSUBTYPE")
+		self.assertEqual(sorted(check.key for check in unsupported), ["escape", "missing"])
+		self.assertEqual([check.key for check, predicate in compiled], ["subtype", "other"])
+		self.assertIs(compiled[0][1]((1,), None), True)
+
+	def test_subtype_outside_buckets(self):
+		# Without a subtype field to bucket on, the subtype filter becomes part of the predicate
+		program, compiled, unsupported = compile_dataset_checks([sql_check("a", "APT = 1", 100687)], FIELD_TYPES, None)
+		predicate = compiled[0][1]
+		values = lambda **row: (1,) + tuple(row.get(field) for field in program.fields)
+		self.assertIs(predicate(values(APT=1, FCSUBTYPE=100687), program.new_memo()), True)
+		self.assertIs(predicate(values(APT=1, FCSUBTYPE=100688), program.new_memo()), False)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# ========================= #
+#  Parallel shard planning  #
+# ========================= #
+
+# Splits RBJs into shards of check groups balanced on check counts or earlier runtimes, and keeps the runtimes between runs
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "benchmarks"))
+import generate_tds
+generate_tds.use_standin()
+
+import rbj_model
+import parallel
+
+def rbj(*groups): # An RBJModel of (group, [dataset per check]) groups
+	checks = []
+	for group, datasets in groups:
+		for dataset in datasets:
+			check = rbj_model.RBJCheck("{0}{1}".format(group, len(checks)), None, "Execute SQL Check", "", "", None, group, len(checks))
+			check.dataset = dataset
+			checks.append(check)
+	return rbj_model.RBJModel("test.rbj", "hash", checks)
+
+def layout(shards): # [[(group, dataset, checks)]] of a shard plan
+	return [[(group, dataset, len(checks)) for group, dataset, checks, weight in units] for units in shards]
+
+class PlanShardsTest(unittest.TestCase):
+	def test_groups_by_check_count(self):
+		model = rbj(("G1", ["A", "A", "B", "B"]), ("G2", ["A", "C"]), ("G3", ["D", "D"]))
+		shards = parallel.plan_shards(model, 2)
+		self.assertEqual(layout(shards), [[("G1", None, 4)], [("G2", None, 2), ("G3", None, 2)]])
+		self.assertEqual(sorted(check.key for units in shards for unit in units for check in unit[2]), sorted(check.key for check in model.checks))
+
+	def test_no_more_shards_than_units(self):
+		self.assertEqual(layout(parallel.plan_shards(rbj(("G1", ["A"]), ("G2", ["B"])), 8)), [[("G1", None, 1)], [("G2", None, 1)]])
+
+	def test_heavy_group_split_by_dataset(self):
+		shards = parallel.plan_shards(rbj(("G1", ["A", "A", "A", "B"]), ("G2", ["C"]), ("G3", ["D"])), 3)
+		self.assertEqual(layout(shards), [[("G1", "A", 3)], [("G1", "B", 1), ("G3", None, 1)], [("G2", None, 1)]])
+		self.assertEqual([unit[3] for unit in shards[0] + shards[1]], [3.0, 1.0, 1.0])
+
+	def test_balanced_on_history(self):
+		# G3 has no timing, so it's weighed at the average seconds per check of the groups that have one
+		model = rbj(("G1", ["A", "A", "B", "B"]), ("G2", ["C", "C"]), ("G3", ["D", "E"]))
+		shards = parallel.plan_shards(model, 2, {"G1": 1.0, "G2": 9.0})
+		self.assertEqual(layout(shards), [[("G2", None, 2)], [("G3", None, 2), ("G1", None, 4)]])
+		self.assertAlmostEqual(shards[1][0][3], 10.0 / 6 * 2)
+
+	def test_shard_runtimes(self):
+		model = rbj(("G1", ["A", "A", "A", "B"]), ("G2", ["C"]), ("G3", ["D"]))
+		runtimes = parallel.shard_runtimes(parallel.plan_shards(model, 3), [6.0, 4.0, 2.0])
+		self.assertEqual(runtimes, {"G1": 8.0, "G2": 2.0, "G3": 2.0})
+
+class ShardHistoryTest(unittest.TestCase):
+	def setUp(self):
+		self.folder = tempfile.mkdtemp(prefix="test_parallel_")
+		self.history_file = os.path.join(self.folder, "history", "shard_runtimes.json")
+
+	def tearDown(self):
+		shutil.rmtree(self.folder, ignore_errors=True)
+
+	def test_round_trip(self):
+		self.assertEqual(parallel.load_shard_history("a.rbj", self.history_file), {})
+		parallel.save_shard_history("a.rbj", {"G1": 1.5, "G2": 2.0}, self.history_file)
+		parallel.save_shard_history("a.rbj", {"G2": 3.0}, self.history_file)
+		parallel.save_shard_history("b.rbj", {"G1": 4.0}, self.history_file)
+		self.assertEqual(parallel.load_shard_history("a.rbj", self.history_file), {"G1": 1.5, "G2": 3.0})
+		self.assertEqual(parallel.load_shard_history("b.rbj", self.history_file), {"G1": 4.0})
+
+	def test_corrupt_history(self):
+		os.makedirs(os.path.dirname(self.history_file))
+		with open(self.history_file, 'w') as f:
+			f.write("{not json")
+		self.assertEqual(parallel.load_shard_history("a.rbj", self.history_file), {})
+		# Saving over it fails quietly, the timings only improve the balance
+		parallel.save_shard_history("a.rbj", {"G1": 1.0}, self.history_file)
+
+if __name__ == "__main__":
+	unittest.main()
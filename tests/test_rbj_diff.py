@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# ========== #
+#  RBJ diff  #
+# ========== #
+
+# Diffs two versions of an RBJ check by check, and finds the session of the baseline RBJ its unchanged results come from
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "benchmarks"))
+import generate_tds
+generate_tds.use_standin()
+
+import arcpy
+import rbj_model
+import reviewer_sessions
+import rbj_diff
+
+SOURCE_RBJ = os.path.join(REPO_DIR, "RBJs", "Baby_GATE_RBJs", "RBJ_50K_simplified.rbj")
+# AeronauticSrf SQL checks, the last one's where clause is changed in the new RBJ
+KEYS = ["{361E3D59-00A7-45D4-A6F7-88F74BAAA72C}", "{FE4DA875-7723-4A72-A1E4-BB31171AA7FF}", "{A82E7B2E-A16D-4672-A59C-7C6B0F13BBEC}", "{B769399E-354A-4788-AC86-FEF7FC97CB4A}"]
+WHERE_CLAUSE = b"APT = 1 AND FPT NOT IN (1)"
+
+def sql_check(key, where_clause, title="Bad APT", index=0): # An Execute SQL Check on AeronauticSrf
+	check = rbj_model.RBJCheck(key, None, "Execute SQL Check", title, "", "High", "Group", index)
+	check.dataset = "AeronauticSrf"
+	check.where_clause = where_clause
+	check.params = {"Reviewer Check Mode": 0}
+	return check
+
+def rbj(*checks):
+	return rbj_model.RBJModel("test.rbj", "hash", list(checks))
+
+def statuses(diff): # [(status, old key, new key, changes)] of a diff
+	return [(status, before.key if before else None, after.key if after else None, changes) for status, before, after, changes in diff]
+
+class DiffTest(unittest.TestCase):
+	def test_statuses(self):
+		old = rbj(sql_check("k1", "APT = 1"), sql_check("k2", "APT = 2"), sql_check("k3", "APT = 3"))
+		new = rbj(sql_check("k4", "APT = 4"), sql_check("k2", "APT = 5"), sql_check("k1", "(apt=1)"))
+		# New checks in the new RBJ's order, then the removed ones
+		self.assertEqual(statuses(rbj_diff.diff_rbjs(old, new)), [("added", None, "k4", []), ("modified", "k2", "k2", ["where_clause"]), ("unchanged", "k1", "k1", []), ("removed", "k3", None, [])])
+
+	def test_changed_parts(self):
+		before, after = sql_check("k1", "APT = 1"), sql_check("k1", "APT = 1", "Other title")
+		after.severity = "Low"
+		after.params = {"Reviewer Check Mode": 1}
+		diff = rbj_diff.diff_rbjs(rbj(before), rbj(after))
+		self.assertEqual(diff[0][3], ["config Reviewer Check Mode", "severity", "title"])
+
+	def test_recreated_checks_keep_their_results(self):
+		# A check deleted and added again gets a new key, it's matched on its parts, once
+		old = rbj(sql_check("k1", "APT = 1"), sql_check("k2", "APT = 1"))
+		new = rbj(sql_check("k3", "APT = 1"))
+		diff = rbj_diff.diff_rbjs(old, new)
+		self.assertEqual(statuses(diff), [("unchanged", "k1", "k3", []), ("removed", "k2", None, [])])
+		self.assertEqual([(record["status"], record["key"], record["old_key"]) for record in rbj_diff.diff_records(diff)], [("unchanged", "k3", "k1"), ("removed", "k2", "")])
+
+	def test_composite_checks_compare_their_xml(self):
+		before, after = sql_check("k1", None), sql_check("k1", None)
+		before.params = after.params = {"Checks": None}
+		self.assertEqual(statuses(rbj_diff.diff_rbjs(rbj(before), rbj(after), {"k1": "a"}, {"k1": "a"}))[0][0], "unchanged")
+		self.assertEqual(statuses(rbj_diff.diff_rbjs(rbj(before), rbj(after), {"k1": "a"}, {"k1": "b"}))[0], ("modified", "k1", "k1", ["config"]))
+
+class DiffFilesTest(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls.folder = tempfile.mkdtemp(prefix="test_rbj_diff_")
+		cls.old_file = os.path.join(cls.folder, "old.rbj")
+		rbj_model.write_rbj_subset(SOURCE_RBJ, KEYS, cls.old_file)
+		with open(cls.old_file, 'rb') as f:
+			cls.xml = f.read()
+		assert cls.xml.count(WHERE_CLAUSE) == 1
+
+	@classmethod
+	def tearDownClass(cls):
+		shutil.rmtree(cls.folder, ignore_errors=True)
+
+	def rbj_file(self, name, xml):
+		path = os.path.join(self.folder, name)
+		with open(path, 'wb') as f:
+			f.write(xml)
+		return path
+
+	def test_config_hashes(self):
+		hashes = rbj_diff.rbj_config_hashes(self.old_file)
+		self.assertEqual(sorted(hashes), sorted(KEYS))
+		# Respacing the XML changes nothing, editing a check's config changes only its own hash
+		self.assertEqual(rbj_diff.rbj_config_hashes(self.rbj_file("respaced.rbj", self.xml.replace(b" xsi:type=", b"\r\n\t xsi:type="))), hashes)
+		edited = rbj_diff.rbj_config_hashes(self.rbj_file("edited.rbj", self.xml.replace(b"Heliport_S. Attribution Check", b"Heliport_S. Attribution")))
+		self.assertEqual([key for key in KEYS if edited[key] != hashes[key]], KEYS[:1])
+		# Where clauses live in the resource registry, outside the configs, and are compared from the model
+		self.assertEqual(rbj_diff.rbj_config_hashes(self.rbj_file("where.rbj", self.xml.replace(WHERE_CLAUSE, b"APT = 2 AND FPT NOT IN (1)"))), hashes)
+
+	def test_diff_rbj_files(self):
+		new_file = self.rbj_file("new.rbj", self.xml.replace(WHERE_CLAUSE, b"APT = 2 AND FPT NOT IN (1)"))
+		diff = rbj_diff.diff_rbj_files(self.old_file, new_file)
+		self.assertEqual(sorted((status, after.key) for status, before, after, changes in diff), sorted([("unchanged", key) for key in KEYS[:-1]] + [("modified", KEYS[-1])]))
+		self.assertEqual([changes for status, before, after, changes in diff if status == "modified"], [["where_clause"]])
+
+	def test_baseline_session(self):
+		arcpy.CreateFileGDB_management(self.folder, "rev.gdb")
+		reviewer_gdb = os.path.join(self.folder, "rev.gdb")
+		arcpy.CreateReviewerWorkspace_Reviewer(reviewer_gdb)
+		self.assertIsNone(rbj_diff.baseline_session(reviewer_gdb, "old.rbj"))
+		first = reviewer_sessions.create_session(reviewer_gdb, "old.rbj 2026-01-01 10:00:00")
+		reviewer_sessions.create_session(reviewer_gdb, "old.rbj, other.rbj 2026-01-02 10:00:00")
+		reviewer_sessions.create_session(reviewer_gdb, "old.rbj.bak 2026-01-02 10:00:00")
+		self.assertEqual(rbj_diff.baseline_session(reviewer_gdb, "old.rbj"), first)
+		incremental = reviewer_sessions.create_session(reviewer_gdb, "Incremental old.rbj")
+		self.assertEqual(rbj_diff.baseline_session(reviewer_gdb, "old.rbj"), incremental)
+		# A revised RBJ with the baseline's file name doesn't take its results from its own run
+		own = reviewer_sessions.create_session(reviewer_gdb, "old.rbj 2026-01-03 10:00:00")
+		self.assertEqual(rbj_diff.baseline_session(reviewer_gdb, "old.rbj", own), incremental)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# ============== #
+#  Result cache  #
+# ============== #
+
+# Result cache keys follow the RBJs, the database's features and the AOI, and cached results restore into a new session
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "benchmarks"))
+import generate_tds
+generate_tds.use_standin()
+
+import arcpy
+import rbj_model
+import rbj_common
+import parallel
+import reviewer_sessions
+import result_cache
+
+SOURCE_RBJ = os.path.join(REPO_DIR, "RBJs", "Baby_GATE_RBJs", "RBJ_50K_simplified.rbj")
+# AeronauticSrf SQL checks
+KEYS = ["{361E3D59-00A7-45D4-A6F7-88F74BAAA72C}", "{FE4DA875-7723-4A72-A1E4-BB31171AA7FF}", "{A82E7B2E-A16D-4672-A59C-7C6B0F13BBEC}", "{B769399E-354A-4788-AC86-FEF7FC97CB4A}"]
+
+class ResultCacheTest(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls.folder = tempfile.mkdtemp(prefix="test_result_cache_")
+		cls.rbj_files = [os.path.join(cls.folder, "a.rbj"), os.path.join(cls.folder, "b.rbj")]
+		rbj_model.write_rbj_subset(SOURCE_RBJ, KEYS, cls.rbj_files[0])
+		rbj_model.write_rbj_subset(SOURCE_RBJ, KEYS[:2], cls.rbj_files[1])
+		cls.rbjs = [rbj_model.load_rbj(path, os.path.join(cls.folder, "cache")) for path in cls.rbj_files]
+		cls.production_gdb = os.path.join(cls.folder, "db.gdb")
+		generate_tds.generate(cls.production_gdb, generate_tds.rbj_schema(cls.rbj_files), 200, 3)
+		cls.fc_path = rbj_common.feature_class_paths(cls.production_gdb)["AERONAUTICSRF"]
+		arcpy.BATCH_JOB = None
+
+	@classmethod
+	def tearDownClass(cls):
+		shutil.rmtree(cls.folder, ignore_errors=True)
+
+	def key(self, rbjs=None, names=("a.rbj",), AOI=""):
+		return result_cache.result_key(rbjs or self.rbjs[:1], list(names), self.production_gdb, AOI)
+
+	def reviewer_gdb(self, name):
+		arcpy.CreateFileGDB_management(self.folder, name)
+		reviewer_gdb = os.path.join(self.folder, name)
+		arcpy.CreateReviewerWorkspace_Reviewer(reviewer_gdb)
+		return reviewer_gdb
+
+	def errors(self, reviewer_gdb, session):
+		where = "SESSIONID = {0}".format(rbj_common.session_id(session))
+		with arcpy.da.SearchCursor(os.path.join(reviewer_gdb, "REVTABLEMAIN"), ["ORIGINTABLE", "OBJECTID", "CHECKTITLE"], where) as cursor:
+			return sorted(tuple(row) for row in cursor)
+
+	def test_key_follows_rbjs_and_aoi(self):
+		key = self.key()
+		self.assertEqual(self.key(), key)
+		self.assertNotEqual(self.key(self.rbjs[1:]), key)
+		self.assertNotEqual(self.key(self.rbjs, ["a.rbj", "b.rbj"]), key)
+		self.assertNotEqual(self.key(self.rbjs, ["a.rbj", "b.rbj"]), self.key(self.rbjs[::-1], ["b.rbj", "a.rbj"]))
+		self.assertNotEqual(self.key(AOI=self.fc_path), key)
+
+	def test_key_follows_features(self):
+		key = self.key()
+		with arcpy.da.SearchCursor(self.fc_path, ["OID@", "SHAPE@", "APT", "FPT"]) as cursor:
+			row = next(iter(cursor))
+		with arcpy.da.InsertCursor(self.fc_path, ["SHAPE@", "APT", "FPT"]) as cursor:
+			oid = cursor.insertRow(row[1:])
+		self.assertNotEqual(self.key(), key)
+		with arcpy.da.UpdateCursor(self.fc_path, ["OID@"], "OBJECTID = {0}".format(oid)) as cursor:
+			for row in cursor:
+				cursor.deleteRow()
+		# Back to the same features, so back to the same key
+		self.assertEqual(self.key(), key)
+
+	def test_restore_into_new_session(self):
+		reviewer_gdb = self.reviewer_gdb("cached.gdb")
+		session = reviewer_sessions.run_session(reviewer_gdb, "a.rbj")
+		parallel.run_checks("Native SQL", self.rbjs[0], self.rbj_files[0], self.production_gdb, reviewer_gdb, session)
+		errors = self.errors(reviewer_gdb, session)
+		self.assertTrue(errors)
+		cache_dir = os.path.join(self.folder, "results")
+		key, entry = result_cache.lookup_results(self.rbjs[:1], ["a.rbj"], self.production_gdb, cache_dir=cache_dir)
+		self.assertIsNone(entry)
+		result_cache.store_results(key, reviewer_gdb, session, size_mb=10, cache_dir=cache_dir)
+		cached_key, entry = result_cache.lookup_results(self.rbjs[:1], ["a.rbj"], self.production_gdb, cache_dir=cache_dir)
+		self.assertEqual(cached_key, key)
+		self.assertIsNotNone(entry)
+		restored_gdb = self.reviewer_gdb("restored.gdb")
+		restored_session = reviewer_sessions.run_session(restored_gdb, "a.rbj")
+		guids = {}
+		self.assertEqual(result_cache.restore_results(entry, restored_gdb, restored_session, guids), len(errors))
+		self.assertEqual(self.errors(restored_gdb, restored_session), errors)
+		# Every GUID is replaced, and the error geometries still point at their errors
+		self.assertFalse(set(guids).intersection(guids.values()))
+		with arcpy.da.SearchCursor(os.path.join(restored_gdb, "REVTABLEMAIN"), ["ID"]) as cursor:
+			links = set(row[0] for row in cursor)
+		with arcpy.da.SearchCursor(os.path.join(restored_gdb, "REVDATASET", "REVTABLEPOLY"), ["LINKGUID"]) as cursor:
+			shapes = set(row[0] for row in cursor)
+		self.assertTrue(shapes)
+		self.assertTrue(shapes <= links)
+
+	def test_evict_least_recently_used(self):
+		cache_dir = os.path.join(self.folder, "evict")
+		os.makedirs(cache_dir)
+		now = time.time()
+		for age, name in enumerate(["new", "middle", "old"]):
+			path = os.path.join(cache_dir, name + ".pkl")
+			with open(path, 'wb') as f:
+				f.write(b"x" * 524288)
+			os.utime(path, (now - age * 60, now - age * 60))
+		self.assertEqual(result_cache.evict_results(1, cache_dir), 1)
+		self.assertEqual(sorted(os.listdir(cache_dir)), ["middle.pkl", "new.pkl"])
+		self.assertEqual(result_cache.evict_results(1, cache_dir), 0)
+		self.assertEqual(result_cache.evict_results(0, cache_dir), 2)
+
+if __name__ == "__main__":
+	unittest.main()
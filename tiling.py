@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+# ============ #
+#  AOI Tiling  #
+# ============ #
+
+# Runs feature checks in quadtree tiles of the AOI and merges the tiles' results as one untiled run
+
+# ArcPy aliasing
+import arcpy as ap
+from arcpy import AddMessage as write
+# STOP! Hammer time
+from datetime import datetime as dt
+# System Modules
+import os
+import shutil
+import functools
+import tempfile
+import multiprocessing
+
+from rbj_common import runtime, feature_class_paths, REVIEWER_RESULT_TABLES, result_fields
+from rbj_model import RBJModel, base_dataset_name
+from native_sql import aoi_layer
+from columnar import DEFAULT_CHUNK_SIZE
+from geo_on_geo import GEO_ON_GEO_CHECK, run_geo_checks
+from parallel import run_checks, load_shard_history, save_shard_history, plan_shards, shard_runtimes, merge_reviewer_results, run_pool, run_parallel
+
+
+# Checks whose result for a feature depends only on that feature
+FEATURE_CHECKS = ("Execute SQL Check", "Evaluate Polygon Perimeter and Area Check", "Domain Check", "Invalid Geometry Check", "Non-Linear Segment Check", "Multipart Polygon Check", "Multipart Line Check")
+MAX_TILE_DEPTH = 6 # At most 4^6 tiles however dense the data is
+
+def feature_points(fc_paths, AOI="", spatial_reference=None, oids=None): # Yields the (x, y) centroid of every feature in the feature classes that falls within the AOI, filling oids with {fc path: OIDs} when given
+	for fc_path in fc_paths:
+		source = aoi_layer(fc_path, AOI, "tile_density_lyr")
+		found = oids.setdefault(fc_path, set()) if oids is not None else set()
+		try:
+			with ap.da.SearchCursor(source, ["OID@", "SHAPE@XY"], spatial_reference=spatial_reference) as cursor:
+				for row in cursor:
+					found.add(row[0])
+					if row[1][0] is not None:
+						yield row[1]
+		finally:
+			if AOI and ap.Exists(source):
+				ap.Delete_management(source)
+
+def quadtree_tiles(points, extent, limit, depth=0): # Returns [((xmin, ymin, xmax, ymax), point count)] leaves covering extent with at most limit points each
+	if len(points) <= limit or depth >= MAX_TILE_DEPTH:
+		return [(extent, len(points))]
+	xmin, ymin, xmax, ymax = extent
+	xmid = (xmin + xmax) / 2.0
+	ymid = (ymin + ymax) / 2.0
+	quads = [[], [], [], []]
+	for x, y in points:
+		quads[(x >= xmid) + 2 * (y >= ymid)].append((x, y))
+	extents = [(xmin, ymin, xmid, ymid), (xmid, ymin, xmax, ymid), (xmin, ymid, xmid, ymax), (xmid, ymid, xmax, ymax)]
+	tiles = []
+	for quad, quad_extent in zip(quads, extents):
+		tiles.extend(quadtree_tiles(quad, quad_extent, limit, depth + 1))
+	return tiles
+
+def extent_polygon(extent, spatial_reference): # Polygon of an (xmin, ymin, xmax, ymax) tuple
+	xmin, ymin, xmax, ymax = extent
+	return ap.Polygon(ap.Array([ap.Point(xmin, ymin), ap.Point(xmin, ymax), ap.Point(xmax, ymax), ap.Point(xmax, ymin), ap.Point(xmin, ymin)]), spatial_reference)
+
+def write_tiles(fc_paths, AOI, spatial_reference, limit, tiles_gdb, oids=None): # Returns feature classes in tiles_gdb holding one tile polygon each, filling oids with {fc path: OIDs} in the AOI when given
+	area = None
+	if AOI:
+		with ap.da.SearchCursor(AOI, ["SHAPE@"], spatial_reference=spatial_reference) as cursor:
+			area = functools.reduce(lambda a, b: a.union(b), [row[0] for row in cursor])
+		extents = [area.extent]
+	else:
+		extents = [ap.Describe(fc_path).extent for fc_path in fc_paths]
+	bounds = (min(e.XMin for e in extents), min(e.YMin for e in extents), max(e.XMax for e in extents), max(e.YMax for e in extents))
+	leaves = quadtree_tiles(list(feature_points(fc_paths, AOI, spatial_reference, oids)), bounds, limit)
+	# A feature can cross an empty leaf without its centroid being in it, so the empty leaves are still run, together as one tile
+	polygons = [extent_polygon(extent, spatial_reference) for extent, count in leaves if count]
+	empty = [extent_polygon(extent, spatial_reference) for extent, count in leaves if not count]
+	if empty:
+		polygons.append(functools.reduce(lambda a, b: a.union(b), empty))
+	tiles = []
+	for polygon in polygons:
+		if area is not None:
+			if area.disjoint(polygon):
+				continue
+			polygon = polygon.intersect(area, 4)
+		name = "tile_{0}".format(len(tiles))
+		ap.CreateFeatureclass_management(tiles_gdb, name, "POLYGON", spatial_reference=spatial_reference)
+		with ap.da.InsertCursor(os.path.join(tiles_gdb, name), ["SHAPE@"]) as cursor:
+			cursor.insertRow([polygon])
+		tiles.append(os.path.join(tiles_gdb, name))
+	return tiles
+
+class TileMerger(object): # Merges tile results into the reviewer workspace, keeping one error per origin table, OID and check
+	# Data Reviewer's check GUID only names the check type, so checks are told apart by group, check name, title and resource
+
+	def __init__(self, reviewer_gdb, validated=None):
+		self.reviewer_gdb = reviewer_gdb
+		self.validated = validated or {} # DATASET -> distinct features the tiles validated between them
+		self.seen = set()     # (origin table, OID, check) already merged
+		self.runs = {}        # check -> [first REVCHECKRUNTABLE row, total validated, total results]
+		self.batch_runs = set() # REVBATCHRUNTABLE IDs the kept check runs point to, already merged
+		self.run_fields = None
+		self.merged = 0
+		self.duplicates = 0
+
+	def merge(self, shard_gdb):
+		run_table = os.path.join(shard_gdb, "REVCHECKRUNTABLE")
+		self.run_fields = result_fields(run_table)
+		run_index = dict((name.upper(), i) for i, name in enumerate(self.run_fields))
+		checks = {} # This shard's CHECKRUNID -> check
+		batch_runs = set() # This shard's BATCHRUNIDs of the check runs kept
+		with ap.da.SearchCursor(run_table, self.run_fields) as rows:
+			for row in rows:
+				check = tuple(row[run_index[name]] for name in ("BATCHJOBGROUPNAME", "CHECKNAME", "CHECKTITLE", "RESOURCENAME"))
+				checks[row[run_index["CHECKRUNID"]]] = check
+				if check not in self.runs:
+					self.runs[check] = [list(row), 0, 0]
+					batch_runs.add(row[run_index["BATCHRUNID"]])
+				self.runs[check][1] += row[run_index["TOTALVALIDATED"]] or 0
+		skipped = set() # IDs of duplicate REVTABLEMAIN rows, whose geometry rows are skipped too
+		main_table = os.path.join(shard_gdb, "REVTABLEMAIN")
+		fields = result_fields(main_table)
+		index = dict((name.upper(), i) for i, name in enumerate(fields))
+		with ap.da.SearchCursor(main_table, fields) as rows:
+			with ap.da.InsertCursor(os.path.join(self.reviewer_gdb, "REVTABLEMAIN"), fields) as cursor:
+				for row in rows:
+					check = checks.get(row[index["CHECKRUNID"]]) or (row[index["CHECKTITLE"]], row[index["ORIGINCHECK"]])
+					key = (row[index["ORIGINTABLE"]], row[index["OBJECTID"]], check)
+					if key in self.seen:
+						skipped.add(row[index["ID"]])
+						self.duplicates += 1
+						continue
+					self.seen.add(key)
+					row = list(row)
+					if check in self.runs:
+						# Every tile's errors for a check hang off the check run of the first tile that ran it
+						row[index["CHECKRUNID"]] = self.runs[check][0][run_index["CHECKRUNID"]]
+						self.runs[check][2] += 1
+					cursor.insertRow(row)
+					self.merged += 1
+		for table in REVIEWER_RESULT_TABLES:
+			if table in ("REVTABLEMAIN", "REVCHECKRUNTABLE"):
+				continue
+			source = os.path.join(shard_gdb, table)
+			fields = result_fields(source)
+			link = fields.index("LINKGUID") if "LINKGUID" in fields else None
+			batch_id = fields.index("ID") if table == "REVBATCHRUNTABLE" else None
+			with ap.da.SearchCursor(source, fields) as rows:
+				with ap.da.InsertCursor(os.path.join(self.reviewer_gdb, table), fields) as cursor:
+					for row in rows:
+						if batch_id is not None:
+							# Only the batch runs of the check runs kept, the other tiles' check runs are folded into those
+							if row[batch_id] not in batch_runs or row[batch_id] in self.batch_runs:
+								continue
+							self.batch_runs.add(row[batch_id])
+						if link is None or row[link] not in skipped:
+							cursor.insertRow(row)
+
+	def close(self): # Writes one REVCHECKRUNTABLE row per check with its totals over every tile
+		if not self.runs:
+			return
+		run_index = dict((name.upper(), i) for i, name in enumerate(self.run_fields))
+		with ap.da.InsertCursor(os.path.join(self.reviewer_gdb, "REVCHECKRUNTABLE"), self.run_fields) as cursor:
+			for check, (row, validated, results) in self.runs.items():
+				# Features crossing tile edges were validated by every tile they touch, the check's dataset counts them once
+				row[run_index["TOTALVALIDATED"]] = self.validated.get((base_dataset_name(check[3]) or "").upper(), validated)
+				row[run_index["TOTALRESULTS"]] = results
+				cursor.insertRow(row)
+
+def run_tiled(engine, rbj, rbj_file, production_gdb, reviewer_gdb, session, AOI="", chunk_size=DEFAULT_CHUNK_SIZE, workers=2, tile_limit=100000): # Runs the feature checks per density tile and the relational checks as shards, all in one worker pool
+	tile_start = dt.now()
+	fc_paths = feature_class_paths(production_gdb)
+	local = [check for check in rbj.checks if check.check_type in FEATURE_CHECKS]
+	related = [check for check in rbj.checks if check.check_type not in FEATURE_CHECKS]
+	local_paths = [fc_paths[ds.upper()] for ds in sorted(set(check.dataset for check in local if check.dataset)) if ds.upper() in fc_paths]
+	if AOI:
+		# Workers can't see layers in the ArcMap table of contents
+		AOI = ap.Describe(AOI).catalogPath
+	shard_dir = tempfile.mkdtemp(prefix="run_rbj_tiles_")
+	try:
+		jobs = []
+		oids = {} # Feature class path -> OIDs in the AOI
+		if local_paths:
+			tiles_gdb = ap.CreateFileGDB_management(shard_dir, "tiles.gdb").getOutput(0)
+			tiles = write_tiles(local_paths, AOI, ap.Describe(local_paths[0]).spatialReference, tile_limit, tiles_gdb, oids)
+			keys = [check.key for check in local]
+			jobs.extend(("Tile {0}".format(index), keys, tile) for index, tile in enumerate(tiles))
+		tile_jobs = len(jobs)
+		shards = []
+		if related:
+			shards = plan_shards(RBJModel(rbj.name, rbj.file_hash, related), workers, load_shard_history(rbj.name))
+			jobs.extend(("Shard {0}".format(index), [check.key for unit in units for check in unit[2]], AOI) for index, units in enumerate(shards))
+		write("  .. {0} tiles of at most {1} features for {2} feature checks and {3} shards for {4} relational checks, planned in {5}".format(tile_jobs, tile_limit, len(local), len(shards), len(related), runtime(tile_start, dt.now())))
+		shard_gdbs, seconds = run_pool(jobs, shard_dir, engine, rbj_file, production_gdb, reviewer_gdb, session, chunk_size, workers)
+		merge_start = dt.now()
+		merger = TileMerger(reviewer_gdb, dict(((base_dataset_name(os.path.basename(fc_path)) or "").upper(), len(found)) for fc_path, found in oids.items()))
+		for shard_gdb in shard_gdbs[:tile_jobs]:
+			merger.merge(shard_gdb)
+		merger.close()
+		# Each relational check ran in one shard over the whole AOI, so its errors are already one per feature
+		merged = merger.merged + sum(merge_reviewer_results(shard_gdb, reviewer_gdb) for shard_gdb in shard_gdbs[tile_jobs:])
+		write("  .. Merged {0} results, dropping {1} found again across tile edges, in {2}".format(merged, merger.duplicates, runtime(merge_start, dt.now())))
+		if shards:
+			save_shard_history(rbj.name, shard_runtimes(shards, seconds[tile_jobs:]))
+	finally:
+		shutil.rmtree(shard_dir, ignore_errors=True)
+
+def run_all_checks(engine, rbj, rbj_file, production_gdb, reviewer_gdb, session, AOI="", chunk_size=DEFAULT_CHUNK_SIZE, workers=1, tile_limit=0, keys=None): # Runs the RBJ, or only the checks in keys, tiled, sharded or in this process as the tool parameters ask
+	if keys is not None:
+		keys = set(keys)
+		rbj = RBJModel(rbj.name, rbj.file_hash, [check for check in rbj.checks if check.key in keys])
+	if tile_limit:
+		run_tiled(engine, rbj, rbj_file, production_gdb, reviewer_gdb, session, AOI, chunk_size, workers if workers > 1 else multiprocessing.cpu_count(), tile_limit)
+	elif workers > 1:
+		if engine in ("Native SQL", "Columnar"):
+			# Geometry on Geometry checks run over partitions of their primary datasets in the pool, the rest as shards
+			geo = [check for check in rbj.checks if check.check_type == GEO_ON_GEO_CHECK]
+			left = set(check.key for check in run_geo_checks(rbj, rbj_file, geo, production_gdb, reviewer_gdb, session, AOI, workers)) if geo else set()
+			rbj = RBJModel(rbj.name, rbj.file_hash, [check for check in rbj.checks if check.check_type != GEO_ON_GEO_CHECK or check.key in left])
+		if rbj.checks:
+			run_parallel(engine, rbj, rbj_file, production_gdb, reviewer_gdb, session, AOI, chunk_size, workers)
+	else:
+		run_checks(engine, rbj, rbj_file, production_gdb, reviewer_gdb, session, AOI, chunk_size, keys)